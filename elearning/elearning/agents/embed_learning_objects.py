@@ -3,20 +3,21 @@ Script to create embeddings for Learning Objects for Insight Agent matching
 """
 
 import frappe
+import hashlib
 import json
-import pickle
 import os
+import time
 from typing import List, Dict
-from pathlib import Path
 
-# Import Haystack components
-try:
-    from haystack import Document
-    from haystack.document_stores.in_memory import InMemoryDocumentStore
-    from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
-    from haystack.components.embedders import SentenceTransformersTextEmbedder
-except ImportError:
-    frappe.log_error("Haystack not installed")
+import numpy as np
+
+from elearning.elearning.utils.embedding_registry import get_embedding_model
+from elearning.elearning.utils.vector_index import load_vector_index, write_vector_index
+
+LEARNING_OBJECT_INDEX_NAME = "learning_objects"
+EMBEDDING_BATCH_SIZE = 128
+REINDEX_JOB_ID = "learning_object_reindex"
+REINDEX_DIRTY_KEY = "learning_object_reindex_dirty"
 
 def fetch_learning_objects() -> List[Dict]:
     """
@@ -25,7 +26,8 @@ def fetch_learning_objects() -> List[Dict]:
     try:
         learning_objects = frappe.get_all(
             "Learning Object",
-            fields=["name", "learning_object_title", "description", "topic"]
+            fields=["name", "learning_object_title", "description", "topic"],
+            order_by="name asc"
         )
         
         frappe.logger().info(f"Fetched {len(learning_objects)} Learning Objects")
@@ -35,9 +37,9 @@ def fetch_learning_objects() -> List[Dict]:
         frappe.log_error(f"Failed to fetch Learning Objects: {str(e)}")
         return []
 
-def create_learning_object_documents(learning_objects: List[Dict]) -> List[Document]:
+def create_learning_object_documents(learning_objects: List[Dict]) -> List[Dict]:
     """
-    Convert Learning Objects to Haystack Documents for embedding
+    Convert Learning Objects to index records for embedding
     """
     documents = []
     
@@ -57,67 +59,111 @@ def create_learning_object_documents(learning_objects: List[Dict]) -> List[Docum
         
         content = " | ".join(content_parts)
         
-        # Create Document with metadata
-        doc = Document(
-            content=content,
-            meta={
+        # Create record with metadata; the hash lets incremental runs skip unchanged objects
+        doc = {
+            "id": lo["name"],
+            "content": content,
+            "meta": {
                 "lo_id": lo["name"],
                 "title": lo.get("learning_object_title", ""),
                 "description": lo.get("description", ""),
-                "topic": lo.get("topic", "")
+                "topic": lo.get("topic", ""),
+                "content_hash": hashlib.sha1(content.encode("utf-8")).hexdigest(),
             }
-        )
+        }
         
         documents.append(doc)
     
     frappe.logger().info(f"Created {len(documents)} Learning Object documents")
     return documents
 
-def embed_and_save_learning_objects():
+def _reusable_embeddings(documents: List[Dict], model_name: str) -> Dict[str, np.ndarray]:
+    """
+    Map Learning Object ID -> stored embedding for documents whose content hash
+    matches the live index built with the same model
+    """
+    current_index = load_vector_index(LEARNING_OBJECT_INDEX_NAME)
+    if current_index is None or current_index.model != model_name:
+        return {}
+
+    rows = {
+        record["id"]: (row, record["meta"].get("content_hash"))
+        for row, record in enumerate(current_index.records)
+    }
+
+    reusable = {}
+    for doc in documents:
+        row, content_hash = rows.get(doc["id"], (None, None))
+        if row is not None and content_hash == doc["meta"]["content_hash"]:
+            reusable[doc["id"]] = np.asarray(current_index.vectors[row], dtype=np.float32)
+    return reusable
+
+def embed_and_save_learning_objects(full_rebuild: bool = False):
     """
     Main function to embed Learning Objects and save to file
+
+    Only new or changed objects are embedded unless `full_rebuild` is set; deleted
+    objects drop out because the index is rebuilt from the current table.
     """
     try:
         # Fetch Learning Objects from database
         learning_objects = fetch_learning_objects()
         
         if not learning_objects:
-            frappe.logger().warning("No Learning Objects found")
-            return False
+            # Still write an (empty) version so deleted objects stop being retrieved
+            frappe.logger().warning("No Learning Objects found, writing an empty index")
         
         # Convert to documents
         documents = create_learning_object_documents(learning_objects)
         
-        # Initialize text embedder
-        text_embedder = SentenceTransformersTextEmbedder(
-            model="bkai-foundation-models/vietnamese-bi-encoder"
+        embedding_model = get_embedding_model()
+        reusable = {} if full_rebuild else _reusable_embeddings(documents, embedding_model.model_name)
+        
+        current_index = load_vector_index(LEARNING_OBJECT_INDEX_NAME)
+        if (
+            current_index is not None
+            and len(reusable) == len(documents) == len(current_index)
+            and (current_index.partitions or not documents)
+        ):
+            frappe.logger().info("Learning Object embeddings are up to date")
+            return True
+        
+        # Embed only new or changed objects, in large batches with the shared model
+        changed = [doc for doc in documents if doc["id"] not in reusable]
+        new_embeddings = embedding_model.embed(
+            [doc["content"] for doc in changed], batch_size=EMBEDDING_BATCH_SIZE
         )
-        text_embedder.warm_up()
+        reusable.update({doc["id"]: embedding for doc, embedding in zip(changed, new_embeddings)})
+        embeddings = [reusable[doc["id"]] for doc in documents]
         
-        # Create embeddings for each document
-        for doc in documents:
-            embedding_result = text_embedder.run(text=doc.content)
-            doc.embedding = embedding_result["embedding"]
+        frappe.logger().info(
+            f"Embedded {len(changed)} new or changed Learning Objects, reused {len(documents) - len(changed)}"
+        )
+        
+        # Write the memory-mapped index; running workers pick up the new version on next search
+        version = write_vector_index(
+            LEARNING_OBJECT_INDEX_NAME,
+            embeddings,
+            documents,
+            model=embedding_model.model_name,
+            partition_key="topic",
+            dim=None if documents else embedding_model.dimension,
+        )
+        
+        frappe.logger().info(f"Successfully saved {len(documents)} embedded Learning Objects (index version {version})")
         
         # Ensure data directory exists
         app_path = frappe.get_app_path("elearning")
         data_dir = os.path.join(app_path, "elearning", "agents", "data")
         os.makedirs(data_dir, exist_ok=True)
         
-        # Save embedded documents to pickle file
-        output_path = os.path.join(data_dir, "learning_objects_embedded.pkl")
-        with open(output_path, "wb") as f:
-            pickle.dump(documents, f)
-        
-        frappe.logger().info(f"Successfully saved {len(documents)} embedded Learning Objects to {output_path}")
-        
         # Also save a JSON index for reference
         index_data = []
         for doc in documents:
             index_data.append({
-                "lo_id": doc.meta["lo_id"],
-                "title": doc.meta["title"],
-                "content": doc.content
+                "lo_id": doc["meta"]["lo_id"],
+                "title": doc["meta"]["title"],
+                "content": doc["content"]
             })
         
         index_path = os.path.join(data_dir, "learning_objects_index.json")
@@ -131,6 +177,33 @@ def embed_and_save_learning_objects():
         frappe.log_error(f"Failed to embed Learning Objects: {str(e)}")
         return False
 
+def enqueue_learning_object_reindex(doc, method=None):
+    """
+    Doc event hook for Learning Object insert/update/delete: after the transaction
+    commits, mark the index dirty and queue one incremental re-index. Concurrent
+    edits collapse into a single job; an edit made while that job is already
+    running is picked up by the job's own dirty re-check.
+    """
+    frappe.db.after_commit.add(lambda: frappe.cache().set_value(REINDEX_DIRTY_KEY, time.time()))
+    frappe.enqueue(
+        "elearning.elearning.agents.embed_learning_objects.run_learning_object_reindex",
+        queue="long",
+        job_id=REINDEX_JOB_ID,
+        deduplicate=True,
+        enqueue_after_commit=True,
+    )
+
+def run_learning_object_reindex():
+    """
+    Background job: re-index until no edit arrived during the last pass. The marker
+    is cleared before each pass reads the table, so an edit committed after that
+    sets it again and triggers another pass.
+    """
+    while frappe.cache().get_value(REINDEX_DIRTY_KEY):
+        frappe.cache().delete_value(REINDEX_DIRTY_KEY)
+        embed_and_save_learning_objects()
+
+
 @frappe.whitelist()
 def generate_learning_object_embeddings():
     """
@@ -5,13 +5,35 @@ Learning analysis agents: Insight (weakness detection) and Practice (exercise ge
 import frappe
 import json
 import re
-import pickle
 from typing import Dict, Any, List
 from datetime import datetime
 import os
 
 import requests
 from .prompts import INSIGHT_TEMPLATE, PRACTICE_TEMPLATE
+from elearning.elearning.utils.gemini_grader_service import get_gemini_api_url
+from elearning.elearning.utils.embedding_registry import get_embedding_model
+from elearning.elearning.utils.vector_index import load_vector_index
+
+LEARNING_OBJECT_INDEX_NAME = "learning_objects"
+
+def resolve_topic_name(topic_context: str = None):
+    """
+    Resolve a topic context (Topics name or part of its title) to a Topics name
+    """
+    if not topic_context:
+        return None
+
+    if frappe.db.exists("Topics", topic_context):
+        return topic_context
+
+    topic_doc = frappe.get_all(
+        "Topics",
+        filters={"topic_title": ["like", f"%{topic_context}%"]},
+        fields=["name"],
+        limit=1
+    )
+    return topic_doc[0].name if topic_doc else None
 
 # Import and apply math format fix
 from elearning.elearning.doctype.chat_message.chat_message import fix_math_format
@@ -25,10 +47,8 @@ class LearningAnalyzer:
         self.api_key = frappe.conf.get("gemini_api_key")
         self.api_url = None
         if self.api_key:
-            self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={self.api_key}"
+            self.api_url = get_gemini_api_url("gemini-1.5-flash", self.api_key)
         self.videos_data = []
-        self.lo_document_store = None
-        self.lo_retriever = None
         self.lo_text_embedder = None
         self._load_videos_data()
         self._load_learning_object_embeddings()
@@ -52,73 +72,48 @@ class LearningAnalyzer:
     def _load_learning_object_embeddings(self):
         """Load Learning Object embeddings for matching"""
         try:
-            app_path = frappe.get_app_path("elearning")
-            lo_embeddings_path = os.path.join(app_path, "elearning", "agents", "data", "learning_objects_embedded.pkl")
-            
-            if os.path.exists(lo_embeddings_path):
-                with open(lo_embeddings_path, "rb") as f:
-                    lo_documents = pickle.load(f)
-                
-                # Initialize document store for Learning Objects
-                try:
-                    from haystack.document_stores.in_memory import InMemoryDocumentStore
-                    from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
-                    from haystack.components.embedders import SentenceTransformersTextEmbedder
-                    
-                    self.lo_document_store = InMemoryDocumentStore()
-                    self.lo_document_store.write_documents(lo_documents)
-                    
-                    # Initialize retriever for Learning Objects
-                    self.lo_retriever = InMemoryEmbeddingRetriever(document_store=self.lo_document_store)
-                    
-                    # Initialize text embedder for queries
-                    self.lo_text_embedder = SentenceTransformersTextEmbedder(
-                        model="bkai-foundation-models/vietnamese-bi-encoder"
-                    )
-                    self.lo_text_embedder.warm_up()
-                    
-                    frappe.logger().info(f"Loaded {len(lo_documents)} Learning Object embeddings")
-                    
-                except ImportError:
-                    frappe.log_error("Haystack not available for Learning Object matching")
-                    
+            lo_index = load_vector_index(LEARNING_OBJECT_INDEX_NAME)
+            if lo_index is not None:
+                # Shared query embedder (one model instance per process)
+                self.lo_text_embedder = get_embedding_model()
+                frappe.logger().info(f"Loaded {len(lo_index)} Learning Object embeddings")
             else:
                 frappe.logger().warning("Learning Object embeddings not found. Run embed_learning_objects.py first.")
                 
         except Exception as e:
             frappe.log_error(f"Failed to load Learning Object embeddings: {str(e)}")
     
-    def find_best_matching_lo(self, query_text: str, top_k: int = 1) -> str:
+    def find_best_matching_los(self, query_texts: List[str], topic: str = None) -> List[str]:
         """
-        Find the best matching Learning Object ID for a weakness query
+        Find the best matching Learning Object ID for each query with one embedding
+        pass and one matrix top-k over the LO index (None where nothing matches)
         """
         try:
-            if not self.lo_retriever or not self.lo_text_embedder:
+            lo_index = load_vector_index(LEARNING_OBJECT_INDEX_NAME) if self.lo_text_embedder else None
+            if not lo_index:
                 frappe.logger().warning("Learning Object embeddings not loaded")
-                return None
+                return [None] * len(query_texts)
             
-            # Create embedding for the query
-            embedding_result = self.lo_text_embedder.run(text=query_text)
-            query_embedding = embedding_result["embedding"]
-            
-            # Retrieve most similar Learning Objects
-            results = self.lo_retriever.run(
-                query_embedding=query_embedding,
-                top_k=top_k
-            )
+            if not query_texts:
+                return []
             
-            if results["documents"] and len(results["documents"]) > 0:
-                best_match = results["documents"][0]
-                lo_id = best_match.meta.get("lo_id")
-                
-                frappe.logger().info(f"Found matching LO: {lo_id} for query: {query_text}")
-                return lo_id
+            query_embeddings = self.lo_text_embedder.embed(list(query_texts))
+            results = lo_index.search_batch(query_embeddings, top_k=1, partition=topic)
             
-            return None
+            lo_ids = [hits[0][1]["meta"].get("lo_id") if hits else None for hits in results]
+            frappe.logger().info(f"Matched {sum(1 for lo_id in lo_ids if lo_id)}/{len(lo_ids)} queries to Learning Objects")
+            return lo_ids
             
         except Exception as e:
-            frappe.log_error(f"Error finding matching Learning Object: {str(e)[:80]}...", "LO Matching Error")
-            return None
+            frappe.log_error(f"Error finding matching Learning Objects: {str(e)[:80]}...", "LO Matching Error")
+            return [None] * len(query_texts)
+    
+    def find_best_matching_lo(self, query_text: str, top_k: int = 1, topic: str = None) -> str:
+        """
+        Find the best matching Learning Object ID for a weakness query,
+        searching only the topic's partition when a Topics name is given
+        """
+        return self.find_best_matching_los([query_text], topic=topic)[0]
     
     def get_learning_object_prerequisites(self, lo_id: str) -> List[Dict]:
         """
@@ -290,7 +285,7 @@ Chỉ trả về JSON, không thêm văn bản khác.
                 return {"misunderstood_concepts": [], "learning_object_name": None, "sentiment": sentiment}
             
             # Step 2: Use vector matching to find best Learning Object
-            matching_lo_id = self.find_best_matching_lo(weakness_query)
+            matching_lo_id = self.find_best_matching_lo(weakness_query, topic=resolve_topic_name(topic_context))
             
             # Format result with debug info
             result = {
@@ -325,26 +320,10 @@ Chỉ trả về JSON, không thêm văn bản khác.
             
             # If topic context is provided, filter by topic
             if topic_context:
-                # Try to find topic by name or ID
-                topic_doc = frappe.get_all(
-                    "Topics",
-                    filters={"name": topic_context},
-                    fields=["name"],
-                    limit=1
-                )
-                
-                if topic_doc:
-                    filters["topic"] = topic_doc[0].name
-                else:
-                    # If not found by name, try to find by title
-                    topic_doc = frappe.get_all(
-                        "Topics",
-                        filters={"topic_title": ["like", f"%{topic_context}%"]},
-                        fields=["name"],
-                        limit=1
-                    )
-                    if topic_doc:
-                        filters["topic"] = topic_doc[0].name
+                # Try to find topic by name, then by title
+                topic_name = resolve_topic_name(topic_context)
+                if topic_name:
+                    filters["topic"] = topic_name
             
             # Get learning objects
             learning_objects = frappe.get_all(
@@ -605,28 +584,104 @@ Mình thấy bạn cần luyện tập thêm về **"{weakness_description}"**.
             frappe.db.rollback()
             return None
     
-    def analyze_and_store_weaknesses(self, user: str, conversation_history: str) -> List[str]:
+    def upsert_knowledge_gaps(self, user: str, learning_objects: List[str]) -> List[str]:
         """
-        Analyze conversation for weaknesses and store them as Knowledge Gaps
+        Create or refresh open Knowledge Gaps for several Learning Objects at once:
+        one lookup for existing gaps, one UPDATE, one bulk INSERT, then one mastery
+        recompute queued per affected topic (bulk writes bypass the doc event)
         """
+        from frappe.model.naming import make_autoname
+        from elearning.elearning.utils.mastery_recompute_queue import mark_mastery_dirty
+        
         try:
-            # Get insights from conversation
-            insights = self.insight_agent(conversation_history)
-            misunderstood_concepts = insights.get("misunderstood_concepts", [])
+            learning_objects = list(dict.fromkeys(lo for lo in learning_objects if lo))
+            if not learning_objects:
+                return []
             
-            created_gaps = []
+            lo_topics = {
+                lo.name: lo.topic
+                for lo in frappe.get_all(
+                    "Learning Object",
+                    filters={"name": ["in", learning_objects]},
+                    fields=["name", "topic"]
+                )
+            }
+            learning_objects = [lo for lo in learning_objects if lo in lo_topics]
+            if not learning_objects:
+                return []
             
-            for concept in misunderstood_concepts:
-                # Try to find matching learning object
-                learning_object = self._find_learning_object_for_concept(concept)
-                
-                if learning_object:
-                    gap_name = self.create_knowledge_gap(
-                        user=user,
-                        learning_object=learning_object
-                    )
-                    if gap_name:
-                        created_gaps.append(gap_name)
+            existing = {
+                gap.learning_object: gap.name
+                for gap in frappe.get_all(
+                    "Knowledge Gap",
+                    filters={
+                        "user": user,
+                        "learning_object": ["in", learning_objects],
+                        "status": ["in", ["Identified", "Addressing"]]
+                    },
+                    fields=["name", "learning_object"]
+                )
+            }
+            
+            now = datetime.now()
+            if existing:
+                frappe.db.sql(
+                    """
+                    UPDATE `tabKnowledge Gap`
+                    SET last_detected_on = %(now)s, modified = %(now)s, modified_by = %(modified_by)s
+                    WHERE name IN %(names)s
+                    """,
+                    {"now": now, "modified_by": frappe.session.user, "names": tuple(existing.values())},
+                )
+            
+            new_rows = []
+            for lo in learning_objects:
+                if lo in existing:
+                    continue
+                name = make_autoname("KGAP-.#####", "Knowledge Gap")
+                existing[lo] = name
+                new_rows.append(
+                    (name, now, now, frappe.session.user, frappe.session.user, "KGAP-.#####", user, lo, "Identified", now)
+                )
+            
+            if new_rows:
+                frappe.db.bulk_insert(
+                    "Knowledge Gap",
+                    fields=["name", "creation", "modified", "owner", "modified_by", "naming_series",
+                            "user", "learning_object", "status", "last_detected_on"],
+                    values=new_rows
+                )
+            
+            for topic in {lo_topics[lo] for lo in learning_objects if lo_topics[lo]}:
+                mark_mastery_dirty(user, topic, "gap")
+            
+            frappe.db.commit()
+            frappe.logger().info(
+                f"Upserted {len(learning_objects)} knowledge gaps for user {user} ({len(new_rows)} new)"
+            )
+            return [existing[lo] for lo in learning_objects]
+            
+        except Exception as e:
+            frappe.log_error(f"Failed to upsert knowledge gaps: {str(e)}")
+            frappe.db.rollback()
+            return []
+    
+    def analyze_and_store_weaknesses(self, user: str, conversation_history: str, topic_context: str = None,
+                                     insights: Dict[str, Any] = None) -> List[str]:
+        """
+        Analyze conversation for weaknesses and store them as Knowledge Gaps.
+        All concepts are matched in one batch and stored with one bulk upsert.
+        """
+        try:
+            # Get insights from conversation (reuse them if the caller already has them)
+            if insights is None:
+                insights = self.insight_agent(conversation_history, topic_context)
+            misunderstood_concepts = insights.get("misunderstood_concepts", [])
+            
+            learning_objects = self._find_learning_objects_for_concepts(
+                misunderstood_concepts, topic=resolve_topic_name(topic_context)
+            )
+            created_gaps = self.upsert_knowledge_gaps(user, learning_objects)
             
             frappe.logger().info(f"Created {len(created_gaps)} knowledge gaps for user {user}")
             return created_gaps
@@ -635,38 +690,51 @@ Mình thấy bạn cần luyện tập thêm về **"{weakness_description}"**.
             frappe.log_error(f"Failed to analyze and store weaknesses: {str(e)}")
             return []
     
-    def _find_learning_object_for_concept(self, concept: str) -> str:
+    def _find_learning_objects_for_concepts(self, concepts: List[str], topic: str = None) -> List[str]:
         """
-        Find the best matching Learning Object for a concept
-        This is a simplified implementation - in production, you might want
-        to use semantic search or keyword matching
+        Match concepts to Learning Objects: semantic batch match first, then
+        keyword matching for concepts the index could not resolve
         """
+        if not concepts:
+            return []
+        
+        matches = self.find_best_matching_los(concepts, topic=topic)
+        unmatched = [i for i, lo_id in enumerate(matches) if not lo_id]
+        if not unmatched:
+            return matches
+        
         try:
-            # Search for learning objects that might match the concept
             learning_objects = frappe.get_all(
                 "Learning Object",
-                filters={"is_active": 1},
-                fields=["name", "title", "description"]
+                fields=["name", "learning_object_title", "description"]
             )
-            
-            # Simple keyword matching (can be improved with semantic search)
-            concept_lower = concept.lower()
-            
-            for lo in learning_objects:
-                title_lower = lo.title.lower() if lo.title else ""
-                desc_lower = lo.description.lower() if lo.description else ""
-                
-                if (concept_lower in title_lower or 
-                    concept_lower in desc_lower or
-                    any(keyword in concept_lower for keyword in title_lower.split())):
-                    return lo.name
-            
-            # If no match found, return None
-            return None
-            
+            for i in unmatched:
+                matches[i] = self._keyword_match_learning_object(concepts[i], learning_objects)
         except Exception as e:
-            frappe.log_error(f"Failed to find learning object for concept {concept}: {str(e)}")
-            return None
+            frappe.log_error(f"Failed to keyword-match learning objects: {str(e)}")
+        
+        return matches
+    
+    def _keyword_match_learning_object(self, concept: str, learning_objects: List[Dict]) -> str:
+        """Simple keyword matching of one concept against preloaded Learning Objects"""
+        concept_lower = concept.lower()
+        
+        for lo in learning_objects:
+            title_lower = lo.learning_object_title.lower() if lo.learning_object_title else ""
+            desc_lower = lo.description.lower() if lo.description else ""
+            
+            if (concept_lower in title_lower or 
+                concept_lower in desc_lower or
+                any(keyword in concept_lower for keyword in title_lower.split())):
+                return lo.name
+        
+        return None
+    
+    def _find_learning_object_for_concept(self, concept: str) -> str:
+        """
+        Find the best matching Learning Object for a concept
+        """
+        return self._find_learning_objects_for_concepts([concept])[0]
     
     def generate_practice_for_weakness(self, user: str, weakness_concept: str = None) -> str:
         """
@@ -727,7 +795,8 @@ def analyze_learning_weaknesses(user: str, conversation_history: str, topic_cont
         created_gaps = analyzer.analyze_and_store_weaknesses(
             user=user,
             conversation_history=conversation_history,
-            topic_context=topic_context
+            topic_context=topic_context,
+            insights=insights
         )
         
         return {
@@ -807,7 +876,7 @@ def generate_learning_object_embeddings():
         if success:
             return {
                 "success": True,
-                "message": "Learning Object embeddings generated successfully. Restart the application to load them."
+                "message": "Learning Object embeddings generated successfully"
             }
         else:
             return {
@@ -5,7 +5,6 @@ Problem solving agents: Informer (RAG) and Verifier (mathematical validation)
 import frappe
 import json
 import re
-import pickle
 import os
 from typing import Dict, Any, List
 from pathlib import Path
@@ -13,19 +12,16 @@ from pathlib import Path
 # Import and apply math format fix
 from elearning.elearning.doctype.chat_message.chat_message import fix_math_format
 
-# Import Haystack components
-try:
-    from haystack import Pipeline, Document
-    from haystack.document_stores.in_memory import InMemoryDocumentStore
-    from haystack.components.retrievers.in_memory import InMemoryEmbeddingRetriever
-    from haystack.components.builders import PromptBuilder
-    from haystack.components.embedders import SentenceTransformersTextEmbedder
-except ImportError:
-    frappe.log_error("Haystack not installed")
-
 import requests
 import base64
 from .prompts import INFORMER_TEMPLATE
+from elearning.elearning.utils.gemini_grader_service import get_gemini_api_url
+from elearning.elearning.utils.embedding_registry import get_embedding_model
+from elearning.elearning.utils.vector_index import load_vector_index
+from .learning_analyzer import resolve_topic_name
+
+DOCUMENT_INDEX_NAME = "documents"
+DOCUMENT_TOP_K = 10
 
 class ProblemSolver:
     """
@@ -36,10 +32,8 @@ class ProblemSolver:
         self.api_key = frappe.conf.get("gemini_api_key")
         self.api_url = None
         if self.api_key:
-            self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={self.api_key}"
+            self.api_url = get_gemini_api_url("gemini-1.5-flash", self.api_key)
         
-        self.document_store = None
-        self.retriever = None
         self.text_embedder = None
         self.videos_data = []
         self._load_resources()
@@ -50,27 +44,13 @@ class ProblemSolver:
             # Get the app path
             app_path = frappe.get_app_path("elearning")
             
-            # Load embedded documents
-            documents_path = os.path.join(app_path, "elearning", "agents", "data", "embedded_documents.pkl")
-            if os.path.exists(documents_path):
-                with open(documents_path, "rb") as f:
-                    documents = pickle.load(f)
-                
-                # Initialize document store
-                self.document_store = InMemoryDocumentStore()
-                self.document_store.write_documents(documents)
-                
-                # Initialize components
-                self.retriever = InMemoryEmbeddingRetriever(document_store=self.document_store)
-                self.text_embedder = SentenceTransformersTextEmbedder(
-                    model="bkai-foundation-models/vietnamese-bi-encoder"
-                )
-                
-                # Warm up the text embedder
-                self.text_embedder.warm_up()
-                pass
+            # The document index is memory-mapped on first use and shared by forked workers
+            if load_vector_index(DOCUMENT_INDEX_NAME) is not None:
+                self.text_embedder = get_embedding_model()
             else:
-                pass
+                frappe.logger().warning(
+                    "Document index not found. Convert embedded_documents.pkl with vector_index.convert_pickled_documents."
+                )
             
             # Load videos data
             videos_path = os.path.join(app_path, "elearning", "agents", "data", "videos.json")
@@ -125,15 +105,17 @@ class ProblemSolver:
             frappe.log_error(f"Error calling Gemini API: {str(e)[:80]}...", "Gemini API Error")
             return "Xin lỗi, tôi không thể trả lời lúc này. Vui lòng thử lại sau."
     
-    def informer_agent(self, query: str, conversation_history_str: str) -> str:
+    def informer_agent(self, query: str, conversation_history_str: str, topic_context: str = None) -> str:
         """
-        Informer agent: Solve math problems using RAG with built-in verification
+        Informer agent: Solve math problems using RAG with built-in verification.
+        Retrieval is limited to the topic's partition when the index has one.
         """
         try:
             if not self.api_key:
                 return "Xin lỗi, tôi không thể giải bài này lúc này do API key chưa được cấu hình."
                 
-            if not self.retriever or not self.text_embedder:
+            document_index = load_vector_index(DOCUMENT_INDEX_NAME) if self.text_embedder else None
+            if not document_index:
                 # Fallback to direct LLM without RAG
                 prompt = f"""
 Bạn là một gia sư toán học chuyên nghiệp. Hãy giải chi tiết và CHÍNH XÁC bài toán sau:
@@ -149,8 +131,10 @@ Hãy trả lời bằng tiếng Việt với lời giải từng bước rõ rà
             
             # Get relevant documents using RAG
             try:
-                embedding = self.text_embedder.run(text=query)["embedding"]
-                context_docs = self.retriever.run(query_embedding=embedding)["documents"]
+                embedding = self.text_embedder.embed_one(query)
+                context_docs = document_index.search(
+                    embedding, top_k=DOCUMENT_TOP_K, partition=resolve_topic_name(topic_context)
+                )
                 
                 # Build prompt with context
                 prompt = INFORMER_TEMPLATE.replace("{{ query }}", query)
@@ -158,8 +142,8 @@ Hãy trả lời bằng tiếng Việt với lời giải từng bước rõ rà
                 
                 # Add document context
                 doc_context = ""
-                for doc in context_docs:
-                    doc_context += f"{doc.content}\n\n"
+                for _score, doc in context_docs:
+                    doc_context += f"{doc['content']}\n\n"
                 prompt = prompt.replace("{% for doc in documents %}\n{{ doc.content }}\n{% endfor %}", doc_context)
                 
                 response = self.call_gemini_api(prompt)
@@ -236,7 +220,7 @@ Hãy trả lời bằng tiếng Việt với lời giải từng bước rõ rà
             return ""
     
     def problem_solving_engine(self, query_text: str, query_image: bytes = None, 
-                             conversation_history_str: str = "") -> str:
+                             conversation_history_str: str = "", topic_context: str = None) -> str:
         """
         Main problem solving engine combining multimodal input processing
         """
@@ -253,7 +237,7 @@ Hãy trả lời bằng tiếng Việt với lời giải từng bước rõ rà
                 return "Xin lỗi, tôi không thể hiểu được câu hỏi của bạn."
             
             # Get answer from Informer agent (with built-in verification)
-            answer = self.informer_agent(full_query_text, conversation_history_str)
+            answer = self.informer_agent(full_query_text, conversation_history_str, topic_context)
             
             # Check if answer is meaningful
             if not answer or answer.strip() == "" or "không thể" in answer.lower():
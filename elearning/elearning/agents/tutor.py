@@ -11,6 +11,7 @@ import requests
 from .problem_solver import get_problem_solver
 from .learning_analyzer import get_learning_analyzer
 from .prompts import TUTOR_TEMPLATE
+from elearning.elearning.utils.gemini_grader_service import get_gemini_api_url
 
 # Import and apply math format fix
 from elearning.elearning.doctype.chat_message.chat_message import fix_math_format
@@ -24,7 +25,7 @@ class TutorAgent:
         self.api_key = frappe.conf.get("gemini_api_key")
         self.api_url = None
         if self.api_key:
-            self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={self.api_key}"
+            self.api_url = get_gemini_api_url("gemini-1.5-flash", self.api_key)
         self.problem_solver = get_problem_solver()
         self.learning_analyzer = get_learning_analyzer()
     
@@ -41,7 +42,7 @@ class TutorAgent:
             intent = self._classify_intent_from_input(user_input)
             
             if intent == "math_question":
-                response = self._handle_math_question(user_input, image_data, conversation_str)
+                response = self._handle_math_question(user_input, image_data, conversation_str, topic_context)
             elif intent == "request_for_practice":
                 response = self._handle_practice_request(user, conversation_str, topic_context)
             elif intent in ["greeting_social", "expression_of_stress", "learning_support", "off_topic", "general"]:
@@ -326,7 +327,8 @@ Dựa vào tin nhắn từ học sinh, hãy phân loại ý định thành MỘT
             frappe.log_error(f"Tutor handler failed: {error_msg}", "Tutor Handler Error")
             return "Xin lỗi, tôi không thể trả lời lúc này."
     
-    def _handle_math_question(self, user_input: str, image_data: bytes, conversation_str: str) -> str:
+    def _handle_math_question(self, user_input: str, image_data: bytes, conversation_str: str,
+                              topic_context: str = None) -> str:
         """
         Handle math questions using problem solving engine
         """
@@ -334,7 +336,8 @@ Dựa vào tin nhắn từ học sinh, hãy phân loại ý định thành MỘT
             return self.problem_solver.problem_solving_engine(
                 query_text=user_input,
                 query_image=image_data,
-                conversation_history_str=conversation_str
+                conversation_history_str=conversation_str,
+                topic_context=topic_context
             )
         except Exception as e:
             frappe.log_error(f"Math question handling failed: {str(e)}")
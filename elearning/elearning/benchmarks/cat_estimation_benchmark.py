@@ -0,0 +1,127 @@
+"""
+Per-answer cost and accuracy of placement-test ability estimation.
+
+Simulates placement sessions (all topics answered round-robin up to the test
+length) and, after every answer, re-estimates every topic with
+  - legacy: the former per-topic catsim MLE (bounded minimize_scalar run from four
+    "starting points", +/-4 clamps for all-correct / all-wrong), and
+  - eap / map: the vectorized quadrature estimator in utils.cat_estimation.
+Reports per-answer latency percentiles and final RMSE/bias against the true theta.
+
+Usage (inside the bench virtualenv, needs catsim and scipy for the legacy path):
+    python -m elearning.elearning.benchmarks.cat_estimation_benchmark --sessions 50 --topics 10 --length 40
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from elearning.elearning.utils.cat_estimation import estimate_topic_abilities
+from elearning.elearning.utils.placement_item_bank import DEFAULT_GUESSING, UPPER_ASYMPTOTE
+
+
+def legacy_estimate(responses, item_params, current_theta=0.0):
+    """The MLE path placement_test used before the quadrature estimator"""
+    from catsim.irt import negative_log_likelihood, see
+    from scipy.optimize import minimize_scalar
+
+    if not responses:
+        return current_theta, 1.0
+    if sum(responses) == 0:
+        return -4.0, 0.8
+    if sum(responses) == len(responses):
+        return 4.0, 0.8
+
+    best_theta, best_likelihood = current_theta, float("inf")
+    for _ in (current_theta, 0.0, -1.0, 1.0):
+        res = minimize_scalar(
+            negative_log_likelihood,
+            args=(responses, item_params),
+            bounds=(-4.0, 4.0),
+            method="bounded",
+            options={"xatol": 1e-8, "maxiter": 100},
+        )
+        if res.success and res.fun < best_likelihood:
+            best_likelihood, best_theta = res.fun, res.x
+    return float(best_theta), float(max(0.1, min(2.0, see(best_theta, item_params))))
+
+
+def make_bank(topics, items_per_topic, rng):
+    return [
+        np.column_stack(
+            [
+                rng.uniform(0.6, 2.0, items_per_topic),
+                rng.normal(0.0, 1.2, items_per_topic),
+                np.full(items_per_topic, DEFAULT_GUESSING),
+                np.full(items_per_topic, UPPER_ASYMPTOTE),
+            ]
+        )
+        for _ in range(topics)
+    ]
+
+
+def simulate_session(bank, true_theta, length, rng, methods):
+    topics = len(bank)
+    answered = [[] for _ in range(topics)]
+    latencies = {method: [] for method in methods}
+    estimates = {}
+
+    for step in range(length):
+        topic = step % topics
+        params = bank[topic][len(answered[topic]) % len(bank[topic])]
+        a, b, c, d = params
+        p_correct = c + (d - c) / (1.0 + np.exp(-a * (true_theta[topic] - b)))
+        answered[topic].append((params, bool(rng.random() < p_correct)))
+
+        topic_responses = {
+            str(t): (np.array([p for p, _ in rows]).reshape(-1, 4), [r for _, r in rows]) for t, rows in enumerate(answered)
+        }
+        for method in methods:
+            started = time.perf_counter()
+            if method == "legacy":
+                result = {t: legacy_estimate(list(r), p) for t, (p, r) in topic_responses.items()}
+            else:
+                result = estimate_topic_abilities(topic_responses, method=method)
+            latencies[method].append(time.perf_counter() - started)
+            estimates[method] = np.array([result[str(t)][0] for t in range(topics)])
+
+    return latencies, estimates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy MLE vs vectorized EAP/MAP ability estimation")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--items-per-topic", type=int, default=60)
+    parser.add_argument("--length", type=int, default=40, help="Answers per session")
+    parser.add_argument("--methods", default="legacy,eap,map")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    methods = args.methods.split(",")
+    rng = np.random.default_rng(args.seed)
+    bank = make_bank(args.topics, args.items_per_topic, rng)
+
+    latencies = {method: [] for method in methods}
+    errors = {method: [] for method in methods}
+    for _ in range(args.sessions):
+        true_theta = rng.normal(0.0, 1.0, args.topics)
+        session_latencies, estimates = simulate_session(bank, true_theta, args.length, rng, methods)
+        for method in methods:
+            latencies[method].extend(session_latencies[method])
+            errors[method].extend(estimates[method] - true_theta)
+
+    print(f"{args.sessions} sessions x {args.length} answers, {args.topics} topics re-estimated per answer")
+    print(f"{'method':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rmse':>7} {'bias':>7}")
+    for method in methods:
+        ms = np.asarray(latencies[method]) * 1000
+        err = np.asarray(errors[method])
+        print(
+            f"{method:>8} {np.percentile(ms, 50):>9.3f} {np.percentile(ms, 95):>9.3f} {np.percentile(ms, 99):>9.3f} "
+            f"{np.sqrt(np.mean(err**2)):>7.3f} {np.mean(err):>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
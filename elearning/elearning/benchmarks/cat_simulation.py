@@ -0,0 +1,230 @@
+"""
+Offline CAT simulation for the placement test engine.
+
+Virtual examinees with known per-topic abilities take the placement test through
+the real selection, estimation and termination functions of placement_test,
+answering according to the 4PL model. The item bank is pinned in memory, so no
+database or Redis is touched. Examinees are split across worker processes.
+
+Reports test length, bias / RMSE / final SE of the ability estimates, item
+exposure and per-step engine latency. Engine constants can be overridden to
+compare termination and utility settings.
+
+Usage (inside the bench virtualenv):
+    # synthetic bank: 10 topics x 60 items
+    python -m elearning.elearning.benchmarks.cat_simulation --examinees 5000 --workers 8
+    # the site's Placement Questions
+    python -m elearning.elearning.benchmarks.cat_simulation --site mysite.local --examinees 5000
+    # alternative settings
+    python -m elearning.elearning.benchmarks.cat_simulation --se-threshold 0.4 --min-per-topic 2 --se-exponent 1
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+
+from elearning.elearning.utils.placement_item_bank import (
+    DEFAULT_GUESSING,
+    UPPER_ASYMPTOTE,
+    ItemBank,
+    TopicItems,
+    load_item_bank,
+    pin_item_bank,
+)
+from elearning.elearning.utils.placement_session_state import SessionState
+
+ENGINE_SETTINGS = {
+    "se_threshold": "STANDARD_ERROR_THRESHOLD",
+    "max_total": "MAX_QUESTIONS_TOTAL",
+    "min_per_topic": "MIN_QUESTIONS_PER_TOPIC",
+    "max_per_topic": "MAX_QUESTIONS_PER_TOPIC",
+    "se_exponent": "SE_PRIORITY_EXPONENT",
+}
+
+_engine = None
+
+
+def make_synthetic_bank(topics, items_per_topic, seed=0) -> ItemBank:
+    rng = np.random.default_rng(seed)
+    bank = {}
+    for t in range(1, topics + 1):
+        topic = str(t)
+        names = [f"SIM-{topic}-{i:04d}" for i in range(items_per_topic)]
+        params = np.column_stack(
+            [
+                rng.lognormal(0.2, 0.3, items_per_topic),
+                rng.normal(0.0, 1.2, items_per_topic),
+                np.full(items_per_topic, DEFAULT_GUESSING),
+                np.full(items_per_topic, UPPER_ASYMPTOTE),
+            ]
+        )
+        bank[topic] = TopicItems(topic, names, params, [{"id": n, "topic_name": topic, "options": []} for n in names])
+    return ItemBank(bank, "simulation")
+
+
+def load_site_bank(site) -> ItemBank:
+    import frappe
+
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        return load_item_bank("simulation")
+    finally:
+        frappe.destroy()
+
+
+def draw_abilities(rng, count, topics, distribution, topic_sd):
+    """General ability from `distribution` ("normal:mean,sd" or "uniform:low,high") plus per-topic deviation"""
+    kind, _, args = distribution.partition(":")
+    first, second = (float(x) for x in args.split(","))
+    if kind == "normal":
+        general = rng.normal(first, second, count)
+    elif kind == "uniform":
+        general = rng.uniform(first, second, count)
+    else:
+        raise ValueError(f"Unknown theta distribution: {distribution}")
+    return general[:, None] + rng.normal(0.0, topic_sd, (count, topics))
+
+
+def _init_worker(bank, settings):
+    global _engine
+    from elearning.elearning.doctype.test import placement_test
+
+    pin_item_bank(bank)
+    for option, constant in ENGINE_SETTINGS.items():
+        if settings.get(option) is not None:
+            setattr(placement_test, constant, settings[option])
+    _engine = placement_test
+
+
+def simulate_examinees(job):
+    """Run one chunk of examinees; returns per-examinee results, step latencies and exposure"""
+    abilities, seed = job
+    from elearning.elearning.utils.placement_item_bank import get_item_bank
+
+    bank = get_item_bank()
+    topics = list(bank.topics)
+    rng = np.random.default_rng(seed)
+    lengths, estimates, errors, latencies = [], [], [], []
+    exposure = Counter()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for true_theta in abilities:
+            state = SessionState("simulation")
+            for topic in topics:
+                state.set_ability(topic, 0.0, 1.0)
+
+            started = time.perf_counter()
+            question = _engine._get_next_question_with_catsim(state)
+            latencies.append(time.perf_counter() - started)
+
+            while question:
+                exposure[question] += 1
+                topic = bank.topic_of[question]
+                a, b, c, d = bank.params(question)
+                p_correct = c + (d - c) / (1.0 + np.exp(-a * (true_theta[topics.index(topic)] - b)))
+                started = time.perf_counter()
+                _, question = _engine._advance_state(state, question, topic, rng.random() < p_correct)
+                latencies.append(time.perf_counter() - started)
+
+            lengths.append(state.total_answered)
+            estimates.append([state.abilities[t][0] for t in topics])
+            errors.append([state.abilities[t][1] for t in topics])
+
+    return {
+        "lengths": lengths,
+        "estimates": estimates,
+        "standard_errors": errors,
+        "latencies": latencies,
+        "exposure": exposure,
+    }
+
+
+def summarize(bank, true_abilities, results, examinees):
+    lengths = np.concatenate([r["lengths"] for r in results])
+    estimates = np.concatenate([r["estimates"] for r in results])
+    standard_errors = np.concatenate([r["standard_errors"] for r in results])
+    latencies = np.concatenate([r["latencies"] for r in results]) * 1000
+    exposure = Counter()
+    for r in results:
+        exposure.update(r["exposure"])
+
+    error = estimates - true_abilities
+    exposure_rates = np.array([exposure.get(name, 0) for name in bank.topic_of]) / examinees
+    return {
+        "examinees": int(examinees),
+        "test_length": {
+            "mean": round(float(lengths.mean()), 2),
+            "p50": int(np.percentile(lengths, 50)),
+            "p90": int(np.percentile(lengths, 90)),
+            "max": int(lengths.max()),
+        },
+        "bias": round(float(error.mean()), 4),
+        "rmse": round(float(np.sqrt((error**2).mean())), 4),
+        "correlation": round(float(np.corrcoef(estimates.ravel(), true_abilities.ravel())[0, 1]), 4),
+        "mean_final_se": round(float(standard_errors.mean()), 4),
+        "per_topic_rmse": {
+            topic: round(float(np.sqrt((error[:, i] ** 2).mean())), 4) for i, topic in enumerate(bank.topics)
+        },
+        "exposure": {
+            "max_rate": round(float(exposure_rates.max()), 4),
+            "items_never_used": round(float((exposure_rates == 0).mean()), 4),
+            "items_over_20pct": int((exposure_rates > 0.2).sum()),
+        },
+        "step_latency_ms": {
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate placement tests against the CAT engine")
+    parser.add_argument("--examinees", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--site", help="Use this site's Placement Questions instead of a synthetic bank")
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--items-per-topic", type=int, default=60)
+    parser.add_argument("--theta-dist", default="normal:0,1", help="normal:mean,sd or uniform:low,high")
+    parser.add_argument("--topic-sd", type=float, default=0.5, help="Spread of topic abilities around the general ability")
+    parser.add_argument("--se-threshold", type=float)
+    parser.add_argument("--max-total", type=int)
+    parser.add_argument("--min-per-topic", type=int)
+    parser.add_argument("--max-per-topic", type=int)
+    parser.add_argument("--se-exponent", type=float, help="Exponent of SE in the adaptive utility")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-output")
+    args = parser.parse_args()
+
+    bank = load_site_bank(args.site) if args.site else make_synthetic_bank(args.topics, args.items_per_topic, args.seed)
+    rng = np.random.default_rng(args.seed)
+    true_abilities = draw_abilities(rng, args.examinees, len(bank.topics), args.theta_dist, args.topic_sd)
+    jobs = [
+        (true_abilities[start : start + args.chunk_size], args.seed + 1 + i)
+        for i, start in enumerate(range(0, args.examinees, args.chunk_size))
+    ]
+    settings = {option: getattr(args, option) for option in ENGINE_SETTINGS}
+
+    started = time.perf_counter()
+    with Pool(args.workers, initializer=_init_worker, initargs=(bank, settings)) as pool:
+        results = pool.map(simulate_examinees, jobs)
+    report = summarize(bank, true_abilities, results, args.examinees)
+    report["wall_seconds"] = round(time.perf_counter() - started, 2)
+    report["settings"] = {k: v for k, v in settings.items() if v is not None}
+
+    print(json.dumps(report, indent=2))
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Latency and parity benchmark for the embedding backends (PyTorch vs ONNX Runtime).
+
+Uses the Learning Object texts shipped in agents/data/learning_objects_index.json.
+Reports single-query latency (the informer_agent / find_best_matching_lo path),
+batched throughput, and cosine / retrieval agreement of each ONNX variant with PyTorch.
+
+Usage (inside the bench virtualenv, after onnx_embedding.export_onnx_model):
+    python -m elearning.elearning.benchmarks.embedding_backend_benchmark \
+        --onnx-dir sites/../apps/elearning/elearning/elearning/agents/data/onnx/<model> --repeats 200
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from elearning.elearning.utils.embedding_registry import DEFAULT_EMBEDDING_MODEL, EmbeddingModel
+from elearning.elearning.utils.onnx_embedding import (
+    FP32_FILE,
+    INT8_FILE,
+    OnnxEmbeddingModel,
+    compare_embedding_backends,
+)
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "agents", "data", "learning_objects_index.json")
+
+
+def measure(model, queries, corpus, repeats, batch_size):
+    model.embed_array(queries[:4])  # load and warm up
+
+    latencies = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        model.embed_array([queries[i % len(queries)]])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    model.embed_array(corpus, batch_size=batch_size)
+    throughput = len(corpus) / (time.perf_counter() - started)
+
+    return {
+        "single_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "single_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "batch_texts_per_s": round(throughput, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyTorch vs ONNX embedding latency and parity")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--onnx-dir", required=True)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--json-output")
+    args = parser.parse_args()
+
+    with open(DATA_FILE, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    corpus = [item["content"] for item in items]
+    queries = [item["title"] for item in items]
+
+    reference = EmbeddingModel(args.model)
+    backends = {"torch": reference}
+    for label, onnx_file in (("onnx-fp32", FP32_FILE), ("onnx-int8", INT8_FILE)):
+        if os.path.exists(os.path.join(args.onnx_dir, onnx_file)):
+            backends[label] = OnnxEmbeddingModel(args.model, args.onnx_dir, onnx_file=onnx_file)
+
+    report = {}
+    for label, model in backends.items():
+        report[label] = measure(model, queries, corpus, args.repeats, args.batch_size)
+        if label != "torch":
+            report[label].update(
+                {key: round(value, 4) for key, value in compare_embedding_backends(reference, model, corpus, queries).items()}
+            )
+        print(f"{label:>10}: " + "  ".join(f"{key}={value}" for key, value in report[label].items()))
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
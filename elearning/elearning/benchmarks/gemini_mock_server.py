@@ -0,0 +1,298 @@
+"""
+Local stand-in for the Gemini REST API used to benchmark the agents and grading
+without calling Google.
+
+Serves `POST /v1beta/models/<model>:generateContent` and
+`POST /v1beta/models/<model>:streamGenerateContent` (JSON array, or SSE with `?alt=sse`).
+
+Usage:
+    python -m elearning.elearning.benchmarks.gemini_mock_server --port 8765 \
+        --latency lognormal:1.2:0.4 --rate-limit 0.05 --mode echo
+
+Then point the site at it (site_config.json):
+    "gemini_api_base_url": "http://127.0.0.1:8765/v1beta"
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROUTE_PATTERN = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+
+# Returned when the caller asks for `response_mime_type: application/json`
+# (essay grading) and no canned response matches.
+DEFAULT_JSON_RESPONSE = {
+    "total_score_awarded": 0.0,
+    "overall_feedback": "Phản hồi giả lập từ máy chủ mock.",
+    "rubric_scores": [],
+}
+
+
+def parse_latency(spec):
+    """
+    Parse a latency spec into a zero-argument sampler returning seconds.
+
+    Supported specs:
+        fixed:<s>                 constant delay
+        uniform:<low>:<high>
+        normal:<mean>:<std>
+        lognormal:<median>:<sigma>  median in seconds, sigma of the underlying normal
+        exponential:<mean>
+    """
+    if not spec:
+        return lambda: 0.0
+
+    name, _, rest = spec.partition(":")
+    args = [float(a) for a in rest.split(":") if a]
+
+    if name == "fixed":
+        return lambda: args[0]
+    if name == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if name == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if name == "lognormal":
+        mu = math.log(args[0])
+        return lambda: random.lognormvariate(mu, args[1])
+    if name == "exponential":
+        return lambda: random.expovariate(1.0 / args[0])
+
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) for usageMetadata"""
+    return max(1, len(text or "") // 4)
+
+
+class MockConfig:
+    """Runtime behaviour shared by all request handlers"""
+
+    def __init__(self, latency, rate_limit=0.0, mode="echo", canned=None, chunk_count=4, seed=None):
+        self.sample_latency = parse_latency(latency)
+        self.rate_limit = rate_limit
+        self.mode = mode
+        self.canned = canned or []
+        self.chunk_count = max(1, chunk_count)
+        self.stats = {"requests": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        if seed is not None:
+            random.seed(seed)
+
+    def record(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def build_text(self, prompt_text, wants_json):
+        """Pick the response text for a prompt according to the configured mode"""
+        if self.mode == "canned":
+            for entry in self.canned:
+                match = entry.get("match")
+                if not match or match in prompt_text:
+                    response = entry.get("response", "")
+                    return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+
+        if wants_json:
+            return json.dumps(DEFAULT_JSON_RESPONSE, ensure_ascii=False)
+
+        if self.mode == "echo":
+            return f"[mock] {prompt_text[-500:]}"
+
+        return "[mock] Đây là phản hồi giả lập."
+
+
+def _extract_prompt_text(payload):
+    parts_text = []
+    for content in payload.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                parts_text.append(part["text"])
+    return "\n".join(parts_text)
+
+
+def _wants_json(payload):
+    generation_config = payload.get("generationConfig") or {}
+    mime_type = generation_config.get("response_mime_type") or generation_config.get("responseMimeType")
+    return mime_type == "application/json"
+
+
+def _candidate(text, finish_reason="STOP"):
+    return {
+        "content": {"role": "model", "parts": [{"text": text}]},
+        "finishReason": finish_reason,
+        "index": 0,
+    }
+
+
+def _usage(prompt_text, output_text):
+    prompt_tokens = estimate_tokens(prompt_text)
+    output_tokens = estimate_tokens(output_text)
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens,
+    }
+
+
+def make_handler(config):
+    class GeminiMockHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Keep the console quiet under load
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/stats":
+                self._send_json(200, config.stats)
+            else:
+                self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+        def do_POST(self):
+            parsed = urlparse(self.path)
+            route = ROUTE_PATTERN.match(parsed.path)
+            if not route:
+                self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload", "status": "INVALID_ARGUMENT"}})
+                return
+
+            config.record("requests")
+            time.sleep(config.sample_latency())
+
+            if config.rate_limit and random.random() < config.rate_limit:
+                config.record("rate_limited")
+                self._send_json(
+                    429,
+                    {
+                        "error": {
+                            "code": 429,
+                            "message": "Resource has been exhausted (e.g. check quota).",
+                            "status": "RESOURCE_EXHAUSTED",
+                        }
+                    },
+                )
+                return
+
+            prompt_text = _extract_prompt_text(payload)
+            text = config.build_text(prompt_text, _wants_json(payload))
+
+            if route.group("method") == "generateContent":
+                self._send_json(
+                    200,
+                    {
+                        "candidates": [_candidate(text)],
+                        "usageMetadata": _usage(prompt_text, text),
+                        "modelVersion": route.group("model"),
+                    },
+                )
+                return
+
+            self._stream(prompt_text, text, parse_qs(parsed.query).get("alt") == ["sse"])
+
+        def _stream(self, prompt_text, text, use_sse):
+            """Split the response into chunks, pacing them with the latency sampler"""
+            chunk_size = max(1, len(text) // config.chunk_count + 1)
+            pieces = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+            chunks = []
+            for i, piece in enumerate(pieces):
+                last = i == len(pieces) - 1
+                chunk = {"candidates": [_candidate(piece, "STOP" if last else None)]}
+                if last:
+                    chunk["usageMetadata"] = _usage(prompt_text, text)
+                chunks.append(chunk)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream" if use_sse else "application/json; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            for i, chunk in enumerate(chunks):
+                body = json.dumps(chunk, ensure_ascii=False)
+                if use_sse:
+                    frame = f"data: {body}\r\n\r\n"
+                else:
+                    frame = ("[" if i == 0 else ",") + body + ("]" if i == len(chunks) - 1 else "")
+                self._write_chunk(frame.encode("utf-8"))
+                if i < len(chunks) - 1:
+                    time.sleep(config.sample_latency() / len(chunks))
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return GeminiMockHandler
+
+
+def run_server(host="127.0.0.1", port=8765, **config_kwargs):
+    config = MockConfig(**config_kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    print(f"Gemini mock server listening on http://{host}:{port}/v1beta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {config.stats['requests']} requests, {config.stats['rate_limited']} rate limited")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini generateContent / streamGenerateContent stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency",
+        default="lognormal:1.0:0.5",
+        help="fixed:<s> | uniform:<lo>:<hi> | normal:<mean>:<std> | lognormal:<median>:<sigma> | exponential:<mean>",
+    )
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--mode", choices=["echo", "canned", "static"], default="echo")
+    parser.add_argument(
+        "--canned-file",
+        help='JSON list of {"match": "<substring>", "response": <str|object>}; first match wins, empty match is a catch-all',
+    )
+    parser.add_argument("--chunks", type=int, default=4, help="Number of chunks for streamGenerateContent")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    canned = []
+    if args.canned_file:
+        with open(args.canned_file, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+
+    run_server(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        mode=args.mode,
+        canned=canned,
+        chunk_count=args.chunks,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Load-test harness for the LLM-backed endpoints.
+
+Drives one of the following scenarios against a running site at a fixed concurrency
+and reports throughput and latency percentiles:
+
+    chat          elearning.elearning.agents.tutor.handle_chat_message
+    test_attempt  start_or_resume_test_attempt + submit_test_attempt
+    srs           submit_srs_answer_and_get_feedback
+
+Run the site against gemini_mock_server.py (`gemini_api_base_url` in site_config.json)
+to size workers without spending API quota.
+
+Usage:
+    python -m elearning.elearning.benchmarks.load_test --base-url http://localhost:8000 \
+        --auth "token api_key:api_secret" --scenario chat --concurrency 16 --requests 400
+
+Pass `--auth` several times to spread the load over multiple users (round robin). The
+test_attempt scenario needs one user per concurrent worker, since a user can only have one
+In Progress attempt per test.
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+API_PREFIX = "/api/method/"
+CHAT_METHOD = "elearning.elearning.agents.tutor.handle_chat_message"
+START_ATTEMPT_METHOD = "elearning.elearning.doctype.test_attempt.test_attempt.start_or_resume_test_attempt"
+SUBMIT_ATTEMPT_METHOD = "elearning.elearning.doctype.test_attempt.test_attempt.submit_test_attempt"
+SRS_FEEDBACK_METHOD = (
+    "elearning.elearning.doctype.user_srs_progress.user_srs_progress.submit_srs_answer_and_get_feedback"
+)
+
+CHAT_PROMPTS = [
+    "Giải thích giúp em định lý Pythagore.",
+    "Làm sao để giải phương trình bậc hai x^2 - 5x + 6 = 0?",
+    "Em chưa hiểu cách tính diện tích hình thang.",
+    "Cho em một ví dụ về hàm số bậc nhất.",
+]
+
+ESSAY_ANSWER = "Ta có a^2 + b^2 = c^2 nên c = 5. Vậy độ dài cạnh huyền bằng 5."
+SRS_ANSWER = "Tổng bình phương hai cạnh góc vuông bằng bình phương cạnh huyền."
+
+
+class VirtualUser:
+    """An authenticated HTTP session bound to one set of credentials"""
+
+    def __init__(self, base_url, auth_header, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if auth_header:
+            self.session.headers["Authorization"] = auth_header
+        self.lock = threading.Lock()
+
+    def call(self, method, http_method="POST", **kwargs):
+        url = f"{self.base_url}{API_PREFIX}{method}"
+        return self.session.request(http_method, url, timeout=self.timeout, **kwargs)
+
+
+def _message(response):
+    try:
+        return response.json().get("message")
+    except ValueError:
+        return None
+
+
+def run_chat(user, iteration, args):
+    session_id = f"loadtest-{threading.get_ident()}"
+    return user.call(
+        CHAT_METHOD,
+        data={
+            "user": args.user or "loadtest@example.com",
+            "user_input": CHAT_PROMPTS[iteration % len(CHAT_PROMPTS)],
+            "conversation_history": "",
+            "session_id": session_id,
+            "attachment_count": 0,
+        },
+    )
+
+
+def _build_submission(questions):
+    answers = {}
+    for question in questions:
+        options = question.get("options") or []
+        if question.get("question_type") == "Multiple Choice" and options:
+            user_answer = options[0].get("id")
+        else:
+            user_answer = ESSAY_ANSWER
+        answers[question["test_question_detail_id"]] = {
+            "userAnswer": user_answer,
+            "timeSpent": 30,
+            "base64_images": [],
+        }
+    return {"answers": answers, "timeLeft": 0, "markedForReview": []}
+
+
+def run_test_attempt(user, iteration, args):
+    # A user can only hold one In Progress attempt per test, so the start + submit pair
+    # is serialized per virtual user; concurrency comes from having several users.
+    with user.lock:
+        start = user.call(START_ATTEMPT_METHOD, http_method="GET", params={"test_id": args.test_id})
+        if start.status_code != 200:
+            return start
+
+        payload = _message(start) or {}
+        attempt_id = (payload.get("attempt") or {}).get("id")
+        submission = _build_submission(payload.get("questions") or [])
+
+        return user.call(
+            SUBMIT_ATTEMPT_METHOD,
+            data={"attempt_id": attempt_id, "submission_data": json.dumps(submission, ensure_ascii=False)},
+        )
+
+
+def run_srs(user, iteration, args):
+    return user.call(
+        SRS_FEEDBACK_METHOD,
+        json={
+            "flashcard_name": args.flashcard,
+            "user_answer": SRS_ANSWER,
+            "previous_answers": [],
+        },
+    )
+
+
+SCENARIOS = {
+    "chat": run_chat,
+    "test_attempt": run_test_attempt,
+    "srs": run_srs,
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    """Thread-safe collector of per-request latency and outcome"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, latency, status=None, error=None):
+        with self._lock:
+            self.latencies.append(latency)
+            if status is not None:
+                self.statuses[status] += 1
+            if error is not None:
+                self.errors[error] += 1
+
+    def summary(self, wall_time):
+        latencies = sorted(self.latencies)
+        total = len(latencies)
+        ok = sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+        return {
+            "requests": total,
+            "successful": ok,
+            "failed": total - ok,
+            "wall_time_s": round(wall_time, 3),
+            "throughput_rps": round(total / wall_time, 3) if wall_time > 0 else 0.0,
+            "latency_s": {
+                "mean": round(sum(latencies) / total, 4) if total else 0.0,
+                "p50": round(percentile(latencies, 50), 4),
+                "p90": round(percentile(latencies, 90), 4),
+                "p95": round(percentile(latencies, 95), 4),
+                "p99": round(percentile(latencies, 99), 4),
+                "max": round(latencies[-1], 4) if latencies else 0.0,
+            },
+            "status_codes": {str(k): v for k, v in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+        }
+
+
+def run_load_test(args):
+    scenario = SCENARIOS[args.scenario]
+    users = [VirtualUser(args.base_url, auth, args.timeout) for auth in (args.auth or [None])]
+    user_cycle = itertools.cycle(users)
+    cycle_lock = threading.Lock()
+    counter = itertools.count()
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    def worker():
+        while True:
+            iteration = next(counter)
+            if deadline is None and iteration >= args.requests:
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+
+            with cycle_lock:
+                user = next(user_cycle)
+
+            started = time.perf_counter()
+            try:
+                response = scenario(user, iteration, args)
+                recorder.add(time.perf_counter() - started, status=response.status_code)
+            except requests.RequestException as e:
+                recorder.add(time.perf_counter() - started, error=type(e).__name__)
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(args.concurrency)]
+        for future in futures:
+            future.result()
+
+    return recorder.summary(time.perf_counter() - wall_started)
+
+
+def print_summary(args, summary):
+    latency = summary["latency_s"]
+    print(f"Scenario: {args.scenario}  concurrency: {args.concurrency}  users: {len(args.auth or [None])}")
+    print(
+        f"Requests: {summary['requests']}  ok: {summary['successful']}  failed: {summary['failed']}  "
+        f"wall: {summary['wall_time_s']}s  throughput: {summary['throughput_rps']} req/s"
+    )
+    print(
+        f"Latency (s): mean {latency['mean']}  p50 {latency['p50']}  p90 {latency['p90']}  "
+        f"p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}"
+    )
+    print(f"Status codes: {summary['status_codes']}")
+    if summary["errors"]:
+        print(f"Transport errors: {summary['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the LLM-backed endpoints")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--auth",
+        action="append",
+        help='Authorization header value, e.g. "token key:secret" or "Bearer <jwt>". Repeat for more users.',
+    )
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="chat")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="Total requests (ignored when --duration is set)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed count")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--user", help="`user` argument for handle_chat_message")
+    parser.add_argument("--test-id", help="Test to attempt in the test_attempt scenario")
+    parser.add_argument("--flashcard", help="Flashcard name for the srs scenario")
+    parser.add_argument("--json-output", help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    if args.scenario == "test_attempt" and not args.test_id:
+        parser.error("--test-id is required for the test_attempt scenario")
+    if args.scenario == "srs" and not args.flashcard:
+        parser.error("--flashcard is required for the srs scenario")
+
+    summary = run_load_test(args)
+    print_summary(args, summary)
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump({"scenario": args.scenario, "concurrency": args.concurrency, **summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
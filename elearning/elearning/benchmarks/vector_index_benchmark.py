@@ -0,0 +1,145 @@
+"""
+Recall / latency benchmark for the partitioned IVF vector index.
+
+Builds synthetic clustered corpora (topics -> concepts -> chunks) at several sizes,
+then compares IVF search at a range of nprobe values against the exact scan, both
+over the whole index and restricted to one topic partition.
+
+Usage (inside the bench virtualenv):
+    python -m elearning.elearning.benchmarks.vector_index_benchmark \
+        --sizes 1000,10000,100000,1000000 --dim 768 --queries 200 --nprobe 1,4,8,16,32
+
+1M x 768 float16 needs about 1.5 GB of disk and a few GB of RAM while building.
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from elearning.elearning.utils.vector_index import open_vector_index, write_vector_index
+
+
+def make_corpus(size, dim, topics, concepts_per_topic, seed=0):
+    """Clustered unit-ish vectors with a "topic" meta field; returns (float16 matrix, records)"""
+    rng = np.random.default_rng(seed)
+    topic_centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    concept_centers = (
+        topic_centers[:, None, :] + 0.6 * rng.normal(size=(topics, concepts_per_topic, dim))
+    ).astype(np.float32)
+
+    vectors = np.empty((size, dim), dtype=np.float16)
+    topic_of_row = rng.integers(0, topics, size=size)
+    concept_of_row = rng.integers(0, concepts_per_topic, size=size)
+    block = 50000
+    for start in range(0, size, block):
+        end = min(size, start + block)
+        centers = concept_centers[topic_of_row[start:end], concept_of_row[start:end]]
+        chunk = centers + 0.5 * rng.normal(size=(end - start, dim)).astype(np.float32)
+        chunk /= np.linalg.norm(chunk, axis=1, keepdims=True)
+        vectors[start:end] = chunk
+
+    records = [{"id": str(i), "content": "", "meta": {"topic": int(topic_of_row[i])}} for i in range(size)]
+    return vectors, records
+
+
+def make_queries(vectors, records, count, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=count, replace=False)
+    queries = vectors[rows].astype(np.float32) + 0.3 * rng.normal(size=(count, vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries, [records[i]["meta"]["topic"] for i in rows]
+
+
+def timed_search(index, queries, top_k, partitions=None, **kwargs):
+    latencies, results = [], []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        results.append(index.search(query, top_k=top_k, partition=partitions[i] if partitions else None, **kwargs))
+        latencies.append(time.perf_counter() - started)
+    return results, np.asarray(latencies) * 1000
+
+
+def recall_at_k(approximate, exact):
+    hits = total = 0
+    for approx_hits, exact_hits in zip(approximate, exact):
+        expected = {record["id"] for _, record in exact_hits}
+        hits += len(expected & {record["id"] for _, record in approx_hits})
+        total += len(expected)
+    return hits / total if total else 1.0
+
+
+def run_size(size, args):
+    vectors, records = make_corpus(size, args.dim, args.topics, args.concepts, seed=args.seed)
+    queries, query_topics = make_queries(vectors, records, min(args.queries, size), seed=args.seed + 1)
+
+    index_dir = tempfile.mkdtemp(prefix="vector_index_bench_")
+    try:
+        started = time.perf_counter()
+        write_vector_index("bench", vectors, records, partition_key="topic", index_dir=index_dir)
+        build_seconds = time.perf_counter() - started
+        del vectors
+
+        index = open_vector_index(index_dir, "bench")
+        rows = []
+        for scope, partitions in (("global", None), ("topic", query_topics)):
+            exact, exact_ms = timed_search(index, queries, args.top_k, partitions, exact=True)
+            rows.append(_row(size, scope, "exact", 1.0, exact_ms))
+            if index.centroids is None:
+                continue
+            for nprobe in args.nprobe:
+                approx, approx_ms = timed_search(index, queries, args.top_k, partitions, nprobe=nprobe)
+                rows.append(_row(size, scope, f"ivf nprobe={nprobe}", recall_at_k(approx, exact), approx_ms))
+        return {"size": size, "build_seconds": round(build_seconds, 2), "results": rows}
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def _row(size, scope, method, recall, latencies_ms):
+    return {
+        "size": size,
+        "scope": scope,
+        "method": method,
+        "recall": round(recall, 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the partitioned IVF vector index")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--concepts", type=int, default=50, help="Concept clusters per topic")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-output")
+    args = parser.parse_args()
+    args.nprobe = [int(n) for n in args.nprobe.split(",")]
+
+    report = []
+    print(f"{'size':>9} {'scope':>6} {'method':>16} {'recall@' + str(args.top_k):>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        size_report = run_size(size, args)
+        report.append(size_report)
+        for row in size_report["results"]:
+            print(
+                f"{row['size']:>9} {row['scope']:>6} {row['method']:>16} {row['recall']:>9} "
+                f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+            )
+        print(f"{size:>9} built in {size_report['build_seconds']}s")
+
+    if args.json_output:
+        with open(args.json_output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from frappe.model.document import Document
 from frappe.utils import now_datetime
 import requests
 import re
+from elearning.elearning.utils.gemini_grader_service import get_gemini_api_url
 
 
 class ChatMessage(Document):
@@ -145,7 +146,7 @@ def call_gemini_ai(content, attachments_info=None):
         if not api_key:
             return "Xin lỗi, tôi không thể trả lời lúc này. API key chưa được cấu hình."
 
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        api_url = get_gemini_api_url("gemini-2.0-flash", api_key)
 
         # System prompt for educational context - Trợ lý toán học thân thiện
         system_prompt = """Bạn là một trợ lý toán học thân thiện và kiên nhẫn, chuyên hỗ trợ học sinh Việt Nam từ lớp 6 đến lớp 12. Vai trò của bạn là:
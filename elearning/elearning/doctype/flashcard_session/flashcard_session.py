@@ -6,9 +6,34 @@ from frappe.model.document import Document
 from frappe import _
 from frappe.utils import now_datetime, getdate, add_days, get_datetime
 
+from elearning.elearning.utils.pacing_stats import record_session_time, remove_session_time
+
+
+def _pacing_entry(doc):
+	"""(topic, seconds) a session contributes to the pacing statistics; ended sessions only"""
+	if doc and doc.end_time:
+		return (doc.topic, doc.time_spent_seconds)
+	return None
+
 
 class FlashcardSession(Document):
-	pass
+	def on_update(self):
+		# An ended session counts towards its topic's pacing statistics; later edits
+		# of its time or topic replace the value recorded before
+		recorded = _pacing_entry(self.get_doc_before_save())
+		current = _pacing_entry(self)
+		if recorded == current:
+			return
+		if recorded:
+			remove_session_time(*recorded)
+		if current:
+			record_session_time(*current, self.end_time)
+
+	def on_trash(self):
+		# The stored values are the ones recorded by the last on_update
+		entry = _pacing_entry(self)
+		if entry:
+			remove_session_time(*entry)
 
 
 def get_current_user():
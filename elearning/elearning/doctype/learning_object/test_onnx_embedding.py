@@ -0,0 +1,57 @@
+# Copyright (c) 2025, Minh Quy and Contributors
+# See license.txt
+
+import os
+import shutil
+import tempfile
+
+from frappe.tests.utils import FrappeTestCase
+
+from elearning.elearning.utils.embedding_registry import DEFAULT_EMBEDDING_MODEL, EmbeddingModel
+from elearning.elearning.utils.onnx_embedding import (
+	CONFIG_FILE,
+	OnnxEmbeddingModel,
+	compare_embedding_backends,
+	export_onnx_model,
+	get_default_onnx_dir,
+	load_parity_texts,
+)
+
+MIN_MEAN_COSINE = 0.98
+MIN_COSINE = 0.95
+MIN_TOP1_AGREEMENT = 0.9
+TOP_K = 5
+MIN_TOPK_OVERLAP = 0.9
+
+
+class TestOnnxEmbedding(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		# Use the exported model if present, otherwise export one for this run
+		cls.onnx_dir = get_default_onnx_dir(DEFAULT_EMBEDDING_MODEL)
+		cls.export_dir = None
+		if not os.path.exists(os.path.join(cls.onnx_dir, CONFIG_FILE)):
+			cls.export_dir = cls.onnx_dir = tempfile.mkdtemp(prefix="onnx_embedding_")
+			export_onnx_model(DEFAULT_EMBEDDING_MODEL, cls.onnx_dir)
+
+	@classmethod
+	def tearDownClass(cls):
+		if cls.export_dir:
+			shutil.rmtree(cls.export_dir, ignore_errors=True)
+		super().tearDownClass()
+
+	def test_int8_model_agrees_with_pytorch(self):
+		corpus, queries = load_parity_texts()
+		parity = compare_embedding_backends(
+			EmbeddingModel(DEFAULT_EMBEDDING_MODEL),
+			OnnxEmbeddingModel(DEFAULT_EMBEDDING_MODEL, self.onnx_dir),
+			corpus,
+			queries,
+			top_k=TOP_K,
+		)
+
+		self.assertGreaterEqual(parity["mean_cosine"], MIN_MEAN_COSINE)
+		self.assertGreaterEqual(parity["min_cosine"], MIN_COSINE)
+		self.assertGreaterEqual(parity["top1_agreement"], MIN_TOP1_AGREEMENT)
+		self.assertGreaterEqual(parity[f"top{min(TOP_K, len(corpus))}_overlap"], MIN_TOPK_OVERLAP)
@@ -0,0 +1,103 @@
+# Copyright (c) 2026, Minh Quy and Contributors
+# See license.txt
+
+import math
+
+import numpy as np
+from frappe.tests.utils import FrappeTestCase
+
+from elearning.elearning.utils.cat_estimation import THETA_GRID, estimate_abilities, pack_responses
+from elearning.elearning.utils.placement_item_bank import TopicItems, fisher_information, select_item
+
+ITEMS = np.array(
+	[
+		[1.2, -1.0, 0.25, 0.95],
+		[0.8, -0.3, 0.20, 0.95],
+		[1.5, 0.4, 0.25, 0.95],
+		[1.0, 1.1, 0.15, 0.95],
+		[2.0, 0.0, 0.25, 0.95],
+	]
+)
+PATTERNS = [
+	[True, True, False, True, False],
+	[True, True, True, True, True],
+	[False, False, False, False, False],
+]
+FINE_GRID = np.linspace(-8.0, 8.0, 16001)
+
+
+def brute_force_posterior(params, answers, grid=FINE_GRID):
+	"""Normalised N(0, 1)-prior posterior on `grid`, one item at a time"""
+	density = np.exp(-0.5 * grid**2)
+	for (a, b, c, d), correct in zip(params, answers):
+		p = c + (d - c) / (1.0 + np.exp(-a * (grid - b)))
+		density = density * (p if correct else 1.0 - p)
+	return density / density.sum()
+
+
+class TestAbilityEstimation(FrappeTestCase):
+	def estimate(self, patterns, method="eap"):
+		return estimate_abilities(*pack_responses([(ITEMS, answers) for answers in patterns]), method=method)
+
+	def test_eap_matches_brute_force_posterior_mean(self):
+		theta, se = self.estimate(PATTERNS)
+
+		for i, answers in enumerate(PATTERNS):
+			weights = brute_force_posterior(ITEMS, answers)
+			mean = float(weights @ FINE_GRID)
+			sd = math.sqrt(float(weights @ FINE_GRID**2) - mean**2)
+			self.assertAlmostEqual(theta[i], mean, places=3)
+			self.assertAlmostEqual(se[i], sd, places=3)
+
+	def test_topics_are_estimated_independently(self):
+		together, _ = self.estimate(PATTERNS)
+		alone = [self.estimate([answers])[0][0] for answers in PATTERNS]
+
+		np.testing.assert_allclose(together, alone)
+
+	def test_extreme_patterns_are_finite(self):
+		for method in ("eap", "map"):
+			theta, se = self.estimate(PATTERNS[1:], method=method)
+
+			self.assertTrue(np.isfinite(theta).all())
+			self.assertTrue(np.isfinite(se).all())
+			self.assertGreater(theta[0], 0.0)
+			self.assertLess(theta[1], 0.0)
+
+	def test_map_refines_between_grid_points(self):
+		theta, _ = self.estimate(PATTERNS[:1], method="map")
+
+		mode = FINE_GRID[np.argmax(brute_force_posterior(ITEMS, PATTERNS[0]))]
+		self.assertGreater(np.abs(THETA_GRID - theta[0]).min(), 1e-3)
+		self.assertAlmostEqual(theta[0], mode, delta=5e-3)
+
+	def test_unknown_method_raises(self):
+		with self.assertRaises(ValueError):
+			self.estimate(PATTERNS[:1], method="mle")
+
+
+class TestSelectItem(FrappeTestCase):
+	def setUp(self):
+		names = [f"PQ-{i}" for i in range(len(ITEMS))]
+		self.items = TopicItems("Topic", names, ITEMS, [{} for _ in names])
+
+	def test_adaptive_picks_the_most_informative_unused_item(self):
+		information = fisher_information(0.2, ITEMS)
+		order = np.argsort(-information)
+
+		name, value = select_item(self.items, 0.2)
+		self.assertEqual(name, f"PQ-{order[0]}")
+		self.assertAlmostEqual(value, information[order[0]])
+
+		name, _ = select_item(self.items, 0.2, exclude=[f"PQ-{order[0]}"])
+		self.assertEqual(name, f"PQ-{order[1]}")
+
+	def test_coverage_picks_the_closest_difficulty(self):
+		name, gap = select_item(self.items, 1.0, phase="coverage")
+
+		self.assertEqual(name, "PQ-3")
+		self.assertAlmostEqual(gap, 0.1)
+
+	def test_exhausted_topic_returns_none(self):
+		self.assertEqual(select_item(self.items, 0.0, exclude=self.items.names), (None, 0.0))
+		self.assertEqual(select_item(None, 0.0), (None, 0.0))
@@ -0,0 +1,13 @@
+# Copyright (c) 2026, Minh Quy and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class StudentPathwayTopic(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique("Student Pathway Topic", ["snapshot", "topic"], constraint_name="unique_snapshot_topic")
@@ -0,0 +1,95 @@
+# Copyright (c) 2026, Minh Quy and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from elearning.elearning.utils.curriculum import MASTERY_THRESHOLDS
+from elearning.elearning.utils.pathway_store import (
+	VIEW_CACHE_KEY,
+	_unlock_after_change,
+	replace_pathway_rows,
+	update_topic_mastery,
+)
+
+PROFILE = "_Test Pathway Profile"
+
+
+class TestStudentPathwayTopic(FrappeTestCase):
+	def setUp(self):
+		self.snapshot = frappe.generate_hash(length=10)
+		now = frappe.utils.now()
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabStudent Pathway Snapshot` (name, student, creation, modified, owner, modified_by)
+			VALUES (%s, %s, %s, %s, 'Administrator', 'Administrator')
+			""",
+			(self.snapshot, PROFILE, now, now),
+		)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def make_rows(self, mastery):
+		replace_pathway_rows(
+			self.snapshot,
+			[
+				{"id": topic, "name": f"Chương {topic}", "mastery_weight": weight, "is_unlocked": False}
+				for topic, weight in mastery.items()
+			],
+		)
+
+	def get_row(self, topic):
+		return frappe.db.get_value(
+			"Student Pathway Topic",
+			{"snapshot": self.snapshot, "topic": topic},
+			["mastery_weight", "is_unlocked", "version"],
+			as_dict=True,
+		)
+
+	def test_version_conflict_retries_with_reread_mastery(self):
+		self.make_rows({"1": 500})
+		seen = []
+
+		def compute_mastery(old_mastery):
+			seen.append(old_mastery)
+			if len(seen) == 1:
+				# A concurrent submission commits between our read and our write
+				frappe.db.sql(
+					"""
+					UPDATE `tabStudent Pathway Topic`
+					SET mastery_weight = 600, version = version + 1
+					WHERE snapshot = %s AND topic = '1'
+					""",
+					(self.snapshot,),
+				)
+			return old_mastery + 100
+
+		result = update_topic_mastery(PROFILE, "1", compute_mastery)
+
+		self.assertEqual(seen, [500, 600])
+		self.assertEqual(result, {"old": 600, "new": 700})
+		row = self.get_row("1")
+		self.assertEqual(row.mastery_weight, 700)
+		self.assertEqual(row.version, 2)
+
+	def test_unlock_after_change_unlocks_ready_direct_dependents(self):
+		partial = MASTERY_THRESHOLDS["partial"]
+		# 2 and 3 depend on 1; 5 depends on 4, not directly on 1
+		self.make_rows({"1": partial, "2": partial, "3": partial - 1, "4": partial, "5": partial})
+
+		_unlock_after_change(self.snapshot, "1")
+
+		self.assertTrue(self.get_row("2").is_unlocked)
+		self.assertFalse(self.get_row("3").is_unlocked)
+		self.assertFalse(self.get_row("5").is_unlocked)
+
+	def test_pathway_view_is_dropped_again_after_commit(self):
+		self.make_rows({"1": 500})
+
+		update_topic_mastery(PROFILE, "1", lambda old_mastery: old_mastery + 100)
+		# A concurrent reader caches the view before our transaction commits
+		frappe.cache().hset(VIEW_CACHE_KEY, PROFILE, {"stale": True})
+		frappe.db.after_commit.run()
+
+		self.assertIsNone(frappe.cache().hget(VIEW_CACHE_KEY, PROFILE))
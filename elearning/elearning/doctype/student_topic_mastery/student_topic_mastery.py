@@ -6,7 +6,8 @@
 #
 # This file contains all the backend logic for calculating and updating
 # the "Weakness Score" for each student on each topic.
-# It is triggered by hooks from "Flashcard Session" and "Student Knowledge Profile".
+# It is triggered by hooks from "Flashcard Session", "Student Knowledge Profile" and
+# "Knowledge Gap", which queue the pair for utils.mastery_recompute_queue.
 # ==============================================================================
 
 import frappe
@@ -14,12 +15,26 @@ from frappe.model.document import Document
 from frappe.utils import now
 import math
 
+from elearning.elearning.utils.mastery_recompute_queue import mark_mastery_dirty
+from elearning.elearning.utils.pacing_stats import get_topic_mean_time
+from elearning.elearning.utils.constellation_cache import get_constellation, invalidate_constellation
+
 # Define constants for weights to be used across functions
 W_ACCURACY = 0.25
 W_PACING = 0.15
 W_DECAY = 0.40
 W_GAP = 0.20
 
+# Gap component sigmoid over the number of unresolved Knowledge Gaps
+# x0: Midpoint - at how many gaps is the weakness score 50%?
+# A good starting point is 2.5. This means having 2-3 gaps is a significant problem.
+GAP_MIDPOINT = 2.5
+# k: Steepness - how fast does the score rise? A value around 1.0 to 1.5 is usually good.
+GAP_STEEPNESS = 1.2
+
+# SRS ease factor range mapped onto the decay component (max ease = no decay)
+EASE_FACTOR_RANGE = (1.3, 2.5)
+
 
 class StudentTopicMastery(Document):
     pass
@@ -32,65 +47,88 @@ class StudentTopicMastery(Document):
 
 def update_mastery_on_session_completion(session_doc, method=None):
     """
-    This is the main hook function, triggered by `on_submit` of `Flashcard Session`.
-    It recalculates and updates the Student Topic Mastery record after a learning activity.
+    This is the main hook function, triggered by `on_update` / `on_trash` of `Flashcard Session`.
+    It only queues the (student, topic) pair; the recompute runs in flush_dirty_mastery.
     """
-    try:
-        student = session_doc.user  # The field is 'user' in Flashcard Session
-        topic = str(session_doc.topic)
-
-        # Step 1: Get the existing mastery record. We need it for the baseline 'accuracy_component'.
-        if not frappe.db.exists(
-            "Student Topic Mastery", {"student": student, "topic": topic}
-        ):
-            frappe.log_error(
-                f"Student Topic Mastery record not found for student {student}, topic {topic}. Cannot update.",
-                "Weakness Score Update Error",
-            )
-            return
-
-        mastery_doc = frappe.get_doc(
-            "Student Topic Mastery", {"student": student, "topic": topic}
+    mark_mastery_dirty(
+        session_doc.user,  # The field is 'user' in Flashcard Session
+        session_doc.topic,
+        "session",
+        session_doc.time_spent_seconds,
+    )
+
+
+def recompute_student_topic(student, topic, changes):
+    """
+    Apply the coalesced changes of one (student, topic) pair, without committing:
+      "profile": re-initialise from the profile's current Topic Mastery row,
+      "session": new Pacing / Decay / Gap components (value = session time spent),
+      "gap":     new Gap component only.
+    """
+    topic = str(topic)
+    if "profile" in changes:
+        mastery_weight = frappe.db.get_value(
+            "Topic Mastery",
+            {
+                "parent": changes["profile"],
+                "parenttype": "Student Knowledge Profile",
+                "topic": topic,
+            },
+            "mastery_weight",
         )
+        if mastery_weight is not None:
+            _initialize_topic_mastery(student, topic, mastery_weight)
+            # set_value bypasses the Student Topic Mastery doc event
+            invalidate_constellation(student)
+
+    if "session" in changes:
+        _update_mastery_from_session(student, topic, changes["session"])
+    elif "gap" in changes:
+        recalculate_mastery_for_topic(student, topic)
+
 
-        # Step 2: Calculate the NEW Pacing Component from the session that just completed.
-        pacing_component = calculate_pacing_component(
-            topic, session_doc.time_spent_seconds
+def _update_mastery_from_session(student, topic, time_spent_seconds):
+    # Step 1: Get the existing mastery record. We need it for the baseline 'accuracy_component'.
+    if not frappe.db.exists(
+        "Student Topic Mastery", {"student": student, "topic": topic}
+    ):
+        frappe.log_error(
+            f"Student Topic Mastery record not found for student {student}, topic {topic}. Cannot update.",
+            "Weakness Score Update Error",
         )
+        return
 
-        # Step 3: Calculate the NEW Decay Component from the student's current SRS progress.
-        decay_component = calculate_decay_component(student, topic)
+    mastery_doc = frappe.get_doc(
+        "Student Topic Mastery", {"student": student, "topic": topic}
+    )
 
-        gap_component = calculate_gap_component(student, topic)
+    # Step 2: Calculate the NEW Pacing Component from the session that just completed.
+    pacing_component = calculate_pacing_component(topic, time_spent_seconds)
 
-        # Step 4: Calculate the final Weakness Score using the new normalized formula
-        final_score = calculate_normalized_weakness_score(
-            mastery_doc.accuracy_component,
-            pacing_component,
-            decay_component,
-            gap_component,
-        )
+    # Step 3: Calculate the NEW Decay Component from the student's current SRS progress.
+    decay_component = calculate_decay_component(student, topic)
 
-        # Step 5: Update the document with the newly calculated values.
-        mastery_doc.pacing_component = pacing_component
-        mastery_doc.decay_component = decay_component
-        mastery_doc.gap_component = gap_component
-        mastery_doc.weakness_score = final_score
-        mastery_doc.last_updated_on = now()
+    gap_component = calculate_gap_component(student, topic)
 
-        mastery_doc.save(ignore_permissions=True)
+    # Step 4: Calculate the final Weakness Score using the new normalized formula
+    final_score = calculate_normalized_weakness_score(
+        mastery_doc.accuracy_component,
+        pacing_component,
+        decay_component,
+        gap_component,
+    )
 
-        # Step 6: CRITICAL - Commit the changes to the database. Without this, changes are rolled back.
-        frappe.db.commit()
-        frappe.log_info(
-            f"Successfully updated mastery for student {student}, topic {topic}. New score: {final_score}"
-        )
+    # Step 5: Update the document with the newly calculated values.
+    mastery_doc.pacing_component = pacing_component
+    mastery_doc.decay_component = decay_component
+    mastery_doc.gap_component = gap_component
+    mastery_doc.weakness_score = final_score
+    mastery_doc.last_updated_on = now()
 
-    except Exception:
-        frappe.log_error(
-            frappe.get_traceback(), "update_mastery_on_session_completion Failed"
-        )
-        frappe.db.rollback()  # Rollback any partial changes if an error occurs.
+    mastery_doc.save(ignore_permissions=True)
+    frappe.logger().info(
+        f"Successfully updated mastery for student {student}, topic {topic}. New score: {final_score}"
+    )
 
 
 # ==============================================================================
@@ -113,43 +151,32 @@ def calculate_gap_component(student, topic):
             },
         )
 
-        if num_gaps == 0:
-            return 0.0
-
-        # --- Sigmoid Function Implementation ---
-        # x0: Midpoint - at how many gaps is the weakness score 50%?
-        # A good starting point is 2.5. This means having 2-3 gaps is a significant problem.
-        midpoint = 2.5
-
-        # k: Steepness - how fast does the score rise?
-        # A value around 1.0 to 1.5 is usually good.
-        steepness = 1.2
-
-        # Calculate the sigmoid score
-        try:
-            exponent = -steepness * (num_gaps - midpoint)
-            gap_score = 1 / (1 + math.exp(exponent))
-        except OverflowError:
-            # Handle cases where the exponent is too large/small
-            gap_score = 1.0 if num_gaps > midpoint else 0.0
-
-        return gap_score
+        return gap_score_from_count(num_gaps)
 
     except Exception:
         frappe.log_error(frappe.get_traceback(), "calculate_gap_component Failed")
         return 0.0
 
 
+def gap_score_from_count(num_gaps):
+    """Sigmoid of the number of unresolved gaps (0 gaps -> 0)"""
+    if num_gaps == 0:
+        return 0.0
+    try:
+        exponent = -GAP_STEEPNESS * (num_gaps - GAP_MIDPOINT)
+        return 1 / (1 + math.exp(exponent))
+    except OverflowError:
+        # Handle cases where the exponent is too large/small
+        return 1.0 if num_gaps > GAP_MIDPOINT else 0.0
+
+
 def calculate_pacing_component(topic, current_session_time):
     """Calculates the Pacing Component."""
     if not current_session_time or current_session_time <= 0:
         return 0
 
-    system_avg_time = frappe.db.get_value(
-        "Flashcard Session",
-        {"topic": topic, "time_spent_seconds": [">", 0]},  # Ignore sessions with 0 time
-        "AVG(time_spent_seconds)",
-    )
+    # Running mean of ended sessions with time > 0 (Topic Pacing Stats), one row read
+    system_avg_time = get_topic_mean_time(topic)
 
     if not system_avg_time or system_avg_time <= 0:
         return 0  # No penalty if this is the first valid session for the topic.
@@ -166,17 +193,22 @@ def calculate_decay_component(student, topic):
         "User SRS Progress", {"user": student, "topic": topic}, "AVG(ease_factor)"
     )
 
+    return decay_from_ease_factor(avg_ease_factor)
+
+
+def decay_from_ease_factor(avg_ease_factor):
     # If the student hasn't reviewed any cards for this topic, default to 2.5 (no decay).
     if not avg_ease_factor:
         return 0
 
     # Convert ease factor (range 1.3 to 2.5) to decay component (range 0 to 1).
-    decay_component = (2.5 - avg_ease_factor) / (2.5 - 1.3)
+    low, high = EASE_FACTOR_RANGE
+    decay_component = (high - avg_ease_factor) / (high - low)
     return max(0, min(1, decay_component))
 
 
 def calculate_normalized_weakness_score(
-    accuracy_component, pacing_component=None, decay_component=None
+    accuracy_component, pacing_component=None, decay_component=None, gap_component=None
 ):
     """
     Tính toán Weakness Score được chuẩn hóa dựa trên tổng trọng số có sẵn.
@@ -246,88 +278,67 @@ def calculate_normalized_weakness_score(
 def initialize_student_mastery_from_profile(profile_doc, method=None):
     """
     Initializes or updates Student Topic Mastery records from the Student Knowledge Profile.
-    This is triggered by a hook on `on_update` of `Student Knowledge Profile`.
+    This is triggered by a hook on `on_update` of `Student Knowledge Profile`; it only
+    queues one recompute per topic of the profile.
     """
-    try:
-        if (
-            hasattr(profile_doc, "_skip_mastery_hook")
-            and profile_doc._skip_mastery_hook
-        ):
-            return
-
-        student = profile_doc.student
-
-        # Only process if there are topic_mastery records
-        if not hasattr(profile_doc, "topic_mastery") or not profile_doc.topic_mastery:
-            return
-
-        for topic_entry in profile_doc.topic_mastery:
-            # Make sure you have a field named 'topic' in your child table linking to the Topic DocType
-            topic_id = str(topic_entry.topic)
-            mastery_weight = float(topic_entry.mastery_weight or 0)
-
-            # Calculate the initial accuracy component.
-            accuracy_component = (1000 - mastery_weight) / 1000
-            accuracy_component = max(0, min(1, accuracy_component))
-
-            # At initialization, Pacing and Decay không có dữ liệu (None)
-            initial_weakness_score = calculate_normalized_weakness_score(
-                accuracy_component, None, None, None
-            )
-
-            # Use frappe.db.exists for efficiency
-            if frappe.db.exists(
-                "Student Topic Mastery", {"student": student, "topic": topic_id}
-            ):
-                # Update existing record using frappe.db.set_value for performance
-                frappe.db.set_value(
-                    "Student Topic Mastery",
-                    {"student": student, "topic": topic_id},
-                    {
-                        "accuracy_component": accuracy_component,
-                        "pacing_component": 0,
-                        "decay_component": 0,
-                        "weakness_score": initial_weakness_score,
-                        "last_updated_on": now(),
-                    },
-                )
-            else:
-                # Create a new record if it doesn't exist
-                new_mastery = frappe.new_doc("Student Topic Mastery")
-                new_mastery.student = student
-                new_mastery.topic = topic_id
-                new_mastery.accuracy_component = accuracy_component
-                new_mastery.pacing_component = 0
-                new_mastery.decay_component = 0
-                new_mastery.weakness_score = initial_weakness_score
-                new_mastery.last_updated_on = now()
-                new_mastery.insert(ignore_permissions=True)
-
-        # CRITICAL: Commit all changes made in the loop.
-        frappe.db.commit()
+    if getattr(profile_doc, "_skip_mastery_hook", False):
+        return
 
-    except Exception:
-        frappe.log_error(
-            frappe.get_traceback(), "initialize_student_mastery_from_profile Failed"
+    # Only process if there are topic_mastery records
+    for topic_entry in profile_doc.get("topic_mastery") or []:
+        mark_mastery_dirty(
+            profile_doc.student, topic_entry.topic, "profile", profile_doc.name
+        )
+
+
+def _initialize_topic_mastery(student, topic_id, mastery_weight):
+    mastery_weight = float(mastery_weight or 0)
+
+    # Calculate the initial accuracy component.
+    accuracy_component = (1000 - mastery_weight) / 1000
+    accuracy_component = max(0, min(1, accuracy_component))
+
+    # At initialization, Pacing and Decay không có dữ liệu (None)
+    initial_weakness_score = calculate_normalized_weakness_score(
+        accuracy_component, None, None, None
+    )
+
+    # Use frappe.db.exists for efficiency
+    if frappe.db.exists(
+        "Student Topic Mastery", {"student": student, "topic": topic_id}
+    ):
+        # Update existing record using frappe.db.set_value for performance
+        frappe.db.set_value(
+            "Student Topic Mastery",
+            {"student": student, "topic": topic_id},
+            {
+                "accuracy_component": accuracy_component,
+                "pacing_component": 0,
+                "decay_component": 0,
+                "weakness_score": initial_weakness_score,
+                "last_updated_on": now(),
+            },
         )
-        frappe.db.rollback()
+    else:
+        # Create a new record if it doesn't exist
+        new_mastery = frappe.new_doc("Student Topic Mastery")
+        new_mastery.student = student
+        new_mastery.topic = topic_id
+        new_mastery.accuracy_component = accuracy_component
+        new_mastery.pacing_component = 0
+        new_mastery.decay_component = 0
+        new_mastery.weakness_score = initial_weakness_score
+        new_mastery.last_updated_on = now()
+        new_mastery.insert(ignore_permissions=True)
 
 
 def update_mastery_on_gap_change(gap_doc, method=None):
     """
     Triggered when a Knowledge Gap is created, updated, or deleted.
-    Recalculates the Weakness Score for the corresponding Topic.
+    Queues a Weakness Score recompute for the corresponding Topic.
     """
-    try:
-        # Lấy thông tin từ Knowledge Gap doc
-        student = gap_doc.user
-        lo_doc = frappe.get_doc("Learning Object", gap_doc.learning_object)
-        topic = lo_doc.topic
-
-        recalculate_mastery_for_topic(student, topic)
-
-    except Exception:
-        frappe.log_error(frappe.get_traceback(), "update_mastery_on_gap_change Failed")
+    topic = frappe.db.get_value("Learning Object", gap_doc.learning_object, "topic")
+    mark_mastery_dirty(gap_doc.user, topic, "gap")
 
 
 def recalculate_mastery_for_topic(student, topic):
@@ -358,8 +369,7 @@ def recalculate_mastery_for_topic(student, topic):
     mastery_doc.weakness_score = final_score
     mastery_doc.last_updated_on = now()
     mastery_doc.save(ignore_permissions=True)
-    frappe.db.commit()
-    frappe.log_info(
+    frappe.logger().info(
         f"Mastery recalculated on gap change for student {student}, topic {topic}. New score: {final_score}"
     )
 
@@ -382,87 +392,22 @@ def get_knowledge_constellation():
             frappe.AuthenticationError,
         )
 
-    profile_name = frappe.db.get_value(
-        "Student Knowledge Profile", {"student": user}, "name"
-    )
-
     try:
-        # Get all mastery data for the logged-in user
-        mastery_data = frappe.get_all(
-            "Student Topic Mastery",
-            filters={"student": user},
-            fields=[
-                "topic",
-                "weakness_score",
-                "accuracy_component",
-                "pacing_component",
-                "decay_component",
-            ],
-        )
-
-        # Get all topic names in a single query for efficiency
-        all_topics = frappe.get_all("Topics", fields=["name", "topic_name"])
-        topic_name_map = {str(t.name): t.topic_name for t in all_topics}
-
-        # Get latest Student Pathway Snapshot for the user
-        snapshot = frappe.db.get_value(
-            "Student Pathway Snapshot",
-            {"student": profile_name},
-            ["pathway_json"],
-            order_by="creation desc",
-        )
-
-        # Build a map of topic_id to is_unlocked from the snapshot
-        unlocked_map = {}
-        if snapshot:
-            import json
-
-            try:
-                pathway_data = json.loads(snapshot)
-                if isinstance(pathway_data, dict):
-                    chapters = pathway_data.get("pathway", [])
-                elif isinstance(pathway_data, list):
-                    chapters = pathway_data
-                else:
-                    chapters = []
-                for chapter in chapters:
-                    tid = str(chapter.get("id"))
-                    is_unlocked_val = bool(chapter.get("is_unlocked", False))
-                    unlocked_map[tid] = is_unlocked_val
-            except Exception:
-                frappe.log_error(
-                    frappe.get_traceback(),
-                    "Parse pathway_json failed in get_knowledge_constellation",
-                )
-
-        # Combine the data
-        constellation = []
-        for mastery in mastery_data:
-            topic_id_str = str(mastery.topic)
-            print(
-                f"DEBUG topic_id_str: {topic_id_str}, is_unlocked: {unlocked_map.get(topic_id_str, False)}"
-            )
-            is_unlocked = unlocked_map.get(topic_id_str, False)
-            constellation.append(
-                {
-                    "topic_id": topic_id_str,
-                    "topic_name": topic_name_map.get(
-                        topic_id_str, f"Topic {topic_id_str}"
-                    ),
-                    "weakness_score": mastery.weakness_score,
-                    "is_unlocked": is_unlocked,
-                    "components": {
-                        "accuracy": mastery.accuracy_component,
-                        "pacing": mastery.pacing_component,
-                        "decay": mastery.decay_component,
-                    },
-                }
-            )
-
-        return constellation
-
+        # Precomputed per-user payload, rebuilt after the user's mastery or pathway changes
+        constellation = get_constellation(user)
     except Exception:
         frappe.log_error(frappe.get_traceback(), "get_knowledge_constellation Failed")
         frappe.throw(
             "An error occurred while loading your learning pathway. Please try again later."
         )
+
+    # Conditional request: the client already has this version
+    response_headers = getattr(frappe.local, "response_headers", None)
+    if response_headers is not None:
+        response_headers.set("ETag", constellation["etag"])
+        response_headers.set("Cache-Control", "private, no-cache")
+    if frappe.get_request_header("If-None-Match") == constellation["etag"]:
+        frappe.local.response["http_status_code"] = 304
+        return None
+
+    return constellation["payload"]
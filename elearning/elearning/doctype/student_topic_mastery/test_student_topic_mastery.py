@@ -1,9 +1,99 @@
 # Copyright (c) 2025, Minh Quy and Contributors
 # See license.txt
 
-# import frappe
+import itertools
+
+import frappe
+import numpy as np
 from frappe.tests.utils import FrappeTestCase
 
+from elearning.elearning.doctype.student_topic_mastery.student_topic_mastery import (
+	calculate_normalized_weakness_score,
+	decay_from_ease_factor,
+	gap_score_from_count,
+)
+from elearning.elearning.utils.mastery_recompute_queue import (
+	DIRTY_CACHE_KEY,
+	_due_changes,
+	_requeue,
+	mark_mastery_dirty,
+)
+from elearning.elearning.utils.weakness_batch import (
+	decay_components,
+	gap_components,
+	normalized_weakness_scores,
+)
+
 
 class TestStudentTopicMastery(FrappeTestCase):
-	pass
+	def setUp(self):
+		frappe.cache().delete_value(DIRTY_CACHE_KEY)
+
+	def tearDown(self):
+		frappe.cache().delete_value(DIRTY_CACHE_KEY)
+
+	def mark(self, *args):
+		mark_mastery_dirty(*args)
+		frappe.db.after_commit.run()
+
+	def test_marks_round_trip_to_due_changes(self):
+		self.mark("student@example.com", 3, "session", 120)
+		self.mark("student@example.com", 3, "session", 90)
+		self.mark("student@example.com", 3, "gap")
+		self.mark("other@example.com", "5", "profile", "SKP-0001")
+
+		changes = _due_changes(debounce_seconds=0)
+
+		self.assertEqual(
+			{pair: {kind: entry["value"] for kind, entry in kinds.items()} for pair, kinds in changes.items()},
+			{
+				("student@example.com", "3"): {"session": 90, "gap": 1},
+				("other@example.com", "5"): {"profile": "SKP-0001"},
+			},
+		)
+		# Claimed entries are removed from the queue
+		self.assertEqual(_due_changes(debounce_seconds=0), {})
+
+	def test_recent_marks_wait_for_the_debounce_window(self):
+		self.mark("student@example.com", "3", "gap")
+
+		self.assertEqual(_due_changes(debounce_seconds=3600), {})
+		self.assertIn(("student@example.com", "3"), _due_changes(debounce_seconds=0))
+
+	def test_failed_recompute_is_requeued(self):
+		self.mark("student@example.com", "3", "session", 120)
+		entries = _due_changes(debounce_seconds=0)[("student@example.com", "3")]
+
+		_requeue("student@example.com", "3", entries)
+
+		requeued = _due_changes(debounce_seconds=0)[("student@example.com", "3")]
+		self.assertEqual(requeued["session"]["value"], 120)
+		self.assertEqual(requeued["session"]["attempts"], 1)
+
+
+class TestWeaknessBatchParity(FrappeTestCase):
+	"""The nightly vectorized batch must score exactly like the per-pair hooks"""
+
+	def test_normalized_score_matches_scalar_on_grid(self):
+		values = [None, 0.0, 0.2, 0.5, 0.85, 1.0]
+		grid = list(itertools.product(values, repeat=4))
+		columns = [np.array([np.nan if v is None else v for v in col], dtype=np.float64) for col in zip(*grid)]
+
+		scores = normalized_weakness_scores(*columns)
+
+		for inputs, score in zip(grid, scores):
+			self.assertAlmostEqual(score, calculate_normalized_weakness_score(*inputs), places=12, msg=str(inputs))
+
+	def test_gap_components_match_scalar(self):
+		counts = np.arange(0, 40, dtype=np.float64)
+
+		for count, score in zip(counts, gap_components(counts)):
+			self.assertAlmostEqual(score, gap_score_from_count(count), places=12, msg=str(count))
+
+	def test_decay_components_match_scalar(self):
+		ease = [None, 0.0, 1.0, 1.3, 1.7, 2.1, 2.5, 3.0]
+
+		decay = decay_components(np.array([np.nan if e is None else e for e in ease], dtype=np.float64))
+
+		for value, component in zip(ease, decay):
+			self.assertAlmostEqual(component, decay_from_ease_factor(value), places=12, msg=str(value))
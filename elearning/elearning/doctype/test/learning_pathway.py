@@ -1,6 +1,13 @@
 import numpy as np
-import json
 import frappe
+from frappe import _
+
+from elearning.elearning.utils.curriculum import MASTERY_THRESHOLDS, get_curriculum
+from elearning.elearning.utils.pathway_store import (
+    get_pathway_view,
+    invalidate_pathway_view,
+    replace_pathway_rows,
+)
 
 
 def _convert_theta_to_mastery(
@@ -39,66 +46,31 @@ def get_learning_pathway():
     #     frappe.throw("Test session is not completed yet.")
 
     # --- Topic-centric pathway logic ---
-    # Topic curriculum mapping
-    TOPIC_INFO = [
-        ("1", "Chương I. Phương trình và Hệ phương trình bậc nhất"),
-        ("2", "Chương II. Bất đẳng thức"),
-        ("3", "Chương III. Căn thức"),
-        ("4", "Chương IV. Hệ thức lượng trong tam giác vuông"),
-        ("5", "Chương V. Đường tròn"),
-        ("6", "Chương VI. Thống kê & Xác suất"),
-        ("7", "Chương VII. Hàm số y = ax² (a ≠ 0), Phương trình bậc hai"),
-        ("8", "Chương VIII. Đường tròn ngoại tiếp & nội tiếp"),
-        ("9", "Chương IX. Đa giác đều"),
-        ("10", "Chương X. Hình học trực quan"),
-    ]
-    TOPIC_DEPENDENCIES = {
-        "1": [],
-        "2": ["1"],
-        "3": ["1"],
-        "4": ["1"],
-        "5": ["4"],
-        "6": [],
-        "7": ["2"],
-        "8": ["5"],
-        "9": ["8"],
-        "10": [],
-    }
-    MASTERY_THRESHOLDS = {"weak": 500, "partial": 750, "strong": 1000}
+    curriculum = get_curriculum()
 
     # Get topic abilities from the session
     topic_abilities = {
         str(ability.topic): ability for ability in session.topic_abilities
     }
 
-    # Recursive unlock logic: topic is unlocked only if all prerequisites (direct and indirect) are mastered
-    def is_fully_unlocked(topic_id, mastery_weights, dependencies, threshold):
-        for prereq in dependencies.get(topic_id, []):
-            if mastery_weights.get(prereq, 0) < threshold:
-                return False
-            if not is_fully_unlocked(prereq, mastery_weights, dependencies, threshold):
-                return False
-        return True
-
     # Build mastery_weights dict (converted values)
     mastery_weights = {}
-    for tid, _ in TOPIC_INFO:
+    for tid in curriculum.ids:
         ability = topic_abilities.get(tid)
         theta = getattr(ability, "ability_estimate", 0)
         mastery_weights[tid] = _convert_theta_to_mastery(theta)
 
-    # Build pathway array with recursive unlock logic
+    # A topic is unlocked only if all prerequisites (direct and indirect) are mastered
+    unlock_states = curriculum.unlock_states(mastery_weights, MASTERY_THRESHOLDS["weak"])
+
     pathway = []
-    for tid, name in TOPIC_INFO:
-        mastery_weight = mastery_weights.get(tid, 0)
-        unlocked = is_fully_unlocked(
-            tid, mastery_weights, TOPIC_DEPENDENCIES, MASTERY_THRESHOLDS["weak"]
-        )
+    for tid in curriculum.ids:
+        unlocked = unlock_states[tid]
         pathway.append(
             {
                 "id": tid,
-                "name": name,
-                "mastery_weight": mastery_weight,
+                "name": curriculum.names[tid],
+                "mastery_weight": mastery_weights.get(tid, 0),
                 "is_unlocked": unlocked,
                 "status": "unlocked" if unlocked else "locked",
             }
@@ -115,11 +87,8 @@ def get_learning_pathway():
 
     # Save or update pathway snapshot for Student Knowledge Profile
     student_profile = session.student  # This is a Student Knowledge Profile
-    # Use raw SQL for insert/update
-    import datetime
-
+    # Use raw SQL for insert/update; chapters are stored as Student Pathway Topic rows
     now = frappe.utils.now_datetime()
-    pathway_json_str = json.dumps(pathway)
     # Check if record exists
     result = frappe.db.sql(
         """
@@ -131,30 +100,29 @@ def get_learning_pathway():
     )
     if result:
         # Update existing
+        snapshot_name = result[0]["name"]
         frappe.db.sql(
             """
             UPDATE `tabStudent Pathway Snapshot`
-            SET pathway_json = %s, overall_level = %s, modified = %s
+            SET pathway_json = NULL, overall_level = %s, modified = %s
             WHERE name = %s
             """,
-            (pathway_json_str, overall_level, now, result[0]["name"]),
+            (overall_level, now, snapshot_name),
         )
-        frappe.db.commit()
         print("Updated existing pathway snapshot for", student_profile)
     else:
         # Insert new
-        new_name = frappe.generate_hash()
+        snapshot_name = frappe.generate_hash()
         frappe.db.sql(
             """
             INSERT INTO `tabStudent Pathway Snapshot`
-            (name, student, session_id, pathway_json, overall_level, docstatus, creation, modified, owner, modified_by)
-            VALUES (%s, %s, %s, %s, %s, 0, %s, %s, %s, %s)
+            (name, student, session_id, overall_level, docstatus, creation, modified, owner, modified_by)
+            VALUES (%s, %s, %s, %s, 0, %s, %s, %s, %s)
             """,
             (
-                new_name,
+                snapshot_name,
                 student_profile,
                 session_id,
-                pathway_json_str,
                 overall_level,
                 now,
                 now,
@@ -162,8 +130,10 @@ def get_learning_pathway():
                 frappe.session.user,
             ),
         )
-        frappe.db.commit()
         print("Created new pathway snapshot for", student_profile)
+    replace_pathway_rows(snapshot_name, pathway)
+    invalidate_pathway_view(student_profile)
+    frappe.db.commit()
 
     return {
         "session_id": session_id,
@@ -190,124 +160,49 @@ def determine_overall_level_from_abilities(topic_abilities):
         return "Sơ cấp"
 
 
-def calculate_chapter_progress(chapter_index, topic_abilities=None):
-    """Calculate progress for each chapter based on placement test results"""
-    if not topic_abilities:
-        return 0
-
-    # Direct mapping: Chapter index corresponds to topic order in placement test
-    # Convert topic_abilities to ordered list based on topic keys, sorted numerically
-    topic_keys = sorted(topic_abilities.keys(), key=lambda x: int(x))
-
-    if chapter_index < len(topic_keys):
-        # Use the corresponding topic's mastery weight directly
-        topic_key = topic_keys[chapter_index]
-        mastery_weight = topic_abilities[topic_key]["mastery_weight"]
-
-        # Convert mastery weight (0-1000) to percentage (0-100)
-        # Assuming mastery_weight ranges from 0 to 1000
-        progress = min(100, max(0, int(mastery_weight / 10)))
-        return progress
-    else:
-        # For chapters beyond available topics, use 0
+def calculate_chapter_progress(topic_id, topic_abilities=None):
+    """Progress (0-100) of a chapter from its topic's placement mastery weight (0-1000)"""
+    ability = (topic_abilities or {}).get(topic_id)
+    if not ability:
         return 0
+    return min(100, max(0, int(ability["mastery_weight"] / 10)))
 
 
 def generate_pathway_chapters(topic_abilities):
-    """Generate learning pathway chapters based on test results"""
+    """Generate learning pathway chapters (titles and prerequisites from the curriculum) based on test results"""
+    curriculum = get_curriculum()
+    topic_abilities = {str(topic_id): ability for topic_id, ability in (topic_abilities or {}).items()}
 
-    # Calculate overall score for status determination based on average progress
-    total_progress = 0
-    valid_chapters = 0
-
-    # Pre-calculate progress for all chapters to determine status
-    chapter_progresses = []
-    for i in range(10):  # We have 10 chapters
-        progress = calculate_chapter_progress(i, topic_abilities)
-        chapter_progresses.append(progress)
-        if progress > 0:
-            total_progress += progress
-            valid_chapters += 1
-
-    avg_progress = total_progress / max(1, valid_chapters)  # Avoid division by zero
-
-    # Prerequisite logic for locked/unlocked chapters
-    # Define prerequisites for each chapter (by id)
-    PREREQUISITES = {
-        1: [],
-        2: [1],
-        3: [1],
-        4: [1],
-        5: [4],
-        6: [],
-        7: [2],
-        8: [5],
-        9: [8],
-        10: [],
+    chapter_progresses = {
+        topic_id: calculate_chapter_progress(topic_id, topic_abilities) for topic_id in curriculum.ids
     }
+    started = [progress for progress in chapter_progresses.values() if progress > 0]
+    avg_progress = sum(started) / max(1, len(started))  # Avoid division by zero
 
-    def is_unlocked(chapter_id, chapter_progresses):
-        prereqs = PREREQUISITES.get(chapter_id, [])
-        for pre in prereqs:
-            if (
-                chapter_progresses[pre - 1] < 75
-            ):  # Require at least 75% mastery in prerequisite
-                return False
-        return True
+    # A chapter is unlocked once its direct prerequisites reach the "partial" mastery (75%)
+    mastery_weights = {
+        topic_id: ability["mastery_weight"] for topic_id, ability in topic_abilities.items()
+    }
+    unlock_states = curriculum.unlock_states(
+        mastery_weights, MASTERY_THRESHOLDS["partial"], transitive=False
+    )
 
     chapters = []
-    chapter_info = [
-        (
-            1,
-            "Chương I. Phương trình và Hệ phương trình bậc nhất",
-            "Nắm vững các khái niệm cơ bản về phương trình bậc nhất một ẩn và hệ phương trình.",
-        ),
-        (
-            2,
-            "Chương II. Hàm số và Đồ thị",
-            "Hiểu các khái niệm về hàm số và cách vẽ đồ thị.",
-        ),
-        (3, "Chương III. Số Phức", "Nắm vững các phép toán với số phức và ứng dụng."),
-        (4, "Chương IV. Bất đẳng thức", "Học cách giải và chứng minh bất đẳng thức."),
-        (
-            5,
-            "Chương V. Hình học phẳng",
-            "Tìm hiểu các khái niệm về hình học Euclid trong mặt phẳng.",
-        ),
-        (
-            6,
-            "Chương VI. Hình học không gian",
-            "Khám phá hình học ba chiều và các ứng dụng.",
-        ),
-        (7, "Chương VII. Đạo hàm", "Nắm vững khái niệm đạo hàm và các ứng dụng."),
-        (
-            8,
-            "Chương VIII. Tích phân",
-            "Học cách tính tích phân và ứng dụng trong thực tế.",
-        ),
-        (
-            9,
-            "Chương IX. Xác suất và Thống kê",
-            "Tìm hiểu về xác suất và các phương pháp thống kê cơ bản.",
-        ),
-        (10, "Chương X. Lượng giác", "Nắm vững các hàm lượng giác và ứng dụng."),
-    ]
-    for i, name, desc in chapter_info:
-        progress = chapter_progresses[i - 1]
+    for topic_id in curriculum.ids:
+        progress = chapter_progresses[topic_id]
         status = (
             "completed"
             if progress >= 80
             else ("in-progress" if progress >= 20 else "not-started")
         )
-        unlocked = is_unlocked(i, chapter_progresses)
         chapters.append(
             {
-                "id": i,
-                "name": name,
-                "description": desc,
+                "id": topic_id,
+                "name": curriculum.names[topic_id],
+                "description": curriculum.descriptions[topic_id],
                 "progress": progress,
                 "status": status,
-                "is_unlocked": unlocked,
+                "is_unlocked": unlock_states[topic_id],
             }
         )
 
@@ -346,29 +241,13 @@ def get_latest_student_pathway_snapshot():
     )
     if not profile_name:
         frappe.throw("Không tìm thấy hồ sơ năng lực cho người dùng hiện tại.")
-    # Get latest snapshot (by creation or modified)
-    result = frappe.db.sql(
-        """
-        SELECT pathway_json, overall_level, session_id, modified
-        FROM `tabStudent Pathway Snapshot`
-        WHERE student = %s
-        ORDER BY modified DESC
-        LIMIT 1
-        """,
-        (profile_name,),
-        as_dict=True,
-    )
-    if not result:
+    # Latest snapshot (by modified), assembled from its topic rows and cached
+    view = get_pathway_view(profile_name)
+    if not view:
         return {}
-    # pathway_json is stored as JSON string
-    pathway_json = result[0]["pathway_json"]
-    try:
-        pathway = json.loads(pathway_json)
-    except Exception:
-        pathway = []
     return {
-        "pathway": pathway,
-        "overall_level": result[0]["overall_level"],
-        "session_id": result[0]["session_id"],
-        "modified": result[0]["modified"],
+        "pathway": view["pathway"],
+        "overall_level": view["overall_level"],
+        "session_id": view["session_id"],
+        "modified": view["modified"],
     }
@@ -1,38 +1,31 @@
 import frappe
 import random
 import numpy as np
-from catsim.irt import negative_log_likelihood, see, inf
-from scipy.optimize import minimize_scalar
 import math
 from collections import defaultdict, deque
 
+from elearning.elearning.utils.cat_estimation import estimate_topic_abilities
+from elearning.elearning.utils.placement_item_bank import (
+    fisher_information,
+    get_item_bank,
+    get_question_payload,
+    select_item,
+)
+from elearning.elearning.utils.placement_session_state import (
+    SessionState,
+    clear_session_state,
+    get_session_state,
+    peek_session_state,
+    pop_precomputed_branch,
+    save_precomputed_branches,
+    save_session_state,
+)
+
 STANDARD_ERROR_THRESHOLD = 0.3  # More stringent threshold
 MAX_QUESTIONS_TOTAL = 40
 MIN_QUESTIONS_PER_TOPIC = 3  # Minimum questions per topic
 MAX_QUESTIONS_PER_TOPIC = 12  # Maximum questions per topic
-
-# Topic dependency graph for learning pathway generation
-TOPIC_DEPENDENCIES = {
-    "1": [],  # Topic 1: Phương trình & Hệ phương trình bậc nhất - Base topic (no prerequisites)
-    "2": ["1"],  # Topic 2: Bất đẳng thức - requires Topic 1
-    "3": ["1"],  # Topic 3: Căn thức - requires Topic 1
-    "4": ["1"],  # Topic 4: Hệ thức lượng trong tam giác vuông - requires Topic 1
-    "5": ["4"],  # Topic 5: Đường tròn - requires Topic 4
-    "6": [],  # Topic 6: Thống kê & Xác suất - no prerequisites (recommended/independent)
-    "7": [
-        "2"
-    ],  # Topic 7: Hàm số y = ax² (a ≠ 0), Phương trình bậc hai - requires Topic 2 only
-    "8": ["5"],  # Topic 8: Đường tròn ngoại tiếp & nội tiếp - requires Topic 5
-    "9": ["8"],  # Topic 9: Đa giác đều - requires Topic 8
-    "10": [],  # Topic 10: Hình học trực quan - no prerequisites (recommended/independent)
-}
-
-# Mastery level thresholds
-MASTERY_THRESHOLDS = {
-    "weak": 500,  # < 500: must re-learn from scratch
-    "partial": 750,  # 500-750: needs reinforcement
-    "strong": 1000,  # > 750: can skip or review briefly
-}
+SE_PRIORITY_EXPONENT = 0.5  # Weight of a topic's standard error in adaptive utility
 
 
 @frappe.whitelist()
@@ -80,9 +73,14 @@ def start_test():
     )
     if existing:
         session = frappe.get_doc("Placement Test Session", existing)
-        next_q = _get_next_question_with_catsim(session)
+        state = get_session_state(session)
+        # Resume with the question the student was shown, if still unanswered
+        next_q = state.pending_question
+        if not next_q or next_q in state.answered_set:
+            next_q = _get_next_question_with_catsim(state)
         if not next_q:
             return _finalize_session_and_get_results(session)
+        _serve_question(state, next_q)
         # Gửi kèm trạng thái năng lực ban đầu khi resume
         initial_abilities = [t.as_dict() for t in session.topic_abilities]
         return {
@@ -102,28 +100,34 @@ def start_test():
     session.start_time = frappe.utils.now_datetime()
     session.insert(ignore_permissions=True)
 
-    # Add topic abilities after the session is created
+    # Add topic abilities after the session is created, in one INSERT
     for t in topics:
-        topic_ability = frappe.new_doc("Session Topic Ability")
-        topic_ability.parent = session.name
-        topic_ability.parenttype = "Placement Test Session"
-        topic_ability.parentfield = "topic_abilities"
-        topic_ability.topic = t
-        topic_ability.ability_estimate = 0.0
-        topic_ability.standard_error = 1.0
-        topic_ability.questions_answered = 0
-        topic_ability.insert(ignore_permissions=True)
-
+        session.append(
+            "topic_abilities",
+            {
+                "name": frappe.generate_hash(length=10),
+                "topic": t,
+                "ability_estimate": 0.0,
+                "standard_error": 1.0,
+                "questions_answered": 0,
+            },
+        )
+    _bulk_insert_children(
+        session.topic_abilities,
+        ["topic", "ability_estimate", "standard_error", "questions_answered"],
+    )
     frappe.db.commit()
 
-    # Reload the session to get the child records
-    session.reload()
+    state = SessionState(session.name)
+    for row in session.topic_abilities:
+        state.set_ability(row.topic, row.ability_estimate, row.standard_error)
 
     # Select first question using the same logic as adaptive testing
-    first_question_id = _get_next_question_with_catsim(session)
+    first_question_id = _get_next_question_with_catsim(state)
 
     if not first_question_id:
         frappe.throw("Không tìm thấy câu hỏi nào cho các chủ đề trong hệ thống.")
+    _serve_question(state, first_question_id)
 
     initial_abilities = [t.as_dict() for t in session.topic_abilities]
     return {
@@ -159,6 +163,9 @@ def submit_answer_and_get_next():
         frappe.throw("Phiên test này đã kết thúc.")
 
     is_correct = bool(is_correct)
+    # Loaded before the new log is written so the cached answer count still matches
+    state = get_session_state(session)
+    branch = pop_precomputed_branch(state, question_id, is_correct)
 
     # Since we no longer pre-log questions, always create a new entry
     try:
@@ -189,46 +196,43 @@ def submit_answer_and_get_next():
 
     frappe.db.commit()
 
-    question_doc = frappe.get_doc("Placement Question", question_id)
-    question_topic = question_doc.topic
+    question_topic = _get_question_topic(question_id)
+    if branch:
+        # Precomputed while the student was answering
+        state.record_answer(question_id, question_topic, is_correct)
+        abilities, next_question_id = branch["abilities"], branch["next_question"]
+        for topic, (theta, se) in abilities.items():
+            state.set_ability(topic, theta, se)
+    else:
+        abilities, next_question_id = _advance_state(
+            state, question_id, question_topic, is_correct
+        )
 
-    # Update ability for the answered topic
-    new_ability, new_error = _update_ability_with_catsim(session.name, question_topic)
+    new_ability, new_error = abilities[question_topic]
     topic_ability_row = next(
         row for row in session.topic_abilities if row.topic == question_topic
     )
+    topic_ability_row.questions_answered += 1
     topic_ability_row.ability_estimate = new_ability
     topic_ability_row.standard_error = new_error
-    topic_ability_row.questions_answered += 1
 
-    for t_row in session.topic_abilities:
-        updated_ability, updated_se = _update_ability_with_catsim(
-            session.name, t_row.topic
-        )
-        t_row.ability_estimate = updated_ability
-        t_row.standard_error = updated_se
-    session.save(ignore_permissions=True)
+    # Only the answered topic changed, so only its row is written
+    frappe.db.set_value(
+        "Session Topic Ability",
+        topic_ability_row.name,
+        {
+            "ability_estimate": new_ability,
+            "standard_error": new_error,
+            "questions_answered": topic_ability_row.questions_answered,
+        },
+        update_modified=False,
+    )
     frappe.db.commit()
 
     # === Chuẩn bị dữ liệu feedback cho frontend ===
     # Get performance data for this topic
-    topic_logs = frappe.db.sql(
-        """
-        SELECT placement_question, is_correct 
-        FROM `tabPlacement Answer Log` 
-        WHERE placement_test_session = %s 
-        AND placement_question IN (
-            SELECT name FROM `tabPlacement Question` WHERE topic = %s
-        )
-        AND is_correct IS NOT NULL
-        ORDER BY creation ASC
-        """,
-        (session.name, question_topic),
-        as_dict=True,
-    )
-
-    topic_correct = sum(1 for log in topic_logs if log.is_correct)
-    topic_total = len(topic_logs)
+    topic_correct = state.topic_correct(question_topic)
+    topic_total = state.topic_count(question_topic)
 
     feedback_data = {
         "answered_question_id": question_id,
@@ -248,22 +252,14 @@ def submit_answer_and_get_next():
 
     topic_abilities_for_frontend = [t.as_dict() for t in session.topic_abilities]
 
-    if _check_termination(session):
-        final_data = _finalize_session_and_get_results(session)
-        final_data["last_feedback"] = feedback_data
-        final_data["topic_abilities"] = topic_abilities_for_frontend
-        return final_data
-
-    # Reload session to get latest data before selecting next question
-    session.reload()
-    next_question_id = _get_next_question_with_catsim(session)
-
+    # No next question: termination criteria met or the item bank is exhausted
     if not next_question_id:
         final_data = _finalize_session_and_get_results(session)
         final_data["last_feedback"] = feedback_data
         final_data["topic_abilities"] = topic_abilities_for_frontend
         return final_data
 
+    _serve_question(state, next_question_id)
     question_data = _format_question_for_frontend(next_question_id)
 
     return {
@@ -275,15 +271,14 @@ def submit_answer_and_get_next():
     }
 
 
-def _get_next_question_with_catsim(session):
+def _get_next_question_with_catsim(state):
     """
-    FIXED: Proper adaptive testing with content balancing and no re-selection
+    FIXED: Proper adaptive testing with content balancing and no re-selection.
+    Reads only the session state and the item bank (no database access).
     """
     # Validate that topics have questions
-    all_topics = [t.topic for t in session.topic_abilities]
-    total_questions = frappe.db.count(
-        "Placement Question", {"topic": ["in", all_topics]}
-    )
+    all_topics = list(state.abilities)
+    total_questions = get_item_bank().count(all_topics)
 
     if total_questions == 0:
         print(f"Error: No questions found for topics {all_topics}")
@@ -293,67 +288,39 @@ def _get_next_question_with_catsim(session):
         f"Total available questions: {total_questions} across {len(all_topics)} topics"
     )
 
-    # Get all answered questions to prevent re-selection
-    answered_logs = frappe.db.sql(
-        """
-        SELECT placement_question, is_correct 
-        FROM `tabPlacement Answer Log` 
-        WHERE placement_test_session = %s 
-        AND is_correct IS NOT NULL
-        ORDER BY creation ASC
-        """,
-        (session.name,),
-        as_dict=True,
-    )
-
-    answered_questions = {
-        log.placement_question for log in answered_logs if log.placement_question
-    }
-    print(
-        f"Session {session.name}: Actually answered questions ({len(answered_questions)}): {answered_questions}"
-    )
-
-    # Get question counts per topic
-    topic_question_counts = {}
-    for topic_ability in session.topic_abilities:
-        topic_name = topic_ability.topic
-        topic_logs = [
-            log
-            for log in answered_logs
-            if log.placement_question
-            and _get_question_topic(log.placement_question) == topic_name
-        ]
-        topic_question_counts[topic_name] = len(topic_logs)
+    # Answered questions are never re-selected
+    answered_questions = state.answered_set
+    topic_question_counts = state.topic_counts(all_topics)
 
     # Phase 1: Ensure minimum coverage (first 3-4 questions per topic)
     total_answered = len(answered_questions)
     print(
-        f"Total answered: {total_answered}, Minimum needed: {len(session.topic_abilities) * MIN_QUESTIONS_PER_TOPIC}"
+        f"Total answered: {total_answered}, Minimum needed: {len(all_topics) * MIN_QUESTIONS_PER_TOPIC}"
     )
 
-    if total_answered < len(session.topic_abilities) * MIN_QUESTIONS_PER_TOPIC:
+    if total_answered < len(all_topics) * MIN_QUESTIONS_PER_TOPIC:
         return _select_question_for_coverage_phase(
-            session, answered_questions, topic_question_counts
+            state, answered_questions, topic_question_counts
         )
 
     # Phase 2: Adaptive selection based on information and content constraints
     return _select_question_adaptive_phase(
-        session, answered_questions, topic_question_counts
+        state, answered_questions, topic_question_counts
     )
 
 
 def _select_question_for_coverage_phase(
-    session, answered_questions, topic_question_counts
+    state, answered_questions, topic_question_counts
 ):
     """
     Phase 1: Ensure each topic gets minimum coverage with appropriate difficulty
     """
     # Find topics that need more questions
-    under_covered_topics = []
-    for topic_ability in session.topic_abilities:
-        topic_name = topic_ability.topic
-        if topic_question_counts.get(topic_name, 0) < MIN_QUESTIONS_PER_TOPIC:
-            under_covered_topics.append(topic_ability)
+    under_covered_topics = [
+        topic
+        for topic in state.abilities
+        if topic_question_counts.get(topic, 0) < MIN_QUESTIONS_PER_TOPIC
+    ]
 
     print(f"Coverage phase: {len(under_covered_topics)} topics need more questions")
 
@@ -361,14 +328,13 @@ def _select_question_for_coverage_phase(
         return None
 
     # Select topic with highest standard error among under-covered
-    target_topic = max(under_covered_topics, key=lambda t: t.standard_error)
-    print(
-        f"Coverage phase: Selected topic '{target_topic.topic}' with SE={target_topic.standard_error:.3f}"
-    )
+    target_topic = max(under_covered_topics, key=lambda t: state.abilities[t][1])
+    theta, se = state.abilities[target_topic]
+    print(f"Coverage phase: Selected topic '{target_topic}' with SE={se:.3f}")
 
     selected_question = _select_best_question_in_topic(
-        target_topic.topic,
-        target_topic.ability_estimate,
+        target_topic,
+        theta,
         answered_questions,
         phase="coverage",
     )
@@ -379,15 +345,14 @@ def _select_question_for_coverage_phase(
     return selected_question
 
 
-def _select_question_adaptive_phase(session, answered_questions, topic_question_counts):
+def _select_question_adaptive_phase(state, answered_questions, topic_question_counts):
     """
     Phase 2: Pure adaptive selection with content balancing
     """
     best_question = None
     max_utility = -1
 
-    for topic_ability in session.topic_abilities:
-        topic_name = topic_ability.topic
+    for topic_name, (theta, se) in state.abilities.items():
         current_count = topic_question_counts.get(topic_name, 0)
 
         # Skip if topic has reached maximum
@@ -395,39 +360,28 @@ def _select_question_adaptive_phase(session, answered_questions, topic_question_
             continue
 
         # Calculate content balancing weight
-        # For this we need to get the actual answered count, not just used count
-        answered_logs = frappe.get_all(
-            "Placement Answer Log",
-            filters={
-                "placement_test_session": session.name,
-                "is_correct": ["is", "set"],
-            },
-            fields=["placement_question"],
-        )
-        total_answered = len([log for log in answered_logs if log.placement_question])
-        expected_proportion = 1.0 / len(session.topic_abilities)
+        total_answered = len(answered_questions)
+        expected_proportion = 1.0 / len(state.abilities)
         actual_proportion = current_count / max(total_answered, 1)
         content_weight = max(0.1, expected_proportion / max(actual_proportion, 0.01))
 
         # Find best question in this topic
         question_id = _select_best_question_in_topic(
             topic_name,
-            topic_ability.ability_estimate,
+            theta,
             answered_questions,
             phase="adaptive",
         )
 
         if question_id:
             # Calculate utility combining information and content balance
-            info_value = _calculate_question_information(
-                question_id, topic_ability.ability_estimate
-            )
+            info_value = _calculate_question_information(question_id, theta)
 
             # Utility = Information × Content Weight × Standard Error Priority
-            utility = info_value * content_weight * (topic_ability.standard_error**0.5)
+            utility = info_value * content_weight * (se**SE_PRIORITY_EXPONENT)
 
             print(
-                f"Topic {topic_name}: Info={info_value:.3f}, ContentWeight={content_weight:.2f}, SE={topic_ability.standard_error:.3f}, Utility={utility:.3f}"
+                f"Topic {topic_name}: Info={info_value:.3f}, ContentWeight={content_weight:.2f}, SE={se:.3f}, Utility={utility:.3f}"
             )
 
             if utility > max_utility:
@@ -448,272 +402,89 @@ def _select_best_question_in_topic(
     """
     Select the best question within a specific topic
     """
-    # Get available questions in topic, excluding used ones
-    if answered_questions:
-        # Use raw SQL for reliable exclusion
-        candidate_items = frappe.db.sql(
-            """
-            SELECT name, discrimination, difficulty, guessing_probability
-            FROM `tabPlacement Question`
-            WHERE topic = %s
-            AND name NOT IN ({})
-            """.format(
-                ",".join(["%s"] * len(answered_questions))
-            ),
-            [topic_name] + list(answered_questions),
-            as_dict=True,
-        )
-    else:
-        candidate_items = frappe.get_all(
-            "Placement Question",
-            filters={"topic": topic_name},
-            fields=["name", "discrimination", "difficulty", "guessing_probability"],
-        )
-
+    topic_items = get_item_bank().items(topic_name)
     print(
-        f"Topic '{topic_name}': Found {len(candidate_items)} candidate questions (phase: {phase})"
-    )
-    print(
-        f"Topic '{topic_name}': Excluded {len(answered_questions)} used questions: {list(answered_questions)[:3]}..."
+        f"Topic '{topic_name}': {len(topic_items) if topic_items else 0} questions in bank, "
+        f"excluding {len(answered_questions)} used (phase: {phase})"
     )
 
-    if not candidate_items:
+    best_question, score = select_item(
+        topic_items, theta, answered_questions, phase=phase
+    )
+    if not best_question:
         print(f"No questions available for topic '{topic_name}'")
         return None
 
     if phase == "coverage":
-        # For coverage phase, prefer questions near current ability
-        best_question = None
-        min_difficulty_diff = float("inf")
-
-        for item in candidate_items:
-            difficulty_diff = abs(item.difficulty - theta)
-            if difficulty_diff < min_difficulty_diff:
-                min_difficulty_diff = difficulty_diff
-                best_question = item.name
-
         print(
-            f"Coverage phase: Selected question '{best_question}' with difficulty diff {min_difficulty_diff:.3f}"
+            f"Coverage phase: Selected question '{best_question}' with difficulty diff {score:.3f}"
         )
-        return best_question
-
-    else:  # adaptive phase
-        # For adaptive phase, maximize information
-        best_question = None
-        max_info = -1
-
-        for item in candidate_items:
-            info_val = _calculate_question_information_from_params(
-                theta,
-                item.discrimination,
-                item.difficulty,
-                item.guessing_probability or 0.25,
-                0.05,  # upper asymptote
-            )
-
-            if info_val > max_info:
-                max_info = info_val
-                best_question = item.name
-
+    else:
         print(
-            f"Adaptive phase: Selected question '{best_question}' with info {max_info:.3f}"
+            f"Adaptive phase: Selected question '{best_question}' with info {score:.3f}"
         )
-        return best_question
+    return best_question
 
 
 def _calculate_question_information(question_id, theta):
     """
     Calculate Fisher information for a specific question
     """
-    question = frappe.get_doc("Placement Question", question_id)
-    return _calculate_question_information_from_params(
-        theta,
-        question.discrimination,
-        question.difficulty,
-        question.guessing_probability or 0.25,
-        0.05,
-    )
-
-
-def _calculate_question_information_from_params(theta, a, b, c, d):
-    """
-    Calculate Fisher Information for 4PL IRT model
-    """
-    try:
-        # 4PL model probability
-        exp_term = np.exp(a * (theta - b))
-        p = c + (d - c) * exp_term / (1 + exp_term)
-
-        # First derivative
-        dp_dtheta = a * (d - c) * exp_term / ((1 + exp_term) ** 2)
-
-        # Fisher Information
-        information = (dp_dtheta**2) / (p * (1 - p))
-
-        return float(information) if not np.isnan(information) else 0.0
-    except (ZeroDivisionError, OverflowError):
+    params = get_item_bank().params(question_id)
+    if params is None:
         return 0.0
+    return float(fisher_information(theta, params))
 
 
 def _get_question_topic(question_id):
     """
     Helper function to get topic of a question
     """
-    return frappe.db.get_value("Placement Question", question_id, "topic")
+    topic = get_item_bank().topic_of.get(question_id)
+    return topic or frappe.db.get_value("Placement Question", question_id, "topic")
 
 
-def _estimate_ability_using_mle(responses, item_params, current_theta=0.0):
+def _update_abilities(state, topics):
     """
-    IMPROVED: More robust MLE estimation with better bounds and error handling
+    EAP ability estimate and standard error of every topic from the session's
+    responses and the cached item parameters: {topic: (theta, se)}
     """
-    if not responses or item_params.size == 0:
-        return current_theta, 1.0
-
-    # Handle edge cases
-    correct_count = sum(responses)
-    total_count = len(responses)
-
-    if correct_count == 0:
-        # All wrong - set to minimum ability
-        return -4.0, 0.8
-    elif correct_count == total_count:
-        # All correct - set to maximum ability
-        return 4.0, 0.8
-
-    try:
-        # Multiple starting points for robustness
-        best_theta = current_theta
-        best_likelihood = float("inf")
-
-        starting_points = [current_theta, 0.0, -1.0, 1.0]
-
-        for start_theta in starting_points:
-            try:
-                res = minimize_scalar(
-                    negative_log_likelihood,
-                    args=(responses, item_params),
-                    bounds=(-4.0, 4.0),
-                    method="bounded",
-                    options={"xatol": 1e-8, "maxiter": 100},
-                )
-
-                if res.success and res.fun < best_likelihood:
-                    best_likelihood = res.fun
-                    best_theta = res.x
-            except:
-                continue
-
-        # Calculate standard error
-        se = see(best_theta, item_params)
-        se = max(0.1, min(2.0, se))  # Reasonable bounds for SE
-
+    bank = get_item_bank()
+    topic_responses = {}
+    for topic in topics:
+        items = bank.items(topic)
+        params, answers = [], []
+        for question, correct in state.responses.get(topic, ()):
+            idx = items.index.get(question) if items else None
+            if idx is not None:
+                params.append(items.params[idx])
+                answers.append(bool(correct))
+        topic_responses[topic] = (np.array(params).reshape(-1, 4), answers)
+
+    abilities = estimate_topic_abilities(topic_responses)
+    for topic, (theta, se) in abilities.items():
         print(
-            f"MLE: {correct_count}/{total_count} correct, theta={best_theta:.3f}, SE={se:.3f}"
-        )
-
-        return float(best_theta), float(se)
-
-    except Exception as e:
-        print(f"MLE error: {e}, falling back to simple estimation")
-        # Fallback: simple logit transformation
-        proportion_correct = correct_count / total_count
-        # Avoid extreme values
-        proportion_correct = max(0.01, min(0.99, proportion_correct))
-        fallback_theta = np.log(proportion_correct / (1 - proportion_correct))
-        return float(np.clip(fallback_theta, -3.0, 3.0)), 1.0
-
-
-def _update_ability_with_catsim(session_name, topic):
-    items = frappe.get_all(
-        "Placement Question",
-        filters={"topic": topic},
-        fields=["name", "discrimination", "difficulty", "guessing_probability"],
-    )
-    if not items:
-        return 0.0, 1.0
-
-    name_idx = {}
-    params = []
-    for i, it in enumerate(items):
-        name_idx[it.name] = i
-        params.append(
-            [
-                it.discrimination,  # a: discrimination parameter
-                it.difficulty,  # b: difficulty parameter
-                it.guessing_probability
-                or 0.25,  # c: guessing probability (lower asymptote)
-                0.05,  # FIXED: d: upper asymptote (probability of careless error by high-ability person)
-            ]
-        )
-    item_params = np.array(params)
-
-    # FIXED: Get responses for this specific topic only
-    logs = frappe.db.sql(
-        """
-        SELECT placement_question, is_correct 
-        FROM `tabPlacement Answer Log` 
-        WHERE placement_test_session = %s 
-        AND placement_question IN (
-            SELECT name FROM `tabPlacement Question` WHERE topic = %s
+            f"Topic '{topic}': {sum(topic_responses[topic][1])}/{len(topic_responses[topic][1])} correct, "
+            f"theta={theta:.3f}, SE={se:.3f}"
         )
-        AND is_correct IS NOT NULL
-        ORDER BY creation
-        """,
-        (session_name, topic),
-        as_dict=True,
-    )
-
-    print(f"Topic '{topic}': Found {len(logs)} answers for ability estimation")
-
-    responses, used = [], []
-    for lg in logs:
-        if lg["placement_question"] in name_idx:
-            idx = name_idx[lg["placement_question"]]
-            responses.append(bool(lg["is_correct"]))
-            used.append(item_params[idx])
-            print(f"  Question {lg['placement_question']}: {bool(lg['is_correct'])}")
-
-    if not responses:
-        return 0.0, 1.0
+    return abilities
 
-    print(f"Topic '{topic}': {sum(responses)}/{len(responses)} correct answers")
-    return _estimate_ability_using_mle(responses, np.vstack(used))
 
-
-def _check_termination(session):
+def _check_termination(state):
     """
     IMPROVED: More sophisticated termination criteria
     """
     # Count actually answered questions
-    total_answered = frappe.db.count(
-        "Placement Answer Log",
-        {
-            "placement_test_session": session.name,
-            "is_correct": ["is", "set"],
-        },
-    )
+    total_answered = state.total_answered
 
     # Hard limit
     if total_answered >= MAX_QUESTIONS_TOTAL:
         print(f"Terminating: Reached maximum questions ({total_answered})")
         return True
 
-    # Check if we have minimum questions per topic
-    topic_counts = {}
-    answered_logs = frappe.get_all(
-        "Placement Answer Log",
-        filters={"placement_test_session": session.name, "is_correct": ["is", "set"]},
-        fields=["placement_question"],
-    )
-
-    for log in answered_logs:
-        topic = _get_question_topic(log.placement_question)
-        topic_counts[topic] = topic_counts.get(topic, 0) + 1
-
     # Ensure minimum coverage
     min_questions_met = all(
-        topic_counts.get(t.topic, 0) >= MIN_QUESTIONS_PER_TOPIC
-        for t in session.topic_abilities
+        state.topic_count(topic) >= MIN_QUESTIONS_PER_TOPIC for topic in state.abilities
     )
 
     if not min_questions_met:
@@ -721,18 +492,17 @@ def _check_termination(session):
         return False
 
     # Check precision criteria
-    se_threshold_met = all(
-        t.standard_error <= STANDARD_ERROR_THRESHOLD for t in session.topic_abilities
-    )
+    standard_errors = [se for _, se in state.abilities.values()]
+    se_threshold_met = all(se <= STANDARD_ERROR_THRESHOLD for se in standard_errors)
 
     if se_threshold_met:
         print("Terminating: Standard error threshold met for all topics")
         return True
 
     # Minimum questions achieved, check if we should continue
-    if total_answered >= len(session.topic_abilities) * MIN_QUESTIONS_PER_TOPIC + 5:
+    if total_answered >= len(state.abilities) * MIN_QUESTIONS_PER_TOPIC + 5:
         # After minimum + buffer, use stricter SE criteria
-        avg_se = np.mean([t.standard_error for t in session.topic_abilities])
+        avg_se = np.mean(standard_errors)
         if avg_se <= STANDARD_ERROR_THRESHOLD * 1.2:
             print(
                 f"Terminating: Average SE ({avg_se:.3f}) acceptable after {total_answered} questions"
@@ -743,34 +513,138 @@ def _check_termination(session):
     return False
 
 
+def _advance_state(state, question_id, question_topic, is_correct):
+    """
+    Record an answer on `state`, re-estimate the answered topic (the only one whose
+    responses changed) and pick the next question.
+    Returns ({topic: (theta, se)}, next question id or None when the test ends).
+    """
+    state.record_answer(question_id, question_topic, is_correct)
+    abilities = _update_abilities(state, [question_topic])
+    for topic, (theta, se) in abilities.items():
+        state.set_ability(topic, theta, se)
+
+    if _check_termination(state):
+        return abilities, None
+    return abilities, _get_next_question_with_catsim(state)
+
+
+def _serve_question(state, question_id):
+    """Remember the question shown to the student and speculate on its answer"""
+    state.pending_question = question_id
+    save_session_state(state)
+    frappe.enqueue(
+        "elearning.elearning.doctype.test.placement_test.precompute_next_questions",
+        queue="short",
+        job_id=f"placement_precompute::{state.session_name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        session_name=state.session_name,
+    )
+
+
+def precompute_next_questions(session_name):
+    """
+    Background job: while the student reads the pending question, compute the
+    abilities and next question for both a correct and a wrong answer
+    """
+    state = peek_session_state(session_name)
+    if not state or not state.pending_question:
+        return
+
+    question_topic = _get_question_topic(state.pending_question)
+    branches = {}
+    for is_correct in (True, False):
+        abilities, next_question = _advance_state(
+            state.copy(), state.pending_question, question_topic, is_correct
+        )
+        branches["1" if is_correct else "0"] = {
+            "abilities": abilities,
+            "next_question": next_question,
+        }
+    save_precomputed_branches(state, branches)
+
+
+def _bulk_insert_children(rows, data_fields):
+    """Insert new child rows (with names already set) in a single statement"""
+    if not rows:
+        return
+    now = frappe.utils.now()
+    fields = [
+        "name",
+        "creation",
+        "modified",
+        "owner",
+        "modified_by",
+        "docstatus",
+        "parent",
+        "parenttype",
+        "parentfield",
+        "idx",
+    ]
+    frappe.db.bulk_insert(
+        rows[0].doctype,
+        fields=fields + data_fields,
+        values=[
+            (
+                row.name,
+                now,
+                now,
+                frappe.session.user,
+                frappe.session.user,
+                0,
+                row.parent,
+                row.parenttype,
+                row.parentfield,
+                row.idx,
+            )
+            + tuple(row.get(field) for field in data_fields)
+            for row in rows
+        ],
+    )
+
+
 def _finalize_session_and_get_results(session):
     if session.status != "Completed":
-        session.status = "Completed"
-        session.end_time = frappe.utils.now_datetime()
-        session.save(ignore_permissions=True)
+        session.db_set(
+            {"status": "Completed", "end_time": frappe.utils.now_datetime()}
+        )
+    clear_session_state(session.name)
+
+    # Answers and correct answers per topic in one grouped query
+    topic_stats = {
+        row.topic: row
+        for row in frappe.db.sql(
+            """
+            SELECT q.topic, COUNT(*) AS num_answered, SUM(l.is_correct) AS num_correct
+            FROM `tabPlacement Answer Log` l
+            INNER JOIN `tabPlacement Question` q ON q.name = l.placement_question
+            WHERE l.placement_test_session = %s
+            AND l.is_correct IS NOT NULL
+            GROUP BY q.topic
+            """,
+            (session.name,),
+            as_dict=True,
+        )
+    }
+    topic_names = {
+        row.name: row.topic_name
+        for row in frappe.get_all(
+            "Topics",
+            filters={"name": ["in", [t.topic for t in session.topic_abilities]]},
+            fields=["name", "topic_name"],
+        )
+    }
 
     profile = frappe.get_doc("Student Knowledge Profile", session.student)
+    previous_rows = [row.name for row in profile.topic_mastery]
     profile.topic_mastery = []
     results = []
 
     for t in session.topic_abilities:
-        logs = frappe.get_all(
-            "Placement Answer Log",
-            filters={
-                "placement_test_session": session.name,
-                "is_correct": ["is", "set"],
-            },
-            fields=["placement_question", "is_correct"],
-        )
-        topic_questions = frappe.get_all(
-            "Placement Question", filters={"topic": t.topic}, fields=["name"]
-        )
-        topic_question_names = {q.name for q in topic_questions}
-        topic_logs = [
-            lg for lg in logs if lg["placement_question"] in topic_question_names
-        ]
-        num_answered = len(topic_logs)
-        num_correct = sum(1 for lg in topic_logs if lg["is_correct"])
+        stats = topic_stats.get(t.topic)
+        num_answered = int(stats.num_answered) if stats else 0
+        num_correct = int(stats.num_correct or 0) if stats else 0
         correct_ratio = float(num_correct) / num_answered if num_answered > 0 else None
 
         if t.questions_answered == 0:
@@ -786,11 +660,15 @@ def _finalize_session_and_get_results(session):
 
         profile.append(
             "topic_mastery",
-            {"topic": t.topic, "mastery_weight": mw},
+            {
+                "name": frappe.generate_hash(length=10),
+                "topic": t.topic,
+                "mastery_weight": mw,
+            },
         )
 
         # === THAY ĐỔI: Lấy topic_name từ DocType Topics ===
-        topic_name = frappe.db.get_value("Topics", t.topic, "topic_name") or t.topic
+        topic_name = topic_names.get(t.topic) or t.topic
         results.append(
             {
                 "topic": topic_name,  # Gửi topic_name
@@ -803,31 +681,32 @@ def _finalize_session_and_get_results(session):
             }
         )
 
-    # Set flag to skip the mastery hook during Topic Mastery operations
-    profile._skip_mastery_hook = True
-    profile.save(ignore_permissions=True)
+    # Replace the profile's Topic Mastery rows directly (one DELETE, one INSERT).
+    # The profile document is not saved: only modified/modified_by change, and no
+    # Student Knowledge Profile on_update hook, controller method or version runs
+    if previous_rows:
+        frappe.db.delete("Topic Mastery", {"name": ["in", previous_rows]})
+    _bulk_insert_children(profile.topic_mastery, ["topic", "mastery_weight"])
+    frappe.db.set_value(
+        "Student Knowledge Profile",
+        profile.name,
+        "modified_by",
+        frappe.session.user,
+    )
     frappe.db.commit()
 
     return {"status": "completed", "session_id": session.name, "results": results}
 
 
 def _format_question_for_frontend(question_id):
-    q = frappe.get_doc("Placement Question", question_id)
-    # Lấy topic_name thay vì description
-    topic_name = frappe.db.get_value("Topics", q.topic, "topic_name") or q.topic
+    # Serialized payload from the item bank cache: no document loads per question
+    payload = get_question_payload(question_id)
+    if payload is None:
+        frappe.throw(f"Không tìm thấy câu hỏi {question_id}.")
 
-    opts = [{"text": o.option_text} for o in q.options]
+    opts = [{"text": text} for text in payload["options"]]
     random.shuffle(opts)
-    correct_answer = next((o.option_text for o in q.options if o.is_correct), None)
-
-    return {
-        "id": q.name,
-        "text": q.content,
-        "options": opts,
-        "correct_answer": correct_answer,
-        "difficulty": q.difficulty,  # Thêm độ khó
-        "topic_name": topic_name,  # Thêm topic_name
-    }
+    return dict(payload, options=opts)
 
 
 def _convert_theta_to_mastery(
@@ -858,17 +737,9 @@ def _convert_theta_to_mastery(
     if topic and questions_answered and questions_answered > 0:
         try:
             # Get average difficulty of all questions in this topic
+            topic_items = get_item_bank().items(topic)
             avg_topic_difficulty = (
-                frappe.db.sql(
-                    """
-                SELECT AVG(difficulty) as avg_diff 
-                FROM `tabPlacement Question` 
-                WHERE topic = %s
-                """,
-                    (topic,),
-                    as_dict=True,
-                )[0].avg_diff
-                or 0.0
+                float(topic_items.params[:, 1].mean()) if topic_items else 0.0
             )
 
             # Adjust based on topic difficulty
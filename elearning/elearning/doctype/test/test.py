@@ -42,27 +42,11 @@ def find_all_active_tests(topic_id=None, grade_level=None, test_type=None):
             "time_limit_minutes",
             "instructions",
             "difficulty_level",
+            "question_count",
         ],
         order_by="title asc",
     )
 
-    # Add question count
-    test_names = [t["name"] for t in tests_list]
-    if test_names:
-        counts = frappe.get_all(
-            "Test Question Item",
-            filters={"parent": ["in", test_names], "parenttype": "Test"},
-            fields=["parent", "count(name) as count"],
-            group_by="parent",
-            as_list=False,
-        )
-        counts_dict = {c["parent"]: c["count"] for c in counts}
-        for test in tests_list:
-            test["question_count"] = counts_dict.get(test.name, 0)
-    else:
-        for test in tests_list:
-            test["question_count"] = 0
-
     return tests_list
 
 
@@ -78,30 +62,6 @@ def get_test_details(test_id=None):
         test_doc = frappe.get_doc("Test", test_id)
         # Add permission check if needed: frappe.has_permission("Test", "read", doc=test_doc)
 
-        total_possible_score = 0
-        for q in test_doc.get("questions", []):
-            try:
-                question_doc = frappe.get_doc("Question", q.get("question"))
-                if question_doc.question_type == "Essay":
-                    rubric_items = frappe.get_all(
-                        "Rubric Item",
-                        filters={"question": question_doc.name},
-                        fields=["max_score"],
-                    )
-                    essay_score = (
-                        sum(item.max_score for item in rubric_items)
-                        if rubric_items
-                        else 0
-                    )
-                    total_possible_score += essay_score
-                else:
-                    total_possible_score += getattr(question_doc, "marks", 1)
-            except Exception as e:
-                logger.warning(
-                    f"Error calculating score for question {q.get('question')}: {e}"
-                )
-                total_possible_score += 1
-        print("total possible score:", total_possible_score)
         result = {
             "name": test_doc.name,
             "title": test_doc.title,
@@ -113,9 +73,9 @@ def get_test_details(test_id=None):
             "time_limit_minutes": test_doc.time_limit_minutes,
             "passing_score": test_doc.passing_score,
             "is_active": test_doc.is_active,
-            "question_count": len(test_doc.get("questions", [])),
+            "question_count": test_doc.question_count,
             "has_essay_question": test_doc.has_essay_question,
-            "total_possible_score": total_possible_score,
+            "total_possible_score": test_doc.total_possible_score,
         }
         logger.info(f"Result: {result}")
         return result
@@ -0,0 +1,69 @@
+# Copyright (c) 2026, Minh Quy and Contributors
+# See license.txt
+
+import statistics
+from datetime import datetime, timedelta
+
+from frappe.tests.utils import FrappeTestCase
+
+from elearning.elearning.utils.pacing_stats import HALF_LIFE_DAYS, welford_add, welford_remove
+
+SAMPLE = [312.0, 95.5, 180.0, 640.25, 220.0, 75.0, 410.0, 198.5]
+START = datetime(2026, 1, 1, 8, 0)
+
+
+def fold(seconds, step=timedelta(0)):
+	stats = {}
+	for i, value in enumerate(seconds):
+		welford_add(stats, value, START + i * step)
+	return stats
+
+
+class TestTopicPacingStats(FrappeTestCase):
+	def test_welford_add_matches_mean_and_variance(self):
+		stats = fold(SAMPLE)
+
+		self.assertEqual(stats["session_count"], len(SAMPLE))
+		self.assertAlmostEqual(stats["mean_seconds"], statistics.mean(SAMPLE), places=9)
+		self.assertAlmostEqual(stats["m2"] / (len(SAMPLE) - 1), statistics.variance(SAMPLE), places=6)
+
+	def test_welford_remove_undoes_add(self):
+		stats = welford_remove(fold(SAMPLE + [1000.0]), 1000.0)
+
+		self.assertEqual(stats["session_count"], len(SAMPLE))
+		self.assertAlmostEqual(stats["mean_seconds"], statistics.mean(SAMPLE), places=9)
+		self.assertAlmostEqual(stats["m2"] / (len(SAMPLE) - 1), statistics.variance(SAMPLE), places=6)
+
+	def test_welford_remove_of_an_inner_value(self):
+		stats = welford_remove(fold(SAMPLE), SAMPLE[2])
+		rest = SAMPLE[:2] + SAMPLE[3:]
+
+		self.assertAlmostEqual(stats["mean_seconds"], statistics.mean(rest), places=9)
+		self.assertAlmostEqual(stats["m2"] / (len(rest) - 1), statistics.variance(rest), places=6)
+
+	def test_remove_last_session_resets_stats(self):
+		stats = welford_remove(fold([120.0]), 120.0)
+
+		self.assertEqual((stats["session_count"], stats["mean_seconds"], stats["m2"]), (0, 0.0, 0.0))
+
+	def test_decayed_stats_without_elapsed_time_equal_exact_stats(self):
+		stats = fold(SAMPLE)
+
+		self.assertAlmostEqual(stats["decayed_weight"], len(SAMPLE), places=9)
+		self.assertAlmostEqual(stats["decayed_mean_seconds"], stats["mean_seconds"], places=9)
+		self.assertAlmostEqual(stats["decayed_m2"], stats["m2"], places=6)
+
+	def test_decayed_stats_weight_sessions_by_half_life(self):
+		step = timedelta(days=HALF_LIFE_DAYS / 4)
+		stats = fold(SAMPLE, step)
+
+		last = len(SAMPLE) - 1
+		weights = [0.5 ** ((last - i) / 4) for i in range(len(SAMPLE))]
+		total = sum(weights)
+		mean = sum(w * x for w, x in zip(weights, SAMPLE)) / total
+		m2 = sum(w * (x - mean) ** 2 for w, x in zip(weights, SAMPLE))
+
+		self.assertAlmostEqual(stats["decayed_weight"], total, places=9)
+		self.assertAlmostEqual(stats["decayed_mean_seconds"], mean, places=9)
+		self.assertAlmostEqual(stats["decayed_m2"], m2, places=6)
+		self.assertEqual(stats["last_session_on"], START + last * step)
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Minh Quy and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Topic Pacing Stats", {
+// 	refresh(frm) {
+
+// 	},
+// });
\ No newline at end of file
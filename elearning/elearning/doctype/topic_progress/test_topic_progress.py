@@ -1,9 +1,132 @@
 # Copyright (c) 2025, Minh Quy and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+
+from elearning.elearning.doctype.topic_progress.topic_progress import (
+	PROGRESS_FIELDS,
+	exam_attempt_counts,
+	progress_fields,
+	refresh_all_topic_progress,
+	srs_counts,
+)
+
+USER_A = "_test_topic_progress_a@example.com"
+USER_B = "_test_topic_progress_b@example.com"
+TOPIC_1 = "_Test Progress Topic 1"
+TOPIC_2 = "_Test Progress Topic 2"
+STALE = "2020-01-01 00:00:00"
 
 
 class TestTopicProgress(FrappeTestCase):
-	pass
+	def setUp(self):
+		now = now_datetime()
+		# A/1: two due cards, one due within UPCOMING_DAYS and one too far ahead to count
+		for user, topic, days in [
+			(USER_A, TOPIC_1, -1),
+			(USER_A, TOPIC_1, 0),
+			(USER_A, TOPIC_1, 1),
+			(USER_A, TOPIC_1, 5),
+			(USER_B, TOPIC_1, -3),
+		]:
+			self.insert_srs(user, topic, add_days(now, days) if days else now)
+
+		# Only attempts with at least one non-empty answer count
+		self.insert_attempt(USER_A, TOPIC_1, ["x = 2"])
+		self.insert_attempt(USER_A, TOPIC_1, ["", None])
+		self.insert_attempt(USER_A, TOPIC_1, [])
+		self.insert_attempt(USER_A, TOPIC_2, [None, "x = 3"])
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def insert_srs(self, user, topic, next_review):
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabUser SRS Progress` (name, user, topic, next_review_timestamp, creation, modified, owner, modified_by)
+			VALUES (%s, %s, %s, %s, NOW(), NOW(), 'Administrator', 'Administrator')
+			""",
+			(frappe.generate_hash(length=10), user, topic, next_review),
+		)
+
+	def insert_attempt(self, user, topic, answers):
+		attempt = frappe.generate_hash(length=10)
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabUser Exam Attempt` (name, user, topic, creation, modified, owner, modified_by)
+			VALUES (%s, %s, %s, NOW(), NOW(), 'Administrator', 'Administrator')
+			""",
+			(attempt, user, topic),
+		)
+		for idx, answer in enumerate(answers, 1):
+			frappe.db.sql(
+				"""
+				INSERT INTO `tabUser Exam Attempt Detail`
+				(name, parent, parenttype, parentfield, idx, user_answer, creation, modified, owner, modified_by)
+				VALUES (%s, %s, 'User Exam Attempt', 'attempt_details', %s, %s, NOW(), NOW(), 'Administrator', 'Administrator')
+				""",
+				(frappe.generate_hash(length=10), attempt, idx, answer),
+			)
+
+	def insert_progress(self, user, topic, fields):
+		name = frappe.generate_hash(length=10)
+		columns = ["name", "user", "topic", "last_calculated", "creation", "modified", "owner", "modified_by"]
+		values = [name, user, topic, STALE, STALE, STALE, "Administrator", "Administrator"]
+		columns += PROGRESS_FIELDS
+		values += [fields[field] for field in PROGRESS_FIELDS]
+		frappe.db.sql(
+			f"""
+			INSERT INTO `tabTopic Progress` ({", ".join(f"`{column}`" for column in columns)})
+			VALUES ({", ".join(["%s"] * len(values))})
+			""",
+			values,
+		)
+		return name
+
+	def get_progress(self, user, topic):
+		return frappe.db.get_value(
+			"Topic Progress", {"user": user, "topic": topic}, ["name", "last_calculated"] + PROGRESS_FIELDS, as_dict=True
+		)
+
+	def test_srs_counts_split_due_and_upcoming_cards(self):
+		self.assertEqual(
+			srs_counts([USER_A, USER_B]),
+			{(USER_A, TOPIC_1): (2, 1), (USER_B, TOPIC_1): (1, 0)},
+		)
+		self.assertEqual(srs_counts([USER_A], [TOPIC_2]), {})
+		self.assertEqual(srs_counts([]), {})
+
+	def test_exam_attempt_counts_skip_unanswered_attempts(self):
+		self.assertEqual(
+			exam_attempt_counts([USER_A, USER_B]),
+			{(USER_A, TOPIC_1): 1, (USER_A, TOPIC_2): 1},
+		)
+		self.assertEqual(exam_attempt_counts([USER_A], [TOPIC_2]), {(USER_A, TOPIC_2): 1})
+
+	def test_refresh_all_updates_changed_rows_and_creates_missing_ones(self):
+		current = self.insert_progress(USER_A, TOPIC_1, progress_fields(3, 2, 1))
+		stale = self.insert_progress(USER_B, TOPIC_1, progress_fields(0, 0, 0))
+
+		with patch.object(frappe.db, "commit"):
+			report = refresh_all_topic_progress([USER_A, USER_B])
+
+		self.assertEqual(report, {"pairs": 3, "updated": 1, "created": 1})
+
+		unchanged = self.get_progress(USER_A, TOPIC_1)
+		self.assertEqual(unchanged.name, current)
+		self.assertEqual(str(unchanged.last_calculated), STALE)
+
+		updated = self.get_progress(USER_B, TOPIC_1)
+		self.assertEqual(updated.name, stale)
+		self.assertNotEqual(str(updated.last_calculated), STALE)
+		for field, value in progress_fields(1, 1, 0).items():
+			self.assertEqual(updated[field], value, field)
+
+		created = self.get_progress(USER_A, TOPIC_2)
+		self.assertIsNotNone(created)
+		for field, value in progress_fields(0, 0, 1).items():
+			self.assertEqual(created[field], value, field)
@@ -3,7 +3,8 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import now_datetime
+from frappe.model.naming import make_autoname
+from frappe.utils import add_days, flt, now_datetime
 
 
 class TopicProgress(Document):
@@ -18,87 +19,193 @@ class TopicProgress(Document):
         
         # Lấy dữ liệu SRS
         srs_data = self.get_srs_data()
-        total_cards = srs_data.get('total_count', 0)
-        due_cards = srs_data.get('due_count', 0)
         
-        # Lấy dữ liệu exam attempts
-        exam_attempts = self.get_exam_attempts()
-        exam_count = len(exam_attempts)
-        
-        # Cập nhật các field
-        self.total_srs_cards = total_cards
-        self.due_srs_cards = due_cards
-        self.exam_attempts_count = exam_count
-        
-        # Tính toán progress
-        total_progress = 0
-        
-        # 1. Base progress for having SRS cards
-        if total_cards > 0:
-            self.srs_progress = 20  # 20% cơ bản cho SRS
-            
-            # SRS progression based on cards not due today
-            srs_progression = (total_cards - due_cards) / total_cards * 60 if total_cards > 0 else 0
-            total_progress = 20 + srs_progression
-        else:
-            self.srs_progress = 0
-        
-        # 2. Additional progress for exam attempts
-        if exam_count > 0:
-            # Exam progress: 5% base + 2% per attempt, max 15%
-            exam_progress = min(15, 5 + (exam_count * 2))
-            self.exam_progress = exam_progress
-            total_progress += exam_progress
-        else:
-            self.exam_progress = 0
-        
-        # Cap at 100%
-        self.progress_percentage = min(round(total_progress), 100)
+        # Đếm exam attempts
+        exam_count = self.get_exam_attempt_count()
         
+        self.update(progress_fields(srs_data['total_count'], srs_data['due_count'], exam_count))
         return self.progress_percentage
     
     def get_srs_data(self):
         """Lấy dữ liệu SRS cho topic cụ thể"""
-        try:
-            # Gọi API get_due_srs_summary
-            result = frappe.call(
-                "elearning.elearning.doctype.user_srs_progress.user_srs_progress.get_due_srs_summary"
-            )
-            
-            if result and result.get('topics'):
-                # Tìm topic tương ứng
-                for topic_data in result['topics']:
-                    if (str(topic_data.get('topic_id')) == str(self.topic) or 
-                        str(topic_data.get('topic_name')) == str(self.topic)):
-                        return {
-                            'total_count': topic_data.get('total_count', 0),
-                            'due_count': topic_data.get('due_count', 0),
-                            'upcoming_count': topic_data.get('upcoming_count', 0)
-                        }
-            
-            return {'total_count': 0, 'due_count': 0, 'upcoming_count': 0}
-        except Exception as e:
-            frappe.log_error(f"Error getting SRS data: {str(e)}")
-            return {'total_count': 0, 'due_count': 0, 'upcoming_count': 0}
+        due_count, upcoming_count = srs_counts([self.user], [self.topic]).get(
+            (self.user, str(self.topic)), (0, 0)
+        )
+        return {
+            'total_count': due_count + upcoming_count,
+            'due_count': due_count,
+            'upcoming_count': upcoming_count
+        }
     
-    def get_exam_attempts(self):
-        """Lấy dữ liệu exam attempts cho topic cụ thể"""
-        try:
-            # Gọi API get_user_exam_history
-            result = frappe.call(
-                "elearning.elearning.doctype.user_exam_attempt.user_exam_attempt.get_user_exam_history",
-                topic_name=str(self.topic)
-            )
-            
-            if result and result.get('attempts'):
-                return result['attempts']
-            elif isinstance(result, list):
-                return result
-            else:
-                return []
-        except Exception as e:
-            frappe.log_error(f"Error getting exam attempts: {str(e)}")
-            return []
+    def get_exam_attempt_count(self):
+        """Đếm exam attempts (có ít nhất một câu trả lời) cho topic cụ thể"""
+        return exam_attempt_counts([self.user], [self.topic]).get((self.user, str(self.topic)), 0)
+
+
+PROGRESS_FIELDS = [
+    "progress_percentage", "srs_progress", "exam_progress",
+    "total_srs_cards", "due_srs_cards", "exam_attempts_count",
+]
+UPCOMING_DAYS = 2  # Giống get_due_srs_summary: thẻ sắp đến hạn trong 2 ngày tới
+UPDATE_CHUNK_SIZE = 500
+NAMING_SERIES = "TP-.#####"
+
+
+def progress_fields(total_cards, due_cards, exam_count):
+    """Các field progress từ số thẻ SRS (đến hạn + sắp đến hạn), số thẻ đến hạn và số exam attempts"""
+    total_progress = 0
+    
+    # 1. Base progress for having SRS cards
+    if total_cards > 0:
+        srs_progress = 20  # 20% cơ bản cho SRS
+        
+        # SRS progression based on cards not due today
+        total_progress = 20 + (total_cards - due_cards) / total_cards * 60
+    else:
+        srs_progress = 0
+    
+    # 2. Additional progress for exam attempts: 5% base + 2% per attempt, max 15%
+    exam_progress = min(15, 5 + (exam_count * 2)) if exam_count > 0 else 0
+    total_progress += exam_progress
+    
+    return {
+        "progress_percentage": min(round(total_progress), 100),  # Cap at 100%
+        "srs_progress": srs_progress,
+        "exam_progress": exam_progress,
+        "total_srs_cards": total_cards,
+        "due_srs_cards": due_cards,
+        "exam_attempts_count": exam_count,
+    }
+
+
+def _scope_condition(alias, users, topics):
+    conditions, values = [], {}
+    if users is not None:
+        conditions.append(f"{alias}.user IN %(users)s")
+        values["users"] = tuple(users)
+    if topics is not None:
+        conditions.append(f"{alias}.topic IN %(topics)s")
+        values["topics"] = tuple(str(topic) for topic in topics)
+    return " AND ".join(conditions) or "1=1", values
+
+
+def srs_counts(users=None, topics=None):
+    """{(user, topic): (due_count, upcoming_count)} trong một query, giới hạn theo users/topics nếu có"""
+    if (users is not None and not users) or (topics is not None and not topics):
+        return {}
+    condition, values = _scope_condition("p", users, topics)
+    now = now_datetime()
+    values.update(now=now, upcoming=add_days(now, UPCOMING_DAYS))
+    rows = frappe.db.sql(
+        f"""
+        SELECT p.user, p.topic,
+            SUM(p.next_review_timestamp <= %(now)s),
+            SUM(p.next_review_timestamp > %(now)s)
+        FROM `tabUser SRS Progress` p
+        WHERE {condition} AND p.topic IS NOT NULL AND p.next_review_timestamp <= %(upcoming)s
+        GROUP BY p.user, p.topic
+        """,
+        values,
+    )
+    return {(user, str(topic)): (int(due or 0), int(upcoming or 0)) for user, topic, due, upcoming in rows}
+
+
+def exam_attempt_counts(users=None, topics=None):
+    """{(user, topic): số User Exam Attempt có ít nhất một câu đã trả lời} trong một query"""
+    if (users is not None and not users) or (topics is not None and not topics):
+        return {}
+    condition, values = _scope_condition("a", users, topics)
+    rows = frappe.db.sql(
+        f"""
+        SELECT a.user, a.topic, COUNT(*)
+        FROM `tabUser Exam Attempt` a
+        WHERE {condition} AND EXISTS (
+            SELECT 1 FROM `tabUser Exam Attempt Detail` d
+            WHERE d.parent = a.name AND d.parenttype = 'User Exam Attempt'
+            AND IFNULL(d.user_answer, '') != ''
+        )
+        GROUP BY a.user, a.topic
+        """,
+        values,
+    )
+    return {(user, str(topic)): count for user, topic, count in rows}
+
+
+def refresh_topic_progress(user, topic):
+    """Tính lại progress của (user, topic) nếu đã có Topic Progress (gọi từ doc events)"""
+    name = frappe.db.get_value("Topic Progress", {"user": user, "topic": topic}, "name")
+    if not name:
+        return
+    due_count, upcoming_count = srs_counts([user], [topic]).get((user, str(topic)), (0, 0))
+    exam_count = exam_attempt_counts([user], [topic]).get((user, str(topic)), 0)
+    fields = progress_fields(due_count + upcoming_count, due_count, exam_count)
+    frappe.db.set_value("Topic Progress", name, dict(fields, last_calculated=now_datetime()))
+
+
+def on_srs_progress_change(doc, method=None):
+    """User SRS Progress doc event"""
+    refresh_topic_progress(doc.user, doc.topic)
+
+
+def on_exam_attempt_change(doc, method=None):
+    """User Exam Attempt doc event"""
+    refresh_topic_progress(doc.user, doc.topic)
+
+
+def refresh_all_topic_progress(users=None):
+    """
+    Bulk mode: tính lại progress cho mọi topic có SRS/exam của `users` (mặc định
+    tất cả) bằng hai grouped query, ghi lại các dòng thay đổi và tạo dòng còn thiếu.
+        bench --site <site> execute elearning.elearning.doctype.topic_progress.topic_progress.refresh_all_topic_progress
+    """
+    srs = srs_counts(users)
+    exams = exam_attempt_counts(users)
+    existing_filters = {"user": ["in", list(users)]} if users is not None else {}
+    existing = {
+        (row.user, str(row.topic)): row
+        for row in frappe.get_all(
+            "Topic Progress",
+            filters=existing_filters,
+            fields=["name", "user", "topic"] + PROGRESS_FIELDS,
+            limit_page_length=0,
+        )
+    }
+    
+    now = now_datetime()
+    updates, inserts = {}, []
+    pairs = set(srs) | set(exams) | set(existing)
+    for pair in pairs:
+        due_count, upcoming_count = srs.get(pair, (0, 0))
+        fields = progress_fields(due_count + upcoming_count, due_count, exams.get(pair, 0))
+        row = existing.get(pair)
+        if row is None:
+            inserts.append((pair, fields))
+        elif any(flt(row.get(field)) != flt(value) for field, value in fields.items()):
+            updates[row.name] = dict(fields, last_calculated=now)
+    
+    if updates:
+        frappe.db.bulk_update("Topic Progress", updates, chunk_size=UPDATE_CHUNK_SIZE)
+    if inserts:
+        columns = [
+            "name", "naming_series", "user", "topic", "last_calculated",
+            "creation", "modified", "owner", "modified_by",
+        ] + PROGRESS_FIELDS
+        owner = frappe.session.user
+        frappe.db.bulk_insert(
+            "Topic Progress",
+            columns,
+            [
+                [make_autoname(NAMING_SERIES, "Topic Progress"), NAMING_SERIES, user, topic, now, now, now, owner, owner]
+                + [fields[field] for field in PROGRESS_FIELDS]
+                for (user, topic), fields in inserts
+            ],
+            chunk_size=UPDATE_CHUNK_SIZE,
+        )
+    frappe.db.commit()
+    
+    report = {"pairs": len(pairs), "updated": len(updates), "created": len(inserts)}
+    frappe.logger().info(f"Topic progress refresh: {report}")
+    return report
 
 
 @frappe.whitelist()
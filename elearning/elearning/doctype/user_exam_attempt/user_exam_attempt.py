@@ -12,6 +12,7 @@ import requests
 import time
 import re
 import random
+from elearning.elearning.utils.gemini_grader_service import get_gemini_api_url
 #import google.generativeai as genai
 #from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
@@ -1144,7 +1145,7 @@ def generate_ai_feedback(detail, user_answer):
                 "ai_feedback_what_to_include": "Liên hệ quản trị viên để được hỗ trợ."
             }
         
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
+        api_url = get_gemini_api_url("gemini-1.5-flash", api_key)
         
         system_prompt = """
         Bạn là trợ lý AI giáo dục phân tích câu trả lời của học sinh.
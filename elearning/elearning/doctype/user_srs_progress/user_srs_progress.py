@@ -11,6 +11,7 @@ import math
 import requests
 import re
 import json
+from elearning.elearning.utils.gemini_grader_service import get_gemini_api_url
 
 class UserSRSProgress(Document):
     def before_save(self):
@@ -805,7 +806,7 @@ def submit_srs_answer_and_get_feedback():
                 "message": "Gemini API key not configured"
             }
         
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={api_key}"
+        api_url = get_gemini_api_url("gemini-1.5-flash", api_key)
         
         system_prompt = """
         Mình là một người bạn học cùng nhiệt tình và thấu hiểu. Mình sẽ giúp bạn phân tích câu trả lời và đưa ra những góp ý hữu ích.
@@ -1060,7 +1061,7 @@ def get_detailed_explanation(flashcard_name=None, question=None, answer=None, us
                 "explanation": answer or "Không có lời giải"
             }
         
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        api_url = get_gemini_api_url("gemini-2.0-flash", api_key)
         
         # Prompt ngắn gọn hơn để tránh nội dung quá dài
         system_prompt = """
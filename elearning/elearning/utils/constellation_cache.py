@@ -0,0 +1,96 @@
+"""
+Per-user read model for get_knowledge_constellation.
+
+The constellation (one entry per Student Topic Mastery row with topic name,
+weakness score, components and unlock state) is built once, serialized, and
+kept in a Redis hash keyed by user together with an ETag (hash of the
+serialized payload). It is dropped whenever the user's Student Topic Mastery
+rows or pathway snapshot change, or any topic is renamed, and rebuilt lazily
+on the next request.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+import frappe
+
+CACHE_KEY = "knowledge_constellation"
+
+
+def build_constellation(user: str) -> list:
+    from elearning.elearning.utils.pathway_store import get_pathway_view
+
+    # Get all mastery data for the user
+    mastery_data = frappe.get_all(
+        "Student Topic Mastery",
+        filters={"student": user},
+        fields=["topic", "weakness_score", "accuracy_component", "pacing_component", "decay_component"],
+        order_by="topic asc",
+        limit_page_length=0,
+    )
+    topic_name_map = {
+        str(t.name): t.topic_name
+        for t in frappe.get_all("Topics", fields=["name", "topic_name"], limit_page_length=0)
+    }
+
+    profile_name = frappe.db.get_value("Student Knowledge Profile", {"student": user}, "name")
+    view = get_pathway_view(profile_name) if profile_name else None
+    unlocked_map = {
+        str(chapter.get("id")): bool(chapter.get("is_unlocked", False))
+        for chapter in (view or {}).get("pathway", [])
+    }
+
+    return [
+        {
+            "topic_id": str(mastery.topic),
+            "topic_name": topic_name_map.get(str(mastery.topic), f"Topic {mastery.topic}"),
+            "weakness_score": mastery.weakness_score,
+            "is_unlocked": unlocked_map.get(str(mastery.topic), False),
+            "components": {
+                "accuracy": mastery.accuracy_component,
+                "pacing": mastery.pacing_component,
+                "decay": mastery.decay_component,
+            },
+        }
+        for mastery in mastery_data
+    ]
+
+
+def get_constellation(user: str) -> dict:
+    """{"etag": str, "payload": list} for `user`, from the cache or freshly built"""
+    cached = frappe.cache().hget(CACHE_KEY, user)
+    if cached:
+        return cached
+
+    payload = build_constellation(user)
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    entry = {"etag": f'"{hashlib.sha1(serialized.encode()).hexdigest()}"', "payload": payload}
+    frappe.cache().hset(CACHE_KEY, user, entry)
+    return entry
+
+
+def invalidate_constellation(user: Optional[str]):
+    """Drop the user's constellation now and again after commit (so a concurrent rebuild cannot keep stale data)"""
+    if not user:
+        return
+
+    def drop():
+        frappe.cache().hdel(CACHE_KEY, user)
+
+    drop()
+    frappe.db.after_commit.add(drop)
+
+
+def invalidate_constellation_for_profile(profile_name: str):
+    invalidate_constellation(frappe.db.get_value("Student Knowledge Profile", profile_name, "student"))
+
+
+def on_student_topic_mastery_change(doc, method=None):
+    """Student Topic Mastery doc event"""
+    invalidate_constellation(doc.student)
+
+
+def on_topic_change(doc, method=None):
+    """Topics doc event: topic names are part of every user's constellation"""
+    frappe.cache().delete_value(CACHE_KEY)
@@ -0,0 +1,170 @@
+"""
+Topic prerequisite graph (curriculum DAG) shared by the placement test, the
+learning pathway and post-test mastery updates.
+
+The graph is read from data (elearning/data/curriculum.json, or the file named
+by `curriculum_file` in site_config.json) and compiled once per process:
+topics get a bit position, direct and transitive prerequisites become int
+bitsets, and a topological order is computed (cycles are rejected). Unlock
+checks are then a single AND against the bitset of mastered topics, and after a
+mastery change only the topic and its dependents are re-evaluated.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, Iterable, List
+
+import frappe
+
+# Mastery weight thresholds (0-1000 scale)
+MASTERY_THRESHOLDS = {
+    "weak": 500,  # < 500: must re-learn from scratch
+    "partial": 750,  # 500-750: needs reinforcement
+    "strong": 1000,  # > 750: can skip or review briefly
+}
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+class CurriculumGraph:
+    def __init__(self, topics: List[dict]):
+        """`topics`: [{"id", "name", "description", "prerequisites": [ids]}] in display order"""
+        self.ids = [str(topic["id"]) for topic in topics]
+        self.names = {str(topic["id"]): topic.get("name") or str(topic["id"]) for topic in topics}
+        self.descriptions = {str(topic["id"]): topic.get("description") or "" for topic in topics}
+        self.index = {topic_id: i for i, topic_id in enumerate(self.ids)}
+        if len(self.index) != len(self.ids):
+            raise ValueError("Duplicate topic id in curriculum")
+
+        self.prerequisites = {str(topic["id"]): [str(p) for p in topic.get("prerequisites") or []] for topic in topics}
+        self.direct = [0] * len(self.ids)
+        self.dependents = [[] for _ in self.ids]
+        for topic_id, prerequisites in self.prerequisites.items():
+            i = self.index[topic_id]
+            for prerequisite in prerequisites:
+                if prerequisite not in self.index:
+                    raise ValueError(f"Topic {topic_id} requires unknown topic {prerequisite}")
+                self.direct[i] |= 1 << self.index[prerequisite]
+                self.dependents[self.index[prerequisite]].append(i)
+
+        self.order = self._topological_order()
+        self.position = {i: rank for rank, i in enumerate(self.order)}
+        self.ancestors = [0] * len(self.ids)
+        for i in self.order:
+            mask = self.direct[i]
+            for j in self._bits(self.direct[i]):
+                mask |= self.ancestors[j]
+            self.ancestors[i] = mask
+        self.descendants = [0] * len(self.ids)
+        for i in reversed(self.order):
+            for j in self.dependents[i]:
+                self.descendants[i] |= (1 << j) | self.descendants[j]
+
+    def _topological_order(self) -> List[int]:
+        remaining = [bin(mask).count("1") for mask in self.direct]
+        ready = deque(i for i, count in enumerate(remaining) if count == 0)
+        order = []
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+            for j in self.dependents[i]:
+                remaining[j] -= 1
+                if remaining[j] == 0:
+                    ready.append(j)
+        if len(order) != len(self.ids):
+            cyclic = [self.ids[i] for i, count in enumerate(remaining) if count > 0]
+            raise ValueError(f"Curriculum prerequisites contain a cycle through topics {cyclic}")
+        return order
+
+    @staticmethod
+    def _bits(mask: int) -> Iterable[int]:
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def __contains__(self, topic_id) -> bool:
+        return str(topic_id) in self.index
+
+    @property
+    def topological_order(self) -> List[str]:
+        return [self.ids[i] for i in self.order]
+
+    def mastered_mask(self, mastery: Dict[str, float], threshold: float) -> int:
+        """Bitset of topics whose mastery weight reaches `threshold`"""
+        mask = 0
+        for topic_id, weight in mastery.items():
+            i = self.index.get(str(topic_id))
+            if i is not None and (weight or 0) >= threshold:
+                mask |= 1 << i
+        return mask
+
+    def prerequisites_met(self, topic_id, mastered: int, transitive: bool = True) -> bool:
+        """All (transitive or direct) prerequisites of `topic_id` are in the `mastered` bitset"""
+        i = self.index[str(topic_id)]
+        required = self.ancestors[i] if transitive else self.direct[i]
+        return required & ~mastered == 0
+
+    def unlock_states(self, mastery: Dict[str, float], threshold: float, transitive: bool = True) -> Dict[str, bool]:
+        mastered = self.mastered_mask(mastery, threshold)
+        return {topic_id: self.prerequisites_met(topic_id, mastered, transitive) for topic_id in self.ids}
+
+    def affected_by(self, topic_id, transitive: bool = True) -> List[str]:
+        """
+        Topics whose unlock state can change when `topic_id`'s mastery changes:
+        the topic itself and its (transitive or direct) dependents, in topological order
+        """
+        i = self.index[str(topic_id)]
+        mask = (1 << i) | (self.descendants[i] if transitive else sum(1 << j for j in self.dependents[i]))
+        return [self.ids[j] for j in sorted(self._bits(mask), key=self.position.get)]
+
+    def update_unlock_states(
+        self,
+        unlocked: Dict[str, bool],
+        mastery: Dict[str, float],
+        changed_topic,
+        threshold: float,
+        transitive: bool = True,
+    ) -> List[str]:
+        """
+        Recompute `unlocked` in place after `changed_topic`'s mastery changed,
+        touching only the affected topics. Returns the topics whose state flipped.
+        """
+        mastered = self.mastered_mask(mastery, threshold)
+        flipped = []
+        for topic_id in self.affected_by(changed_topic, transitive):
+            state = self.prerequisites_met(topic_id, mastered, transitive)
+            if unlocked.get(topic_id) != state:
+                unlocked[topic_id] = state
+                flipped.append(topic_id)
+        return flipped
+
+
+def _curriculum_path() -> str:
+    return frappe.conf.get("curriculum_file") or os.path.join(
+        frappe.get_app_path("elearning"), "elearning", "data", "curriculum.json"
+    )
+
+
+def load_curriculum(path: str) -> CurriculumGraph:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return CurriculumGraph(data["topics"])
+
+
+def get_curriculum() -> CurriculumGraph:
+    """The compiled curriculum graph, rebuilt when its file changes"""
+    path = _curriculum_path()
+    key = (path, os.path.getmtime(path))
+    graph = _graphs.get(key)
+    if graph is None:
+        with _graphs_lock:
+            graph = _graphs.get(key)
+            if graph is None:
+                graph = load_curriculum(path)
+                _graphs.clear()
+                _graphs[key] = graph
+    return graph
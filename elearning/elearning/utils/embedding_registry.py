@@ -0,0 +1,115 @@
+"""
+Process-wide registry of sentence embedding models.
+
+Every agent shares one instance of each model per worker process instead of
+creating and warming up its own SentenceTransformersTextEmbedder.
+"""
+
+import threading
+from typing import Any, Dict, List, Tuple
+
+import frappe
+
+DEFAULT_EMBEDDING_MODEL = "bkai-foundation-models/vietnamese-bi-encoder"
+DEFAULT_BATCH_SIZE = 32
+
+_registry: Dict[Tuple[str, str, str], Any] = {}
+_registry_lock = threading.Lock()
+
+
+class EmbeddingModel:
+    """
+    Lazily loaded SentenceTransformer with thread-safe batched encoding.
+
+    Embeddings are not normalized, matching the Haystack text embedder the
+    stored indexes were built with.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    self._model = SentenceTransformer(self.model_name)
+                    frappe.logger().info(f"Loaded embedding model {self.model_name}")
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed_array(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE):
+        """Embed a list of texts in batches into a float32 (n, dim) array"""
+        model = self.model
+        with self._encode_lock:
+            vectors = model.encode(
+                list(texts),
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+            )
+        return vectors.astype("float32", copy=False)
+
+    def embed(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[float]]:
+        """Embed a list of texts in batches, preserving order"""
+        if not texts:
+            return []
+        return self.embed_array(texts, batch_size=batch_size).tolist()
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text"""
+        return self.embed([text])[0]
+
+
+def get_embedding_model(model_name: str = None):
+    """
+    Get the shared model for `model_name` (defaults to `embedding_model` in
+    site_config.json, then the Vietnamese bi-encoder). Loading is deferred
+    until the first embed call.
+
+    When `embedding_service_socket` is set, a client for the embedding service
+    process is returned instead, so the worker never loads the model itself.
+    `embedding_backend: "onnx"` selects the quantized ONNX Runtime model.
+    """
+    model_name = model_name or frappe.conf.get("embedding_model") or DEFAULT_EMBEDDING_MODEL
+    socket_path = frappe.conf.get("embedding_service_socket")
+    backend = frappe.conf.get("embedding_backend") or "torch"
+    key = (model_name, socket_path, backend)
+
+    model = _registry.get(key)
+    if model is None:
+        with _registry_lock:
+            model = _registry.get(key)
+            if model is None:
+                if socket_path:
+                    from elearning.elearning.utils.embedding_service import EmbeddingServiceClient
+
+                    model = EmbeddingServiceClient(socket_path, model_name)
+                else:
+                    model = create_embedding_model(model_name, backend, frappe.conf.get("embedding_onnx_dir"))
+                _registry[key] = model
+    return model
+
+
+def create_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = "torch", onnx_dir: str = None):
+    """Build an unshared model for `backend` ("torch" or "onnx")"""
+    if backend == "onnx":
+        from elearning.elearning.utils.onnx_embedding import OnnxEmbeddingModel
+
+        return OnnxEmbeddingModel(model_name, onnx_dir)
+    if backend != "torch":
+        frappe.throw(f"Unknown embedding backend: {backend}")
+    return EmbeddingModel(model_name)
+
+
+def embed(texts: List[str], model_name: str = None, batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[float]]:
+    """Shortcut for get_embedding_model(model_name).embed(texts)"""
+    return get_embedding_model(model_name).embed(texts, batch_size=batch_size)
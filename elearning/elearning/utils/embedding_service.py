@@ -0,0 +1,249 @@
+"""
+Local embedding service: one process owns the embedding model and serves query
+embeddings to the web workers over a Unix socket.
+
+Concurrent requests are collected into micro-batches (up to `max_batch` texts or
+`max_wait_ms` of waiting, whichever comes first) and run through the model in one
+forward pass. Web workers talk to it through EmbeddingServiceClient, which
+get_embedding_model() returns when `embedding_service_socket` is set in
+site_config.json, so they never import sentence-transformers.
+
+Run next to the web workers (e.g. as a Procfile / supervisor program):
+    python -m elearning.elearning.utils.embedding_service \
+        --socket /home/frappe/frappe-bench/sockets/embedding.sock --max-batch 64 --max-wait-ms 5
+
+Wire protocol: each message is a 4-byte big-endian length followed by a payload.
+Requests are one JSON frame {"model", "texts"}. Responses are a JSON frame
+{"shape": [n, dim]} followed by a frame of raw little-endian float32 values,
+or a single JSON frame {"error": "..."}.
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+from elearning.elearning.utils.embedding_registry import DEFAULT_EMBEDDING_MODEL, create_embedding_model
+
+HEADER = struct.Struct(">I")
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+CLIENT_TIMEOUT_SECONDS = 30
+
+
+def _send_frame(sock, payload: bytes):
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Embedding service connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock) -> bytes:
+    (size,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return _recv_exact(sock, size)
+
+
+class _PendingRequest:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.vectors = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Merges concurrent embed requests into batched forward passes on one thread"""
+
+    def __init__(self, model, max_batch: int = DEFAULT_MAX_BATCH, max_wait_ms: float = DEFAULT_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "texts": 0}
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        request = _PendingRequest(texts)
+        self.pending.put(request)
+        request.done.wait()
+        if request.error:
+            raise request.error
+        return request.vectors
+
+    def _collect(self) -> List[_PendingRequest]:
+        batch = [self.pending.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = self.model.embed_array(texts, batch_size=self.max_batch)
+                offset = 0
+                for request in batch:
+                    request.vectors = vectors[offset : offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["texts"] += len(texts)
+                for request in batch:
+                    request.done.set()
+
+
+class _ServiceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                if request.get("model") not in (None, batcher.model.model_name):
+                    raise ValueError(f"Service runs {batcher.model.model_name}, not {request.get('model')}")
+                texts = request.get("texts") or []
+                vectors = batcher.embed(texts) if texts else np.zeros((0, 0), dtype=np.float32)
+                _send_frame(self.request, json.dumps({"shape": list(vectors.shape)}).encode("utf-8"))
+                _send_frame(self.request, np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                _send_frame(self.request, json.dumps({"error": str(e)}).encode("utf-8"))
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path: str, batcher: MicroBatcher):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _ServiceHandler)
+        self.batcher = batcher
+
+
+class EmbeddingServiceClient:
+    """
+    Thin client with the same embed/embed_one interface as EmbeddingModel.
+    Each thread keeps its own connection and reconnects once on failure.
+    """
+
+    def __init__(self, socket_path: str, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CLIENT_TIMEOUT_SECONDS)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        sock = self._connection()
+        _send_frame(sock, json.dumps({"model": self.model_name, "texts": texts}, ensure_ascii=False).encode("utf-8"))
+        header = json.loads(_recv_frame(sock))
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        return np.frombuffer(_recv_frame(sock), dtype="<f4").reshape(header["shape"])
+
+    def embed_array(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        try:
+            return self._request(list(texts))
+        except (ConnectionError, OSError):
+            self._reset()
+            return self._request(list(texts))
+
+    def embed(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_array(texts).tolist()
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+
+def run_service(
+    socket_path: str,
+    model_name: str = DEFAULT_EMBEDDING_MODEL,
+    max_batch: int = DEFAULT_MAX_BATCH,
+    max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+    backend: str = "torch",
+    onnx_dir: str = None,
+):
+    model = create_embedding_model(model_name, backend, onnx_dir)
+    model.embed_array(["khởi động"])  # load and warm up before accepting connections
+
+    server = EmbeddingServer(socket_path, MicroBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms))
+    print(f"Embedding service for {model_name} listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        stats = server.batcher.stats
+        print(f"Served {stats['requests']} requests in {stats['batches']} batches ({stats['texts']} texts)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching embedding service on a Unix socket")
+    parser.add_argument("--socket", required=True, help="Path of the Unix socket (embedding_service_socket)")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="Texts per forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS, help="Time to wait for a batch to fill")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--onnx-dir", help="Exported ONNX model directory (backend onnx)")
+    args = parser.parse_args()
+    run_service(args.socket, args.model, args.max_batch, args.max_wait_ms, args.backend, args.onnx_dir)
+
+
+if __name__ == "__main__":
+    main()
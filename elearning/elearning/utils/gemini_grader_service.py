@@ -8,6 +8,18 @@ from datetime import datetime
 
 logger = frappe.logger("gemini_essay_grader")
 
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+
+def get_gemini_api_url(model, api_key, method="generateContent"):
+    """Build a Gemini REST endpoint URL.
+
+    Set `gemini_api_base_url` in site_config.json to point every caller at a
+    local stand-in server (see elearning/elearning/benchmarks/gemini_mock_server.py).
+    """
+    base_url = (frappe.conf.get("gemini_api_base_url") or GEMINI_API_BASE_URL).rstrip("/")
+    return f"{base_url}/models/{model}:{method}?key={api_key}"
+
 
 def save_token_usage(
     user_id, question_name, input_tokens, output_tokens, cost_estimate
@@ -323,7 +335,7 @@ def grade_essay_with_gemini(
     logger.debug(
         f"Gemini Payload Summary for Q {question_name_for_log}: {json.dumps(payload_summary_for_log, indent=2)}"
     )
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+    api_url = get_gemini_api_url("gemini-2.0-flash", GEMINI_API_KEY)
 
     default_error_response = {
         "total_score_awarded": 0,
@@ -464,7 +476,7 @@ def call_gemini_api_with_tracking(payload, operation_name, user_id=None, timeout
         logger.error(f"Gemini API key not found for operation {operation_name}")
         return {"success": False, "error": "API key not found", "response": None}
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
+    api_url = get_gemini_api_url("gemini-2.0-flash", GEMINI_API_KEY)
 
     try:
         logger.info(f"Making API request for operation: {operation_name}")
@@ -0,0 +1,255 @@
+"""
+Marginal maximum likelihood (EM) calibration of Placement Question parameters.
+
+Responses from Placement Answer Log are held as sparse (examinee x item)
+indicator matrices, where an examinee is one (session, topic) pair because
+every topic has its own ability. Each EM iteration:
+  E-step  posterior of every examinee over a fixed quadrature grid, computed as
+          sparse @ dense products (examinees x grid);
+  M-step  expected correct / total counts per item and grid point, then one
+          bounded L-BFGS-B fit of all items at once (the objective is separable,
+          so gradients are computed for every item in one NumPy pass).
+Weak priors on a, b and c (Bayes modal estimation) keep items with few or
+extreme responses finite.
+
+Dry run (default) returns a report without writing anything:
+    bench --site <site> execute elearning.elearning.utils.irt_calibration.calibrate_placement_questions
+Write the new parameters back:
+    bench --site <site> execute elearning.elearning.utils.irt_calibration.calibrate_placement_questions --kwargs "{'dry_run': False}"
+"""
+
+import time
+from typing import Any, Dict
+
+import frappe
+import numpy as np
+from scipy import sparse
+from scipy.optimize import minimize
+
+from elearning.elearning.utils.placement_item_bank import UPPER_ASYMPTOTE, invalidate_item_bank, load_item_bank
+
+QUADRATURE_GRID = np.linspace(-4.0, 4.0, 41)
+PARAMETER_BOUNDS = {"a": (0.2, 4.0), "b": (-4.0, 4.0), "c": (0.0, 0.4), "d": (0.6, 1.0)}
+# Priors: log a ~ N(0, 0.5), b ~ N(0, 2), c ~ Beta(5, 17), d ~ Beta(17, 1)
+LOG_A_PRIOR_SD = 0.5
+B_PRIOR_SD = 2.0
+C_PRIOR = (5.0, 17.0)
+D_PRIOR = (17.0, 1.0)
+MIN_RESPONSES = 50
+_EPSILON = 1e-9
+
+
+def _icc(params: np.ndarray, grid: np.ndarray):
+    """P(correct) (J, Q) and the logistic part L for (J, 4) parameters"""
+    a, b, c, d = (params[:, i, None] for i in range(4))
+    logistic = 1.0 / (1.0 + np.exp(-a * (grid - b)))
+    return np.clip(c + (d - c) * logistic, _EPSILON, 1.0 - _EPSILON), logistic
+
+
+def _m_step(params, free, correct_counts, total_counts, grid, columns):
+    """
+    Maximise the expected complete-data log likelihood plus log priors over the
+    `columns` (subset of 0..3 = a, b, c, d) of the `free` items
+    """
+    fixed = params[free]
+
+    def objective(x):
+        current = fixed.copy()
+        current[:, columns] = x.reshape(len(current), len(columns))
+        a, b, c, d = (current[:, i, None] for i in range(4))
+        p, logistic = _icc(current, grid)
+        r, n = correct_counts, total_counts
+
+        value = (r * np.log(p) + (n - r) * np.log1p(-p)).sum()
+        dvalue_dp = (r - n * p) / (p * (1.0 - p))
+        slope = (d - c) * logistic * (1.0 - logistic)
+        gradients = {
+            0: (dvalue_dp * slope * (grid - b)).sum(axis=1),
+            1: (dvalue_dp * -slope * a).sum(axis=1),
+            2: (dvalue_dp * (1.0 - logistic)).sum(axis=1),
+            3: (dvalue_dp * logistic).sum(axis=1),
+        }
+
+        a, b, c, d = current[:, 0], current[:, 1], current[:, 2], current[:, 3]
+        value += (-0.5 * (np.log(a) / LOG_A_PRIOR_SD) ** 2 - np.log(a)).sum()
+        gradients[0] = gradients[0] + (-np.log(a) / LOG_A_PRIOR_SD**2 - 1.0) / a
+        value += (-0.5 * (b / B_PRIOR_SD) ** 2).sum()
+        gradients[1] = gradients[1] - b / B_PRIOR_SD**2
+        if 2 in columns:
+            c = np.clip(c, _EPSILON, 1.0 - _EPSILON)
+            value += ((C_PRIOR[0] - 1) * np.log(c) + (C_PRIOR[1] - 1) * np.log1p(-c)).sum()
+            gradients[2] = gradients[2] + (C_PRIOR[0] - 1) / c - (C_PRIOR[1] - 1) / (1.0 - c)
+        if 3 in columns:
+            d = np.clip(d, _EPSILON, 1.0 - _EPSILON)
+            value += ((D_PRIOR[0] - 1) * np.log(d) + (D_PRIOR[1] - 1) * np.log1p(-d)).sum()
+            gradients[3] = gradients[3] + (D_PRIOR[0] - 1) / d - (D_PRIOR[1] - 1) / (1.0 - d)
+
+        gradient = np.column_stack([gradients[col] for col in columns])
+        return -value, -gradient.ravel()
+
+    column_bounds = [PARAMETER_BOUNDS["abcd"[col]] for col in columns]
+    start = np.clip(fixed[:, columns], [low for low, _ in column_bounds], [high for _, high in column_bounds])
+    result = minimize(
+        objective, start.ravel(), jac=True, method="L-BFGS-B", bounds=column_bounds * len(fixed), options={"maxiter": 50}
+    )
+    fixed[:, columns] = result.x.reshape(len(fixed), len(columns))
+    params[free] = fixed
+
+
+def calibrate(
+    examinee_index: np.ndarray,
+    item_index: np.ndarray,
+    correct: np.ndarray,
+    initial_params: np.ndarray,
+    model: str = "3pl",
+    max_iter: int = 100,
+    tol: float = 1e-3,
+    min_responses: int = MIN_RESPONSES,
+    grid: np.ndarray = QUADRATURE_GRID,
+) -> Dict[str, Any]:
+    """
+    Fit item parameters from sparse responses (one row per answer).
+
+    `initial_params` is (items, 4) of a, b, c, d; items with fewer than
+    `min_responses` answers keep them. "2pl" fits a, b; "3pl" also c;
+    "4pl" also d. Returns params, per-item response counts, the marginal
+    log-likelihood trace and the number of iterations.
+    """
+    n_examinees = int(examinee_index.max()) + 1 if len(examinee_index) else 0
+    n_items = len(initial_params)
+    correct = np.asarray(correct, dtype=np.float64)
+    answered = sparse.csr_matrix((np.ones_like(correct), (examinee_index, item_index)), shape=(n_examinees, n_items))
+    right = sparse.csr_matrix((correct, (examinee_index, item_index)), shape=(n_examinees, n_items))
+    wrong = answered - right
+    answered_t, right_t = answered.T.tocsr(), right.T.tocsr()
+
+    response_counts = np.asarray(answered.sum(axis=0)).ravel()
+    free = response_counts >= min_responses
+    columns = {"2pl": [0, 1], "3pl": [0, 1, 2], "4pl": [0, 1, 2, 3]}[model]
+
+    params = np.asarray(initial_params, dtype=np.float64).copy()
+    log_prior = -0.5 * grid**2
+    log_prior -= np.log(np.exp(log_prior).sum())
+    trace = []
+
+    for iteration in range(1, max_iter + 1):
+        p, _ = _icc(params, grid)
+        log_likelihood = right @ np.log(p) + wrong @ np.log1p(-p) + log_prior
+        peak = log_likelihood.max(axis=1, keepdims=True)
+        posterior = np.exp(log_likelihood - peak)
+        total = posterior.sum(axis=1, keepdims=True)
+        posterior /= total
+        trace.append(float((peak + np.log(total)).sum()))
+
+        if not free.any():
+            break
+        previous = params.copy()
+        _m_step(params, free, (right_t @ posterior)[free], (answered_t @ posterior)[free], grid, columns)
+
+        if np.abs(params - previous).max() < tol:
+            break
+
+    return {"params": params, "response_counts": response_counts, "loglik_trace": trace, "iterations": iteration}
+
+
+def load_calibration_data():
+    """
+    Item names, their current (items, 4) parameters, and examinee index, item
+    index and correctness arrays with one entry per logged answer of a bank item
+    """
+    bank = load_item_bank()
+    names = list(bank.topic_of)
+    item_position = {name: i for i, name in enumerate(names)}
+    initial_params = np.vstack([bank.params(name) for name in names]) if names else np.zeros((0, 4))
+
+    logs = frappe.db.sql(
+        """
+        SELECT placement_test_session, placement_question, is_correct
+        FROM `tabPlacement Answer Log`
+        WHERE is_correct IS NOT NULL
+        """
+    )
+
+    examinees = {}
+    examinee_index, item_index, correct = [], [], []
+    for session, question, is_correct in logs:
+        position = item_position.get(question)
+        if position is None:
+            continue
+        key = (session, bank.topic_of[question])
+        examinee_index.append(examinees.setdefault(key, len(examinees)))
+        item_index.append(position)
+        correct.append(1.0 if is_correct else 0.0)
+
+    return names, initial_params, np.asarray(examinee_index, dtype=np.int64), np.asarray(item_index, dtype=np.int64), np.asarray(correct)
+
+
+def calibrate_placement_questions(
+    dry_run: bool = True, model: str = "3pl", max_iter: int = 100, min_responses: int = MIN_RESPONSES
+) -> Dict[str, Any]:
+    """
+    Calibrate every Placement Question from the answer logs and return a report
+    of old vs new parameters. With dry_run=False the new parameters of items with
+    at least `min_responses` answers are written back.
+    """
+    started = time.perf_counter()
+    names, initial_params, examinee_index, item_index, correct = load_calibration_data()
+    if not len(correct):
+        return {"status": "skipped", "message": "No answer logs to calibrate from"}
+
+    result = calibrate(
+        examinee_index, item_index, correct, initial_params, model=model, max_iter=max_iter, min_responses=min_responses
+    )
+    params, counts = result["params"], result["response_counts"]
+    proportion_correct = np.bincount(item_index, weights=correct, minlength=len(names)) / np.maximum(counts, 1)
+
+    items = []
+    for i, name in enumerate(names):
+        if counts[i] < min_responses:
+            continue
+        old, new = initial_params[i], params[i]
+        items.append(
+            {
+                "question": name,
+                "responses": int(counts[i]),
+                "proportion_correct": round(float(proportion_correct[i]), 3),
+                "old": {"discrimination": round(float(old[0]), 3), "difficulty": round(float(old[1]), 3), "guessing_probability": round(float(old[2]), 3)},
+                "new": {"discrimination": round(float(new[0]), 3), "difficulty": round(float(new[1]), 3), "guessing_probability": round(float(new[2]), 3)},
+            }
+        )
+
+    changed = counts >= min_responses
+    report = {
+        "status": "dry_run" if dry_run else "updated",
+        "model": model,
+        "responses": int(len(correct)),
+        "examinees": int(examinee_index.max()) + 1,
+        "items": len(names),
+        "items_calibrated": int(changed.sum()),
+        "items_skipped_few_responses": int((~changed).sum()),
+        "iterations": result["iterations"],
+        "loglik_first": round(result["loglik_trace"][0], 2),
+        "loglik_last": round(result["loglik_trace"][-1], 2),
+        "mean_abs_change": {
+            "discrimination": round(float(np.abs(params[changed, 0] - initial_params[changed, 0]).mean()), 4) if changed.any() else 0.0,
+            "difficulty": round(float(np.abs(params[changed, 1] - initial_params[changed, 1]).mean()), 4) if changed.any() else 0.0,
+            "guessing_probability": round(float(np.abs(params[changed, 2] - initial_params[changed, 2]).mean()), 4) if changed.any() else 0.0,
+        },
+        "seconds": None,
+        "item_changes": sorted(items, key=lambda item: -abs(item["new"]["difficulty"] - item["old"]["difficulty"])),
+    }
+    if model == "4pl" and not np.allclose(params[changed, 3], UPPER_ASYMPTOTE):
+        report["note"] = "Placement Question has no upper-asymptote field; fitted d values are not stored"
+
+    if not dry_run:
+        for item in items:
+            frappe.db.set_value("Placement Question", item["question"], item["new"])
+        invalidate_item_bank()
+        frappe.db.commit()
+
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    frappe.logger().info(
+        f"Placement calibration ({report['status']}): {report['items_calibrated']} items from "
+        f"{report['responses']} responses in {report['seconds']}s"
+    )
+    return report
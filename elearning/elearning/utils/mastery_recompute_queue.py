@@ -0,0 +1,117 @@
+"""
+Coalescing queue for Student Topic Mastery recomputation.
+
+Doc events (Flashcard Session, Student Knowledge Profile, Knowledge Gap) only
+mark a (student, topic) pair dirty in a Redis hash once their transaction
+commits; the request does no mastery math and no extra commit. One field is
+kept per pair and kind of change ("session", "profile", "gap"), so repeated
+events overwrite each other instead of piling up.
+
+flush_dirty_mastery runs every minute from the scheduler and recomputes each
+pair whose latest mark is older than the debounce window exactly once, with
+all its pending changes applied together. A pair whose recompute fails is put
+back and retried on a later run, up to MAX_ATTEMPTS times.
+"""
+
+import pickle
+import time
+from typing import Dict, Tuple
+
+import frappe
+
+DIRTY_CACHE_KEY = "student_mastery_dirty"
+DEBOUNCE_SECONDS = 30
+MAX_ATTEMPTS = 5
+_SEPARATOR = "::"
+
+
+def mark_mastery_dirty(student, topic, kind: str, value=1):
+    """
+    Queue a recompute of (student, topic) after the current transaction commits.
+    `kind` is "session" (value: time spent), "profile" (value: profile name) or "gap".
+    """
+    if not student or not topic:
+        return
+    field = _SEPARATOR.join((student, str(topic), kind))
+
+    def mark():
+        frappe.cache().hset(DIRTY_CACHE_KEY, field, {"value": value, "marked_at": time.time()})
+
+    frappe.db.after_commit.add(mark)
+
+
+def _claim(field: str):
+    """Read and delete one dirty field atomically, so a mark arriving meanwhile is not lost"""
+    cache = frappe.cache()
+    key = cache.make_key(DIRTY_CACHE_KEY)
+    pipe = cache.pipeline()
+    pipe.hget(key, field)
+    pipe.hdel(key, field)
+    value, _ = pipe.execute()
+    return pickle.loads(value) if value else None
+
+
+def _requeue(student, topic, entries: Dict[str, dict]):
+    """
+    Put claimed entries of a failed recompute back, unless a newer mark of the same
+    kind arrived meanwhile; they become due again after the debounce window
+    """
+    cache = frappe.cache()
+    key = cache.make_key(DIRTY_CACHE_KEY)
+    for kind, entry in entries.items():
+        attempts = entry.get("attempts", 0) + 1
+        if attempts >= MAX_ATTEMPTS:
+            frappe.log_error(
+                f"Dropped {kind} change of {student} / {topic} after {attempts} failed recomputes",
+                "Mastery Recompute Failed",
+            )
+            continue
+        field = _SEPARATOR.join((student, str(topic), kind))
+        cache.hsetnx(key, field, pickle.dumps(dict(entry, marked_at=time.time(), attempts=attempts)))
+
+
+def _due_changes(debounce_seconds: float) -> Dict[Tuple[str, str], Dict[str, dict]]:
+    """Claim the entries of every pair whose latest mark is older than the debounce window"""
+    entries = {
+        # Redis returns field names as bytes
+        field.decode() if isinstance(field, bytes) else field: entry
+        for field, entry in (frappe.cache().hgetall(DIRTY_CACHE_KEY) or {}).items()
+    }
+    latest = {}
+    for field, entry in entries.items():
+        student, topic, _ = field.split(_SEPARATOR)
+        latest[(student, topic)] = max(latest.get((student, topic), 0), entry["marked_at"])
+
+    now = time.time()
+    changes = {}
+    for field in entries:
+        student, topic, kind = field.split(_SEPARATOR)
+        if now - latest[(student, topic)] < debounce_seconds:
+            continue
+        entry = _claim(field)
+        if entry:
+            changes.setdefault((student, topic), {})[kind] = entry
+    return changes
+
+
+def flush_dirty_mastery(debounce_seconds: float = DEBOUNCE_SECONDS) -> int:
+    """Scheduler job: recompute every settled dirty pair once; returns the number of pairs"""
+    from elearning.elearning.doctype.student_topic_mastery.student_topic_mastery import (
+        recompute_student_topic,
+    )
+
+    changes = _due_changes(debounce_seconds)
+    for (student, topic), entries in changes.items():
+        try:
+            recompute_student_topic(
+                student, topic, {kind: entry["value"] for kind, entry in entries.items()}
+            )
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), "Mastery Recompute Failed")
+            _requeue(student, topic, entries)
+
+    if changes:
+        frappe.logger().info(f"Recomputed mastery for {len(changes)} student-topic pairs")
+    return len(changes)
@@ -0,0 +1,234 @@
+"""
+ONNX Runtime CPU backend for the sentence embedding model.
+
+export_onnx_model() converts the SentenceTransformer's transformer to ONNX and
+applies int8 dynamic quantization; OnnxEmbeddingModel serves the result with the
+same embed/embed_one interface as EmbeddingModel. Select it in site_config.json:
+
+    "embedding_backend": "onnx",
+    "embedding_onnx_dir": "<optional, defaults to agents/data/onnx/<model>>"
+
+Export once per model (needs torch, sentence-transformers and onnxruntime):
+    bench --site <site> execute elearning.elearning.utils.onnx_embedding.export_onnx_model
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List
+
+import frappe
+import numpy as np
+
+from elearning.elearning.utils.embedding_registry import DEFAULT_BATCH_SIZE, DEFAULT_EMBEDDING_MODEL
+
+CONFIG_FILE = "embedding_config.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+SUPPORTED_POOLING_MODES = ("cls", "max", "mean")
+
+
+def get_default_onnx_dir(model_name: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    return os.path.join(
+        frappe.get_app_path("elearning"), "elearning", "agents", "data", "onnx", model_name.replace("/", "__")
+    )
+
+
+def export_onnx_model(model_name: str = None, output_dir: str = None, quantize: bool = True, opset: int = 17) -> Dict[str, Any]:
+    """
+    Export `model_name` to ONNX in `output_dir` (tokenizer, fp32 model, int8 model and
+    the pooling config needed to reproduce SentenceTransformer.encode)
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model_name = model_name or DEFAULT_EMBEDDING_MODEL
+    output_dir = output_dir or get_default_onnx_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+
+    pooling = next((module for module in st_model if isinstance(module, Pooling)), None)
+    # sentence-transformers >= 6 exposes `pooling_mode`, older releases get_pooling_mode_str()
+    pooling_mode = getattr(pooling, "pooling_mode", None) or (pooling.get_pooling_mode_str() if pooling else "mean")
+    if pooling_mode not in SUPPORTED_POOLING_MODES:
+        frappe.throw(
+            f"Pooling mode {pooling_mode!r} of {model_name} is not supported by the ONNX backend "
+            f"(supported: {', '.join(SUPPORTED_POOLING_MODES)})"
+        )
+
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(output_dir)
+
+    # PhoBERT/RoBERTa tokenizers do not produce token_type_ids
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in tokenizer.model_input_names]
+    dummy = tokenizer(["xin chào các bạn"], return_tensors="pt")
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if token_type_ids is not None:
+                inputs["token_type_ids"] = token_type_ids
+            return self.auto_model(**inputs).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer.auto_model).eval(),
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    onnx_file = FP32_FILE
+    if quantize:
+        quantize_dynamic(fp32_path, os.path.join(output_dir, INT8_FILE), weight_type=QuantType.QInt8)
+        onnx_file = INT8_FILE
+
+    config = {
+        "model_name": model_name,
+        "onnx_file": onnx_file,
+        "input_names": input_names,
+        "max_seq_length": st_model.max_seq_length,
+        "pooling": pooling_mode,
+        "normalize": any(isinstance(module, Normalize) for module in st_model),
+        "dimension": st_model.get_sentence_embedding_dimension(),
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    frappe.logger().info(f"Exported {model_name} to ONNX ({onnx_file}) in {output_dir}")
+    return config
+
+
+class OnnxEmbeddingModel:
+    """Lazily loaded ONNX Runtime session with SentenceTransformer-compatible pooling"""
+
+    def __init__(self, model_name: str, model_dir: str = None, onnx_file: str = None):
+        self.model_name = model_name
+        self.model_dir = model_dir or get_default_onnx_dir(model_name)
+        self._onnx_file = onnx_file
+        self._session = None
+        self._tokenizer = None
+        self._config = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        if self._session is not None:
+            return
+        with self._load_lock:
+            if self._session is not None:
+                return
+
+            import onnxruntime
+            from transformers import AutoTokenizer
+
+            with open(os.path.join(self.model_dir, CONFIG_FILE), "r", encoding="utf-8") as f:
+                config = json.load(f)
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = onnxruntime.InferenceSession(
+                os.path.join(self.model_dir, self._onnx_file or config["onnx_file"]),
+                sess_options=options,
+                providers=["CPUExecutionProvider"],
+            )
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            self._config = config
+            self._session = session
+            frappe.logger().info(f"Loaded ONNX embedding model {self.model_name} from {self.model_dir}")
+
+    @property
+    def dimension(self) -> int:
+        self._load()
+        return self._config["dimension"]
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        mode = self._config["pooling"]
+        if mode == "cls":
+            pooled = hidden[:, 0]
+        elif mode == "max":
+            pooled = np.where(attention_mask[..., None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self._config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def embed_array(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        """Embed texts in length-sorted batches (less padding), returned in input order"""
+        self._load()
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self._config["dimension"]), dtype=np.float32)
+
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        output = np.empty((len(texts), self._config["dimension"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start : start + batch_size]
+            encoded = self._tokenizer(
+                [texts[i] for i in rows],
+                padding=True,
+                truncation=True,
+                max_length=self._config["max_seq_length"],
+                return_tensors="np",
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self._config["input_names"]}
+            hidden = self._session.run(["last_hidden_state"], feed)[0]
+            output[rows] = self._pool(hidden, encoded["attention_mask"])
+        return output
+
+    def embed(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_array(texts, batch_size=batch_size).tolist()
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0]
+
+
+def compare_embedding_backends(reference, candidate, corpus: List[str], queries: List[str], top_k: int = 5) -> Dict[str, float]:
+    """
+    Parity between two embedding backends: cosine similarity of their embeddings of
+    the same texts, and agreement of dot-product retrieval of `queries` over `corpus`
+    """
+    ref_corpus, cand_corpus = reference.embed_array(corpus), candidate.embed_array(corpus)
+    ref_queries, cand_queries = reference.embed_array(queries), candidate.embed_array(queries)
+
+    def cosine(a, b):
+        return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+    cosines = np.concatenate([cosine(ref_corpus, cand_corpus), cosine(ref_queries, cand_queries)])
+    ref_ranking = np.argsort(-(ref_queries @ ref_corpus.T), axis=1)
+    cand_ranking = np.argsort(-(cand_queries @ cand_corpus.T), axis=1)
+
+    k = min(top_k, len(corpus))
+    overlap = [len(set(r[:k]) & set(c[:k])) / k for r, c in zip(ref_ranking, cand_ranking)]
+    return {
+        "mean_cosine": float(cosines.mean()),
+        "min_cosine": float(cosines.min()),
+        "top1_agreement": float((ref_ranking[:, 0] == cand_ranking[:, 0]).mean()),
+        f"top{k}_overlap": float(np.mean(overlap)),
+    }
+
+
+def load_parity_texts():
+    """Learning Object contents (corpus) and titles (queries) shipped with the app"""
+    path = os.path.join(frappe.get_app_path("elearning"), "elearning", "agents", "data", "learning_objects_index.json")
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [item["content"] for item in items], [item["title"] for item in items]
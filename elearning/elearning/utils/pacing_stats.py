@@ -0,0 +1,157 @@
+"""
+Running Flashcard Session time statistics per topic (Topic Pacing Stats).
+
+When a session ends, its time is folded into the topic's row with Welford's
+update (count, mean, M2), so the pacing component reads one row instead of
+averaging every session of the topic. A second, exponentially decayed set
+(weight, mean, M2) discounts older sessions with a half-life in days, so
+recent cohorts count more; `pacing_use_decayed_mean` in site_config.json makes
+the pacing component use it. Editing an ended session's time or topic removes
+the old value and adds the new one; the decayed set cannot drop the old value
+exactly and keeps it (a rebuild clears it).
+
+Rebuild from scratch (also run by the migration patch):
+    bench --site <site> execute elearning.elearning.utils.pacing_stats.rebuild_pacing_stats
+"""
+
+import math
+from typing import Optional
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+HALF_LIFE_DAYS = 30.0
+
+
+def _decay_factor(last_session_on, session_on, half_life_days: float = HALF_LIFE_DAYS) -> float:
+    if not last_session_on:
+        return 1.0
+    elapsed_days = (get_datetime(session_on) - get_datetime(last_session_on)).total_seconds() / 86400.0
+    return 0.5 ** (max(0.0, elapsed_days) / half_life_days)
+
+
+def welford_add(stats: dict, seconds: float, session_on, half_life_days: float = HALF_LIFE_DAYS) -> dict:
+    """Fold one session time into `stats` (a Topic Pacing Stats row as a dict) and return it"""
+    count = (stats.get("session_count") or 0) + 1
+    mean = stats.get("mean_seconds") or 0.0
+    delta = seconds - mean
+    mean += delta / count
+    stats["m2"] = (stats.get("m2") or 0.0) + delta * (seconds - mean)
+    stats["session_count"], stats["mean_seconds"] = count, mean
+
+    # Weighted (West) update after decaying the previous weight to this session's time
+    factor = _decay_factor(stats.get("last_session_on"), session_on, half_life_days)
+    weight = (stats.get("decayed_weight") or 0.0) * factor + 1.0
+    decayed_mean = stats.get("decayed_mean_seconds") or 0.0
+    delta = seconds - decayed_mean
+    decayed_mean += delta / weight
+    stats["decayed_m2"] = (stats.get("decayed_m2") or 0.0) * factor + delta * (seconds - decayed_mean)
+    stats["decayed_weight"], stats["decayed_mean_seconds"] = weight, decayed_mean
+    if not stats.get("last_session_on") or get_datetime(session_on) > get_datetime(stats["last_session_on"]):
+        stats["last_session_on"] = session_on
+    return stats
+
+
+def welford_remove(stats: dict, seconds: float) -> dict:
+    """
+    Remove one session time from the exact statistics. The decayed set cannot be
+    un-decayed exactly and is left unchanged.
+    """
+    count = (stats.get("session_count") or 0) - 1
+    if count <= 0:
+        stats.update(session_count=0, mean_seconds=0.0, m2=0.0)
+        return stats
+    mean = stats.get("mean_seconds") or 0.0
+    mean_without = (mean * (count + 1) - seconds) / count
+    stats["m2"] = max(0.0, (stats.get("m2") or 0.0) - (seconds - mean_without) * (seconds - mean))
+    stats["session_count"], stats["mean_seconds"] = count, mean_without
+    return stats
+
+
+_FIELDS = ["session_count", "mean_seconds", "m2", "decayed_weight", "decayed_mean_seconds", "decayed_m2", "last_session_on"]
+
+
+def _locked_stats(topic) -> dict:
+    """The topic's stats row, created if missing and locked for this transaction"""
+    now = now_datetime()
+    frappe.db.sql(
+        """
+        INSERT IGNORE INTO `tabTopic Pacing Stats`
+        (name, topic, session_count, mean_seconds, m2, decayed_weight, decayed_mean_seconds, decayed_m2,
+         docstatus, creation, modified, owner, modified_by)
+        VALUES (%s, %s, 0, 0, 0, 0, 0, 0, 0, %s, %s, %s, %s)
+        """,
+        (topic, topic, now, now, frappe.session.user, frappe.session.user),
+    )
+    return frappe.db.sql(
+        f"SELECT {', '.join(_FIELDS)} FROM `tabTopic Pacing Stats` WHERE name = %s FOR UPDATE",
+        (topic,),
+        as_dict=True,
+    )[0]
+
+
+def _save_stats(topic, stats: dict):
+    frappe.db.set_value("Topic Pacing Stats", topic, {field: stats.get(field) for field in _FIELDS})
+
+
+def record_session_time(topic, seconds, session_on=None):
+    """Add an ended session's time to its topic's statistics (sessions without time are ignored)"""
+    if not topic or not seconds or seconds <= 0:
+        return
+    topic = str(topic)
+    stats = welford_add(_locked_stats(topic), float(seconds), session_on or now_datetime())
+    _save_stats(topic, stats)
+
+
+def remove_session_time(topic, seconds):
+    if not topic or not seconds or seconds <= 0:
+        return
+    topic = str(topic)
+    if not frappe.db.exists("Topic Pacing Stats", topic):
+        return
+    _save_stats(topic, welford_remove(_locked_stats(topic), float(seconds)))
+
+
+def get_topic_mean_time(topic, decayed: Optional[bool] = None) -> Optional[float]:
+    """Mean session time of a topic (None when no session has ended yet)"""
+    if decayed is None:
+        decayed = bool(frappe.conf.get("pacing_use_decayed_mean"))
+    row = frappe.db.get_value(
+        "Topic Pacing Stats",
+        str(topic),
+        ["session_count", "mean_seconds", "decayed_mean_seconds"],
+        as_dict=True,
+    )
+    if not row or not row.session_count:
+        return None
+    return row.decayed_mean_seconds if decayed else row.mean_seconds
+
+
+def get_topic_time_stddev(topic) -> Optional[float]:
+    row = frappe.db.get_value("Topic Pacing Stats", str(topic), ["session_count", "m2"], as_dict=True)
+    if not row or (row.session_count or 0) < 2:
+        return None
+    return math.sqrt(row.m2 / (row.session_count - 1))
+
+
+def rebuild_pacing_stats():
+    """Recompute every topic's statistics from the ended Flashcard Sessions, in end-time order"""
+    sessions = frappe.db.sql(
+        """
+        SELECT topic, time_spent_seconds, end_time
+        FROM `tabFlashcard Session`
+        WHERE end_time IS NOT NULL AND time_spent_seconds > 0 AND topic IS NOT NULL
+        ORDER BY end_time ASC
+        """,
+        as_dict=True,
+    )
+    stats = {}
+    for session in sessions:
+        welford_add(stats.setdefault(str(session.topic), {}), float(session.time_spent_seconds), session.end_time)
+
+    frappe.db.delete("Topic Pacing Stats")
+    for topic, topic_stats in stats.items():
+        _locked_stats(topic)
+        _save_stats(topic, topic_stats)
+    frappe.db.commit()
+    frappe.logger().info(f"Rebuilt pacing statistics for {len(stats)} topics from {len(sessions)} sessions")
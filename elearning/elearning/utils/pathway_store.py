@@ -0,0 +1,263 @@
+"""
+Per-topic storage of the Student Pathway Snapshot.
+
+Each chapter of a snapshot is one Student Pathway Topic row (mastery weight,
+unlock state and a version counter), so a test submission updates only the row
+of its topic. Mastery changes use optimistic concurrency: the row is written
+only if its version is still the one that was read, otherwise it is re-read
+and the change re-applied, so concurrent submissions never overwrite each
+other.
+
+Readers get the assembled pathway ("JSON view") from a Redis hash keyed by
+Student Knowledge Profile; every write invalidates it. Snapshots created before
+the rows existed fall back to their legacy `pathway_json` (see
+elearning.patches.migrate_pathway_snapshot_rows).
+"""
+
+import json
+from typing import Callable, Dict, List, Optional
+
+import frappe
+
+from elearning.elearning.utils.constellation_cache import invalidate_constellation_for_profile
+from elearning.elearning.utils.curriculum import MASTERY_THRESHOLDS, get_curriculum
+
+VIEW_CACHE_KEY = "student_pathway_view"
+MAX_UPDATE_ATTEMPTS = 5
+
+
+def _latest_snapshot(profile_name: str) -> Optional[dict]:
+    result = frappe.db.sql(
+        """
+        SELECT name, session_id, overall_level, pathway_json, modified
+        FROM `tabStudent Pathway Snapshot`
+        WHERE student = %s
+        ORDER BY modified DESC
+        LIMIT 1
+        """,
+        (profile_name,),
+        as_dict=True,
+    )
+    return result[0] if result else None
+
+
+def _load_rows(snapshot_name: str) -> List[dict]:
+    return frappe.db.sql(
+        """
+        SELECT topic, topic_name, mastery_weight, is_unlocked, status
+        FROM `tabStudent Pathway Topic`
+        WHERE snapshot = %s
+        ORDER BY position ASC
+        """,
+        (snapshot_name,),
+        as_dict=True,
+    )
+
+
+def parse_legacy_pathway(pathway_json) -> List[dict]:
+    try:
+        data = json.loads(pathway_json) if isinstance(pathway_json, str) else pathway_json
+    except Exception:
+        return []
+    if isinstance(data, dict):
+        data = data.get("pathway", [])
+    return data if isinstance(data, list) else []
+
+
+def replace_pathway_rows(snapshot_name: str, pathway: List[dict]):
+    """Replace the topic rows of a snapshot with the chapters of `pathway`"""
+    frappe.db.delete("Student Pathway Topic", {"snapshot": snapshot_name})
+    if not pathway:
+        return
+    now = frappe.utils.now()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Student Pathway Topic",
+        fields=[
+            "name",
+            "creation",
+            "modified",
+            "owner",
+            "modified_by",
+            "docstatus",
+            "snapshot",
+            "topic",
+            "topic_name",
+            "position",
+            "mastery_weight",
+            "is_unlocked",
+            "status",
+            "version",
+        ],
+        values=[
+            (
+                frappe.generate_hash(length=10),
+                now,
+                now,
+                user,
+                user,
+                0,
+                snapshot_name,
+                str(chapter.get("id")),
+                chapter.get("name"),
+                position,
+                int(chapter.get("mastery_weight") or 0),
+                1 if chapter.get("is_unlocked") else 0,
+                "unlocked" if chapter.get("is_unlocked") else "locked",
+                0,
+            )
+            for position, chapter in enumerate(pathway)
+        ],
+    )
+
+
+def get_pathway_view(profile_name: str) -> Optional[dict]:
+    """
+    The latest pathway of a Student Knowledge Profile:
+    {"snapshot", "session_id", "overall_level", "modified", "pathway": [chapters]}
+    """
+    view = frappe.cache().hget(VIEW_CACHE_KEY, profile_name)
+    if view is not None:
+        return view or None
+
+    snapshot = _latest_snapshot(profile_name)
+    if not snapshot:
+        frappe.cache().hset(VIEW_CACHE_KEY, profile_name, {})
+        return None
+
+    rows = _load_rows(snapshot.name)
+    if rows:
+        pathway = [
+            {
+                "id": str(row.topic),
+                "name": row.topic_name,
+                "mastery_weight": row.mastery_weight or 0,
+                "is_unlocked": bool(row.is_unlocked),
+                "status": row.status or ("unlocked" if row.is_unlocked else "locked"),
+            }
+            for row in rows
+        ]
+    else:
+        pathway = parse_legacy_pathway(snapshot.pathway_json)
+
+    view = {
+        "snapshot": snapshot.name,
+        "session_id": snapshot.session_id,
+        "overall_level": snapshot.overall_level,
+        "modified": snapshot.modified,
+        "pathway": pathway,
+    }
+    frappe.cache().hset(VIEW_CACHE_KEY, profile_name, view)
+    return view
+
+
+def invalidate_pathway_view(profile_name: str):
+    """Drop the profile's view now and again after commit (so a concurrent read cannot cache uncommitted rows' old state)"""
+
+    def drop():
+        frappe.cache().hdel(VIEW_CACHE_KEY, profile_name)
+
+    drop()
+    frappe.db.after_commit.add(drop)
+    invalidate_constellation_for_profile(profile_name)
+
+
+def _affected_rows() -> int:
+    """Rows changed by the previous statement on this connection"""
+    return frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+
+
+def update_topic_mastery(
+    profile_name: str, topic, compute_mastery: Callable[[int], int]
+) -> Optional[Dict[str, int]]:
+    """
+    Apply `compute_mastery(old_mastery) -> new_mastery` to one topic of the
+    profile's latest snapshot, then unlock the chapters that became reachable.
+
+    The row is written with `WHERE version = <read version>`; if another
+    submission changed it in between, it is re-read (a locking read, so the
+    latest committed version is seen) and the change re-applied. Returns
+    {"old": .., "new": ..} or None when the profile has no row for the topic.
+    """
+    snapshot = _latest_snapshot(profile_name)
+    if not snapshot:
+        return None
+    if not frappe.db.exists("Student Pathway Topic", {"snapshot": snapshot.name}):
+        # Snapshot from before per-topic rows: materialise it once
+        replace_pathway_rows(snapshot.name, parse_legacy_pathway(snapshot.pathway_json))
+
+    topic = str(topic)
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        row = frappe.db.sql(
+            f"""
+            SELECT name, mastery_weight, version
+            FROM `tabStudent Pathway Topic`
+            WHERE snapshot = %s AND topic = %s
+            {"FOR UPDATE" if attempt else ""}
+            """,
+            (snapshot.name, topic),
+            as_dict=True,
+        )
+        if not row:
+            return None
+        row = row[0]
+        old_mastery = row.mastery_weight or 0
+        new_mastery = int(compute_mastery(old_mastery))
+        if new_mastery == old_mastery:
+            return {"old": old_mastery, "new": new_mastery}
+
+        frappe.db.sql(
+            """
+            UPDATE `tabStudent Pathway Topic`
+            SET mastery_weight = %s, version = version + 1, modified = %s
+            WHERE name = %s AND version = %s
+            """,
+            (new_mastery, frappe.utils.now(), row.name, row.version),
+        )
+        if _affected_rows():
+            break
+    else:
+        frappe.log_error(
+            f"Gave up updating pathway topic {topic} of {profile_name} after {MAX_UPDATE_ATTEMPTS} conflicts",
+            "Pathway Topic Update Conflict",
+        )
+        return None
+
+    _unlock_after_change(snapshot.name, topic)
+    frappe.db.set_value(
+        "Student Pathway Snapshot", snapshot.name, "modified", frappe.utils.now(), update_modified=False
+    )
+    invalidate_pathway_view(profile_name)
+    return {"old": old_mastery, "new": new_mastery}
+
+
+def _unlock_after_change(snapshot_name: str, topic: str):
+    """
+    Unlock the changed topic and its direct dependents when their own mastery and
+    that of their direct prerequisites reach the "partial" threshold. Unlocking
+    is monotone, so these rows need no version check.
+    """
+    curriculum = get_curriculum()
+    if topic not in curriculum:
+        return
+    threshold = MASTERY_THRESHOLDS["partial"]
+    rows = frappe.db.sql(
+        """
+        SELECT topic, mastery_weight, is_unlocked FROM `tabStudent Pathway Topic`
+        WHERE snapshot = %s
+        """,
+        (snapshot_name,),
+    )
+    mastery = {t_id: weight for t_id, weight, _unlocked in rows}
+    unlocked = {t_id: bool(is_unlocked) for t_id, _weight, is_unlocked in rows}
+    flipped = curriculum.update_unlock_states(unlocked, mastery, topic, threshold, transitive=False)
+    to_unlock = [t_id for t_id in flipped if unlocked[t_id] and (mastery.get(t_id) or 0) >= threshold]
+    if to_unlock:
+        frappe.db.sql(
+            """
+            UPDATE `tabStudent Pathway Topic`
+            SET is_unlocked = 1, status = 'unlocked', version = version + 1, modified = %s
+            WHERE snapshot = %s AND topic IN %s AND is_unlocked = 0
+            """,
+            (frappe.utils.now(), snapshot_name, tuple(to_unlock)),
+        )
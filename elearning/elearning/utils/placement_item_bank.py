@@ -0,0 +1,263 @@
+"""
+In-memory item bank for the placement-test CAT engine.
+
+All Placement Questions are loaded once per worker process into per-topic NumPy
+arrays of 4PL parameters (a, b, c, d), so next-item selection is a masked argmax
+with no database access. Placement Question doc events bump a version stamp in
+Redis; every worker compares it on access and reloads when it changed.
+
+The bank also holds the serialized frontend payload (content, options, correct
+answer, topic name) of every question, so serving a question loads no document.
+Payloads are shared across workers in a Redis hash, each tagged with the
+question's `modified`; a reload only rebuilds the payloads of changed questions.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import frappe
+import numpy as np
+
+DEFAULT_GUESSING = 0.25
+# Upper asymptote d = 1 - probability of a careless error (5%)
+UPPER_ASYMPTOTE = 0.95
+VERSION_CACHE_KEY = "placement_item_bank_version"
+PAYLOAD_CACHE_KEY = "placement_question_payloads"
+
+_bank = None
+_bank_pinned = False
+_bank_lock = threading.Lock()
+
+
+class TopicItems:
+    """Items of one topic: names, an (n, 4) float array of a, b, c, d and frontend payloads"""
+
+    def __init__(self, topic: str, names: List[str], params: np.ndarray, payloads: List[dict]):
+        self.topic = topic
+        self.names = names
+        self.params = params
+        self.payloads = payloads
+        self.index = {name: i for i, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def available_mask(self, exclude: Iterable[str]) -> np.ndarray:
+        mask = np.ones(len(self.names), dtype=bool)
+        for name in exclude:
+            i = self.index.get(name)
+            if i is not None:
+                mask[i] = False
+        return mask
+
+
+class ItemBank:
+    def __init__(self, topics: Dict[str, TopicItems], version: str = None):
+        self.topics = topics
+        self.version = version
+        self.topic_of = {name: topic for topic, items in topics.items() for name in items.names}
+
+    def __len__(self):
+        return len(self.topic_of)
+
+    def items(self, topic: str) -> Optional[TopicItems]:
+        return self.topics.get(topic)
+
+    def count(self, topics: Iterable[str]) -> int:
+        return sum(len(self.topics[t]) for t in topics if t in self.topics)
+
+    def params(self, name: str) -> Optional[np.ndarray]:
+        topic = self.topic_of.get(name)
+        if topic is None:
+            return None
+        items = self.topics[topic]
+        return items.params[items.index[name]]
+
+    def payload(self, name: str) -> Optional[dict]:
+        topic = self.topic_of.get(name)
+        if topic is None:
+            return None
+        items = self.topics[topic]
+        return items.payloads[items.index[name]]
+
+
+def fisher_information(theta, params: np.ndarray) -> np.ndarray:
+    """4PL Fisher information of every item in `params` at `theta` (NaN -> 0)"""
+    a, b, c, d = params[..., 0], params[..., 1], params[..., 2], params[..., 3]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        logistic = 1.0 / (1.0 + np.exp(-a * (theta - b)))
+        p = c + (d - c) * logistic
+        dp_dtheta = a * (d - c) * logistic * (1.0 - logistic)
+        information = dp_dtheta**2 / (p * (1.0 - p))
+    return np.nan_to_num(information, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def select_item(
+    items: TopicItems, theta: float, exclude: Iterable[str] = (), phase: str = "adaptive"
+) -> Tuple[Optional[str], float]:
+    """
+    Best unused item of a topic: closest difficulty to theta in the coverage phase,
+    maximum Fisher information otherwise. Returns (name, difficulty gap or information).
+    """
+    if items is None or not len(items):
+        return None, 0.0
+
+    mask = items.available_mask(exclude)
+    if not mask.any():
+        return None, 0.0
+
+    if phase == "coverage":
+        gap = np.where(mask, np.abs(items.params[:, 1] - theta), np.inf)
+        best = int(np.argmin(gap))
+        return items.names[best], float(gap[best])
+
+    information = np.where(mask, fisher_information(theta, items.params), -np.inf)
+    best = int(np.argmax(information))
+    return items.names[best], float(information[best])
+
+
+def load_item_bank(version: str = None) -> ItemBank:
+    """Read every Placement Question into a fresh ItemBank (one query)"""
+    rows = frappe.get_all(
+        "Placement Question",
+        fields=["name", "topic", "content", "discrimination", "difficulty", "guessing_probability", "modified"],
+        order_by="topic asc, name asc",
+    )
+    payloads = build_question_payloads(rows, prune=True)
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.topic, []).append(row)
+
+    topics = {}
+    for topic, topic_rows in grouped.items():
+        params = np.array(
+            [
+                [
+                    row.discrimination or 0.0,
+                    row.difficulty or 0.0,
+                    row.guessing_probability or DEFAULT_GUESSING,
+                    UPPER_ASYMPTOTE,
+                ]
+                for row in topic_rows
+            ],
+            dtype=np.float64,
+        )
+        topics[topic] = TopicItems(
+            topic, [row.name for row in topic_rows], params, [payloads[row.name] for row in topic_rows]
+        )
+
+    frappe.logger().info(f"Loaded placement item bank: {len(rows)} questions in {len(topics)} topics")
+    return ItemBank(topics, version)
+
+
+def build_question_payloads(rows, prune: bool = False) -> Dict[str, dict]:
+    """
+    Frontend payload of every Placement Question in `rows` (name, topic, content,
+    difficulty, modified). Cached payloads whose `modified` matches are reused;
+    the others are built from one options query and written back. With `prune`,
+    cached payloads of questions not in `rows` are dropped.
+    """
+    cache = frappe.cache()
+    # Redis returns field names as bytes
+    cached = {
+        name.decode() if isinstance(name, bytes) else name: entry
+        for name, entry in (cache.hgetall(PAYLOAD_CACHE_KEY) or {}).items()
+    }
+    payloads, stale = {}, []
+    for row in rows:
+        entry = cached.get(row.name)
+        if entry and entry["modified"] == str(row.modified):
+            payloads[row.name] = entry["payload"]
+        else:
+            stale.append(row)
+
+    if stale:
+        topic_names = dict(frappe.get_all("Topics", fields=["name", "topic_name"], as_list=True))
+        options = {}
+        for option in frappe.get_all(
+            "Placement Question Option",
+            filters={"parenttype": "Placement Question", "parent": ["in", [row.name for row in stale]]},
+            fields=["parent", "option_text", "is_correct"],
+            order_by="parent asc, idx asc",
+        ):
+            options.setdefault(option.parent, []).append(option)
+
+        for row in stale:
+            question_options = options.get(row.name, [])
+            payload = {
+                "id": row.name,
+                "text": row.content,
+                "options": [option.option_text for option in question_options],
+                "correct_answer": next((o.option_text for o in question_options if o.is_correct), None),
+                "difficulty": row.difficulty,
+                "topic_name": topic_names.get(row.topic) or row.topic,
+            }
+            payloads[row.name] = payload
+            cache.hset(PAYLOAD_CACHE_KEY, row.name, {"modified": str(row.modified), "payload": payload})
+
+    if prune:
+        for name in set(cached) - set(payloads):
+            cache.hdel(PAYLOAD_CACHE_KEY, name)
+    return payloads
+
+
+def get_question_payload(name: str) -> Optional[dict]:
+    """Cached frontend payload of one question (from the bank, else from the database)"""
+    payload = get_item_bank().payload(name)
+    if payload is not None:
+        return payload
+    rows = frappe.get_all(
+        "Placement Question",
+        filters={"name": name},
+        fields=["name", "topic", "content", "difficulty", "modified"],
+    )
+    return build_question_payloads(rows).get(name) if rows else None
+
+
+def _current_version() -> str:
+    cache = frappe.cache()
+    version = cache.get_value(VERSION_CACHE_KEY)
+    if not version:
+        version = frappe.generate_hash(length=12)
+        cache.set_value(VERSION_CACHE_KEY, version)
+    return version
+
+
+def get_item_bank() -> ItemBank:
+    """The worker's item bank, reloaded when another process invalidated it"""
+    global _bank
+    if _bank_pinned:
+        return _bank
+
+    version = _current_version()
+    bank = _bank
+    if bank is not None and bank.version == version:
+        return bank
+
+    with _bank_lock:
+        if _bank is None or _bank.version != version:
+            _bank = load_item_bank(version)
+        return _bank
+
+
+def pin_item_bank(bank: ItemBank):
+    """Serve `bank` without Redis or database access (offline simulation and benchmarks)"""
+    global _bank, _bank_pinned
+    _bank, _bank_pinned = bank, True
+
+
+def invalidate_item_bank(doc=None, method=None):
+    """
+    Placement Question doc event: make every worker reload the bank on next access.
+
+    The shared version changes after commit, so other workers cannot reload the old
+    rows and cache them under the new version.
+    """
+    global _bank
+
+    def bump_version():
+        frappe.cache().set_value(VERSION_CACHE_KEY, frappe.generate_hash(length=12))
+
+    frappe.db.after_commit.add(bump_version)
+    _bank = None
@@ -0,0 +1,174 @@
+"""
+Per-session CAT state for the placement test, cached in Redis.
+
+The state holds what selection, estimation and termination need after every
+answer: the answered questions in order, per-topic responses and counts, the
+current theta/SE per topic and the question currently shown to the student.
+submit_answer_and_get_next updates it incrementally. Placement Answer Log stays
+the source of truth: a missing cache entry, or one whose answer count differs
+from the database, is rebuilt from the logs.
+
+Speculative results for the pending question (the next question after a
+correct and after a wrong answer) are stored under a separate key, so a late
+background job can never overwrite a newer state.
+"""
+
+import copy
+from typing import Dict, List, Optional, Tuple
+
+import frappe
+
+from elearning.elearning.utils.placement_item_bank import get_item_bank
+
+CACHE_KEY_PREFIX = "placement_session_state"
+BRANCHES_KEY_PREFIX = "placement_session_branches"
+CACHE_TTL_SECONDS = 6 * 60 * 60
+
+
+class SessionState:
+    def __init__(
+        self,
+        session_name: str,
+        answered: List[str] = None,
+        responses: Dict[str, List[Tuple[str, bool]]] = None,
+        abilities: Dict[str, Tuple[float, float]] = None,
+        pending_question: str = None,
+    ):
+        self.session_name = session_name
+        self.answered = answered or []
+        self.responses = responses or {}
+        self.abilities = abilities or {}
+        self.pending_question = pending_question
+        self.answered_set = set(self.answered)
+
+    @property
+    def total_answered(self) -> int:
+        return len(self.answered)
+
+    def topic_count(self, topic: str) -> int:
+        return len(self.responses.get(topic, ()))
+
+    def topic_counts(self, topics) -> Dict[str, int]:
+        return {topic: self.topic_count(topic) for topic in topics}
+
+    def topic_correct(self, topic: str) -> int:
+        return sum(1 for _, correct in self.responses.get(topic, ()) if correct)
+
+    def record_answer(self, question: str, topic: Optional[str], is_correct: bool):
+        self.answered.append(question)
+        self.answered_set.add(question)
+        if topic:
+            self.responses.setdefault(topic, []).append((question, bool(is_correct)))
+
+    def set_ability(self, topic: str, theta: float, se: float):
+        self.abilities[topic] = (float(theta), float(se))
+
+    def copy(self) -> "SessionState":
+        return SessionState.from_dict(copy.deepcopy(self.to_dict()))
+
+    def to_dict(self) -> dict:
+        return {
+            "session_name": self.session_name,
+            "answered": self.answered,
+            "responses": self.responses,
+            "abilities": self.abilities,
+            "pending_question": self.pending_question,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionState":
+        return cls(
+            data["session_name"],
+            list(data.get("answered") or []),
+            {topic: [tuple(r) for r in rows] for topic, rows in (data.get("responses") or {}).items()},
+            {topic: tuple(value) for topic, value in (data.get("abilities") or {}).items()},
+            data.get("pending_question"),
+        )
+
+
+def _cache_key(session_name: str) -> str:
+    return f"{CACHE_KEY_PREFIX}:{session_name}"
+
+
+def _branches_key(session_name: str) -> str:
+    return f"{BRANCHES_KEY_PREFIX}:{session_name}"
+
+
+def build_session_state(session) -> SessionState:
+    """Rebuild the state of `session` (a Placement Test Session doc) from its answer logs"""
+    logs = frappe.db.sql(
+        """
+        SELECT placement_question, is_correct
+        FROM `tabPlacement Answer Log`
+        WHERE placement_test_session = %s
+        AND is_correct IS NOT NULL
+        ORDER BY creation ASC
+        """,
+        (session.name,),
+        as_dict=True,
+    )
+
+    topic_of = get_item_bank().topic_of
+    state = SessionState(session.name)
+    for log in logs:
+        if log.placement_question:
+            state.record_answer(log.placement_question, topic_of.get(log.placement_question), log.is_correct)
+    for row in session.topic_abilities:
+        state.set_ability(row.topic, row.ability_estimate or 0.0, row.standard_error or 1.0)
+    return state
+
+
+def get_session_state(session) -> SessionState:
+    """Cached state of `session`, verified against the number of logged answers"""
+    cached = frappe.cache().get_value(_cache_key(session.name))
+    if cached:
+        state = SessionState.from_dict(cached)
+        answered = frappe.db.count(
+            "Placement Answer Log",
+            {"placement_test_session": session.name, "is_correct": ["is", "set"]},
+        )
+        if answered == state.total_answered:
+            return state
+
+    state = build_session_state(session)
+    save_session_state(state)
+    return state
+
+
+def peek_session_state(session_name: str) -> Optional[SessionState]:
+    """Cached state without verification or rebuild (None when not cached)"""
+    cached = frappe.cache().get_value(_cache_key(session_name))
+    return SessionState.from_dict(cached) if cached else None
+
+
+def save_session_state(state: SessionState):
+    frappe.cache().set_value(_cache_key(state.session_name), state.to_dict(), expires_in_sec=CACHE_TTL_SECONDS)
+
+
+def clear_session_state(session_name: str):
+    frappe.cache().delete_value(_cache_key(session_name))
+    frappe.cache().delete_value(_branches_key(session_name))
+
+
+def save_precomputed_branches(state: SessionState, branches: Dict[str, dict]):
+    """
+    Store speculative results for `state.pending_question`, keyed "1" (correct)
+    and "0" (wrong), tagged with the answer count they were computed at
+    """
+    frappe.cache().set_value(
+        _branches_key(state.session_name),
+        {"question": state.pending_question, "answered": state.total_answered, "branches": branches},
+        expires_in_sec=CACHE_TTL_SECONDS,
+    )
+
+
+def pop_precomputed_branch(state: SessionState, question: str, is_correct: bool) -> Optional[dict]:
+    """The precomputed branch for answering `question`, if it was computed for this exact state"""
+    key = _branches_key(state.session_name)
+    cached = frappe.cache().get_value(key)
+    if not cached:
+        return None
+    frappe.cache().delete_value(key)
+    if cached["question"] != question or cached["answered"] != state.total_answered:
+        return None
+    return cached["branches"].get("1" if is_correct else "0")
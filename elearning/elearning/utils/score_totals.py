@@ -0,0 +1,118 @@
+"""
+Denormalized score fields of a Test: total_possible_score, question_count and
+has_essay_question.
+
+The total is the sum over the test's questions of the question's marks (1 when
+unset or when the question no longer exists), where an Essay question is worth
+the sum of its Rubric Items' max_score. The fields are set when a Test is
+validated and rewritten on every test that includes a Question or Rubric Item
+when that changes, so endpoints read them as plain fields.
+
+Back-fill existing tests (also run by the migration patch):
+    bench --site <site> execute elearning.elearning.utils.score_totals.backfill_test_score_fields
+"""
+
+from typing import Dict, Iterable
+
+import frappe
+
+
+def _question_scores(questions: Iterable[str]) -> Dict[str, dict]:
+    """{question: {"question_type", "score"}} for the existing questions, in one query"""
+    questions = tuple(set(filter(None, questions)))
+    if not questions:
+        return {}
+    rows = frappe.db.sql(
+        """
+        SELECT q.name, q.question_type,
+            IF(q.question_type = 'Essay', IFNULL(r.rubric_total, 0), IFNULL(q.marks, 1)) AS score
+        FROM `tabQuestion` q
+        LEFT JOIN (
+            SELECT question, SUM(max_score) AS rubric_total
+            FROM `tabRubric Item`
+            WHERE question IN %(questions)s
+            GROUP BY question
+        ) r ON r.question = q.name
+        WHERE q.name IN %(questions)s
+        """,
+        {"questions": questions},
+        as_dict=True,
+    )
+    return {row.name: row for row in rows}
+
+
+def _score_fields(questions: list, question_scores: Dict[str, dict]) -> dict:
+    total, has_essay = 0.0, False
+    for question in questions:
+        details = question_scores.get(question)
+        total += float(details.score or 0) if details else 1
+        has_essay = has_essay or bool(details and details.question_type == "Essay")
+    return {
+        "total_possible_score": total,
+        "question_count": len(questions),
+        "has_essay_question": int(has_essay),
+    }
+
+
+def compute_test_score_fields(tests: Iterable[str]) -> Dict[str, dict]:
+    """Score fields of each test from its saved Test Question Items"""
+    tests = tuple(set(tests))
+    if not tests:
+        return {}
+    questions = {test: [] for test in tests}
+    for test, question in frappe.db.sql(
+        """
+        SELECT parent, question
+        FROM `tabTest Question Item`
+        WHERE parenttype = 'Test' AND parent IN %(tests)s
+        """,
+        {"tests": tests},
+    ):
+        questions[test].append(question)
+    scores = _question_scores(q for test_questions in questions.values() for q in test_questions)
+    return {test: _score_fields(test_questions, scores) for test, test_questions in questions.items()}
+
+
+def set_test_score_fields(doc, method=None):
+    """Test validate event: compute the fields from the rows being saved"""
+    questions = [row.question for row in doc.get("questions", [])]
+    doc.update(_score_fields(questions, _question_scores(questions)))
+
+
+def refresh_tests_for_questions(questions: Iterable[str]):
+    """Rewrite the score fields of every test that includes one of `questions`"""
+    questions = tuple(set(filter(None, questions)))
+    if not questions:
+        return
+    tests = frappe.db.sql_list(
+        """
+        SELECT DISTINCT parent
+        FROM `tabTest Question Item`
+        WHERE parenttype = 'Test' AND question IN %(questions)s
+        """,
+        {"questions": questions},
+    )
+    for test, fields in compute_test_score_fields(tests).items():
+        frappe.db.set_value("Test", test, fields, update_modified=False)
+
+
+def on_question_change(doc, method=None):
+    """Question doc event"""
+    refresh_tests_for_questions([doc.name])
+
+
+def on_rubric_item_change(doc, method=None):
+    """Rubric Item doc event; also refreshes the question it was moved away from"""
+    questions = [doc.question]
+    previous = doc.get_doc_before_save() if method == "on_update" else None
+    if previous:
+        questions.append(previous.question)
+    refresh_tests_for_questions(questions)
+
+
+def backfill_test_score_fields():
+    tests = frappe.get_all("Test", pluck="name", limit_page_length=0)
+    for test, fields in compute_test_score_fields(tests).items():
+        frappe.db.set_value("Test", test, fields, update_modified=False)
+    frappe.db.commit()
+    frappe.logger().info(f"Back-filled score fields of {len(tests)} tests")
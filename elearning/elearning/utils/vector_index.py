@@ -0,0 +1,368 @@
+"""
+On-disk embedding index: a NumPy matrix opened with mmap plus a JSON metadata sidecar.
+
+Layout of an index directory (agents/data/indexes/<name>/):
+
+    CURRENT            name of the live version, replaced atomically on rebuild
+    <version>.npy      (n, dim) float16/float32 embedding matrix
+    <version>.json     {"model", "dim", "dtype", "count", "partitions", "records": [{"id", "content", "meta"}]}
+    <version>.ivf.npz  IVF centroids and list row ranges (only when a partition is large enough)
+
+The matrix is opened read-only with mmap, so startup does not copy it and forked
+workers share the same page cache. Similarity is the dot product, matching the
+Haystack retriever it replaces.
+
+Rows are grouped by a partition key (e.g. the Learning Object topic) and, inside a
+partition, by IVF list, so every partition and every list is a contiguous slice of
+the matrix. A search can be limited to one partition and probes the `nprobe` lists
+whose centroids score highest; partitions below IVF_MIN_PARTITION_ROWS are scanned
+exactly.
+"""
+
+import json
+import math
+import os
+import pickle
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+
+import frappe
+import numpy as np
+
+INDEX_ROOT = ("elearning", "agents", "data", "indexes")
+CURRENT_FILE = "CURRENT"
+SEARCH_BLOCK_ROWS = 65536
+KEEP_VERSIONS = 2
+
+IVF_MIN_PARTITION_ROWS = 4096
+IVF_TRAINING_POINTS_PER_LIST = 64
+IVF_KMEANS_ITERATIONS = 10
+DEFAULT_NPROBE = 16
+
+_loaded_indexes: Dict[str, "VectorIndex"] = {}
+_loaded_lock = threading.Lock()
+
+
+def get_index_dir(name: str) -> str:
+    return os.path.join(frappe.get_app_path("elearning"), *INDEX_ROOT, name)
+
+
+class VectorIndex:
+    """Read-only view over one version of an index"""
+
+    def __init__(self, name: str, version: str, vectors: np.ndarray, sidecar: Dict[str, Any], ivf=None):
+        self.name = name
+        self.version = version
+        self.vectors = vectors
+        self.records = sidecar.get("records", [])
+        self.model = sidecar.get("model")
+        self.dim = sidecar.get("dim", vectors.shape[1] if vectors.ndim == 2 else 0)
+        # partition value -> {"start", "end", "first_list", "last_list"}
+        self.partitions = sidecar.get("partitions") or {}
+        self.centroids = ivf["centroids"] if ivf is not None else None
+        self.list_bounds = ivf["list_bounds"] if ivf is not None else None
+
+    def __len__(self):
+        return len(self.records)
+
+    def has_partition(self, partition) -> bool:
+        return partition is not None and str(partition) in self.partitions
+
+    def _scores(self, queries: np.ndarray, start: int = 0, end: int = None) -> np.ndarray:
+        """(q, end - start) dot-product scores, computed block by block to bound float32 copies"""
+        end = self.vectors.shape[0] if end is None else end
+        scores = np.empty((queries.shape[0], end - start), dtype=np.float32)
+        for block_start in range(start, end, SEARCH_BLOCK_ROWS):
+            block_end = min(end, block_start + SEARCH_BLOCK_ROWS)
+            block = np.asarray(self.vectors[block_start:block_end], dtype=np.float32)
+            scores[:, block_start - start : block_end - start] = queries @ block.T
+        return scores
+
+    def _probe(self, query: np.ndarray, lists: np.ndarray, nprobe: int) -> List[Tuple[int, int]]:
+        """Row ranges of the `nprobe` lists (out of `lists`) whose centroids score highest"""
+        if len(lists) > nprobe:
+            centroid_scores = self.centroids[lists] @ query
+            lists = lists[np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]]
+        return [tuple(self.list_bounds[i]) for i in sorted(lists)]
+
+    def _candidate_ranges(self, query: np.ndarray, partition, nprobe: int) -> List[Tuple[int, int]]:
+        if self.has_partition(partition):
+            partition_infos = [self.partitions[str(partition)]]
+        else:
+            partition_infos = list(self.partitions.values())
+
+        lists = np.concatenate([np.arange(info["first_list"], info["last_list"]) for info in partition_infos])
+        return self._probe(query, lists, nprobe)
+
+    def _top_k(self, scores: np.ndarray, rows: np.ndarray, top_k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [(float(scores[i]), self.records[int(rows[i])]) for i in ordered]
+
+    def search_batch(
+        self, query_embeddings, top_k: int = 10, partition=None, nprobe: int = None, exact: bool = False
+    ) -> List[List[Tuple[float, Dict[str, Any]]]]:
+        """
+        Top-k (score, record) pairs for each query, best first.
+
+        `partition` limits the search to one partition; an unknown partition falls
+        back to the whole index. `exact` skips IVF and scans every candidate row.
+        """
+        if not len(self.records):
+            return [[] for _ in range(len(query_embeddings))]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        if exact or self.centroids is None:
+            if self.has_partition(partition):
+                info = self.partitions[str(partition)]
+                start, end = info["start"], info["end"]
+            else:
+                start, end = 0, len(self.records)
+            scores = self._scores(queries, start, end)
+            rows = np.arange(start, end)
+            return [self._top_k(row_scores, rows, top_k) for row_scores in scores]
+
+        results = []
+        for query in queries:
+            ranges = self._candidate_ranges(query, partition, nprobe or DEFAULT_NPROBE)
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            scores = np.concatenate([self._scores(query[None, :], start, end)[0] for start, end in ranges])
+            results.append(self._top_k(scores, rows, top_k))
+        return results
+
+    def search(self, query_embedding, top_k: int = 10, partition=None, nprobe: int = None, exact: bool = False):
+        """Top-k (score, record) pairs for one query, best first"""
+        return self.search_batch([query_embedding], top_k=top_k, partition=partition, nprobe=nprobe, exact=exact)[0]
+
+
+def _read_current_version(index_dir: str):
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_vector_index(index_dir: str, name: str = None, version: str = None):
+    """Open a version (default: the live one) of the index stored in `index_dir`"""
+    version = version or _read_current_version(index_dir)
+    if not version:
+        return None
+
+    with open(os.path.join(index_dir, f"{version}.json"), "r", encoding="utf-8") as f:
+        sidecar = json.load(f)
+    vectors = np.load(os.path.join(index_dir, f"{version}.npy"), mmap_mode="r")
+
+    ivf = None
+    ivf_path = os.path.join(index_dir, f"{version}.ivf.npz")
+    if os.path.exists(ivf_path):
+        with np.load(ivf_path) as data:
+            ivf = {"centroids": data["centroids"], "list_bounds": data["list_bounds"]}
+
+    return VectorIndex(name or os.path.basename(index_dir), version, vectors, sidecar, ivf)
+
+
+def load_vector_index(name: str):
+    """
+    Return the live version of index `name`, or None if it has not been built.
+
+    Loaded indexes are cached per process; the CURRENT pointer is re-read on each
+    call so a rebuilt index is picked up without restarting workers.
+    """
+    index_dir = get_index_dir(name)
+    version = _read_current_version(index_dir)
+    if not version:
+        return None
+
+    cached = _loaded_indexes.get(name)
+    if cached and cached.version == version:
+        return cached
+
+    with _loaded_lock:
+        cached = _loaded_indexes.get(name)
+        if cached and cached.version == version:
+            return cached
+
+        index = open_vector_index(index_dir, name, version)
+        _loaded_indexes[name] = index
+        frappe.logger().info(f"Loaded vector index {name} ({len(index)} records, version {version})")
+        return index
+
+
+def _assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (L2) per row, computed in blocks"""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assignments
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on a sample of `vectors`; returns float32 (nlist, dim) centroids"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * IVF_TRAINING_POINTS_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), size=sample_size, replace=False))], dtype=np.float32)
+
+    centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+    for _ in range(IVF_KMEANS_ITERATIONS):
+        assignments = _assign_lists(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+    return centroids
+
+
+def _build_layout(vectors: np.ndarray, records: List[Dict[str, Any]], partition_key: str = None):
+    """
+    Order rows by partition and IVF list.
+
+    Returns (row order, partitions sidecar, centroids, list bounds); the last two are
+    None when no partition is large enough for IVF.
+    """
+    groups: Dict[str, List[int]] = {}
+    for row, record in enumerate(records):
+        value = (record.get("meta") or {}).get(partition_key) if partition_key else None
+        groups.setdefault("" if value is None else str(value), []).append(row)
+
+    order_parts, partitions, centroid_parts, list_bounds = [], {}, [], []
+    use_ivf = False
+    position = 0
+    for value in sorted(groups):
+        rows = np.asarray(groups[value], dtype=np.int64)
+        partition_vectors = vectors[rows]
+        first_list = len(list_bounds)
+
+        if len(rows) >= IVF_MIN_PARTITION_ROWS:
+            use_ivf = True
+            nlist = int(math.sqrt(len(rows)))
+            centroids = _kmeans(partition_vectors, nlist)
+            assignments = _assign_lists(partition_vectors, centroids)
+            rows = rows[np.argsort(assignments, kind="stable")]
+            counts = np.bincount(assignments, minlength=nlist)
+            ends = position + np.cumsum(counts)
+            starts = ends - counts
+        else:
+            # Small partition: a single list, scanned exactly when probed
+            centroids = np.asarray(partition_vectors, dtype=np.float32).mean(axis=0, keepdims=True)
+            starts = np.array([position])
+            ends = np.array([position + len(rows)])
+
+        centroid_parts.append(centroids)
+        list_bounds.extend(zip(starts.tolist(), ends.tolist()))
+        partitions[value] = {
+            "start": position,
+            "end": position + len(rows),
+            "first_list": first_list,
+            "last_list": len(list_bounds),
+        }
+        order_parts.append(rows)
+        position += len(rows)
+
+    order = np.concatenate(order_parts) if order_parts else np.arange(0)
+    if not use_ivf:
+        return order, partitions, None, None
+    return order, partitions, np.vstack(centroid_parts).astype(np.float32), np.asarray(list_bounds, dtype=np.int64)
+
+
+def write_vector_index(
+    name: str,
+    embeddings,
+    records: List[Dict[str, Any]],
+    model: str = None,
+    dtype: str = "float16",
+    partition_key: str = None,
+    index_dir: str = None,
+    dim: int = None,
+) -> str:
+    """
+    Write a new version of index `name` and atomically make it the live one.
+
+    `records[i]` describes row i of `embeddings` and should hold "id", "content" and "meta".
+    Rows are partitioned by `meta[partition_key]` when given. Returns the new version id.
+    An empty `records` list writes an empty (0, `dim`) index.
+    """
+    vectors = np.asarray(embeddings, dtype=dtype)
+    if not len(records) and vectors.size == 0:
+        vectors = vectors.reshape(0, dim or (vectors.shape[-1] if vectors.ndim == 2 else 0))
+    if vectors.ndim != 2 or vectors.shape[0] != len(records):
+        frappe.throw(f"Embedding matrix shape {vectors.shape} does not match {len(records)} records")
+
+    order, partitions, centroids, list_bounds = _build_layout(vectors, records, partition_key)
+    vectors = vectors[order]
+    records = [records[i] for i in order]
+
+    index_dir = index_dir or get_index_dir(name)
+    os.makedirs(index_dir, exist_ok=True)
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    np.save(os.path.join(index_dir, f"{version}.npy"), vectors)
+    if centroids is not None:
+        np.savez(os.path.join(index_dir, f"{version}.ivf.npz"), centroids=centroids, list_bounds=list_bounds)
+
+    sidecar = {
+        "model": model,
+        "dim": int(vectors.shape[1]),
+        "dtype": dtype,
+        "count": len(records),
+        "partition_key": partition_key,
+        "partitions": partitions,
+        "records": records,
+    }
+    with open(os.path.join(index_dir, f"{version}.json"), "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, ensure_ascii=False)
+
+    pointer_tmp = os.path.join(index_dir, f"{CURRENT_FILE}.{version}.tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(index_dir, CURRENT_FILE))
+
+    _prune_old_versions(index_dir, version)
+    return version
+
+
+def _prune_old_versions(index_dir: str, current_version: str):
+    """Keep the newest KEEP_VERSIONS versions; workers still mapping a removed file keep their pages"""
+    versions = sorted(
+        {fname.split(".", 1)[0] for fname in os.listdir(index_dir) if fname.endswith(".npy")},
+        key=lambda version: os.path.getmtime(os.path.join(index_dir, f"{version}.npy")),
+        reverse=True,
+    )
+    stale = [v for v in versions if v != current_version][KEEP_VERSIONS - 1 :]
+    for version in stale:
+        for ext in (".npy", ".json", ".ivf.npz"):
+            try:
+                os.remove(os.path.join(index_dir, version + ext))
+            except FileNotFoundError:
+                pass
+
+
+def convert_pickled_documents(
+    pickle_path: str, name: str, dtype: str = "float16", partition_key: str = "topic"
+) -> Dict[str, Any]:
+    """
+    Convert a pickle of embedded Haystack Documents into index `name`.
+
+    Run once per legacy pickle with `bench execute`, e.g. name "documents" for
+    embedded_documents.pkl and "learning_objects" for learning_objects_embedded.pkl.
+    """
+    with open(pickle_path, "rb") as f:
+        documents = pickle.load(f)
+
+    documents = [doc for doc in documents if getattr(doc, "embedding", None) is not None]
+    records = [{"id": doc.id, "content": doc.content, "meta": doc.meta or {}} for doc in documents]
+    version = write_vector_index(
+        name, [doc.embedding for doc in documents], records, dtype=dtype, partition_key=partition_key
+    )
+    return {"name": name, "version": version, "count": len(records)}
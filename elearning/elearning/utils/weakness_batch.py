@@ -0,0 +1,191 @@
+"""
+Nightly batch refresh of every Student Topic Mastery row.
+
+The hooks only recompute a (student, topic) pair when something happens to it,
+so decay and gap components of inactive students go stale. This job reads all
+inputs with a handful of grouped queries (mastery rows, SRS ease factors,
+unresolved gap counts, latest session times, topic pacing means), computes
+every component and the normalized weakness score as NumPy arrays over all
+pairs, and writes back only the rows whose values changed, in bulk.
+
+Component rules follow the hooks: a pair with no learning activity yet (no
+Flashcard Session, SRS progress or Knowledge Gap) is scored on accuracy only,
+as right after initialization; otherwise all four components are present and
+missing data counts as 0.
+
+    bench --site <site> execute elearning.elearning.utils.weakness_batch.refresh_weakness_scores
+"""
+
+import time
+from typing import Dict, Tuple
+
+import frappe
+import numpy as np
+
+from elearning.elearning.doctype.student_topic_mastery.student_topic_mastery import (
+    EASE_FACTOR_RANGE,
+    GAP_MIDPOINT,
+    GAP_STEEPNESS,
+    W_ACCURACY,
+    W_DECAY,
+    W_GAP,
+    W_PACING,
+)
+from elearning.elearning.utils.constellation_cache import invalidate_constellation
+
+CHANGE_TOLERANCE = 1e-6
+UPDATE_CHUNK_SIZE = 500
+
+COMPONENT_FIELDS = ["accuracy_component", "pacing_component", "decay_component", "gap_component", "weakness_score"]
+
+
+def normalized_weakness_scores(accuracy, pacing, decay, gap) -> np.ndarray:
+    """
+    Vectorized calculate_normalized_weakness_score: each argument is an array of
+    components in [0, 1], NaN where the component has no data
+    """
+    components = np.column_stack([accuracy, pacing, decay, gap])
+    weights = np.array([W_ACCURACY, W_PACING, W_DECAY, W_GAP])
+    present = ~np.isnan(components)
+    weighted_sum = (np.where(present, components, 0.0) * weights).sum(axis=1)
+    total_weight = (present * weights).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(total_weight > 0, weighted_sum / total_weight, 0.0)
+    return np.clip(scores, 0.0, 1.0)
+
+
+def decay_components(avg_ease_factor: np.ndarray) -> np.ndarray:
+    """NaN or 0 (no SRS progress) means no decay"""
+    low, high = EASE_FACTOR_RANGE
+    avg_ease_factor = np.nan_to_num(avg_ease_factor, nan=0.0)
+    decay = np.clip((high - avg_ease_factor) / (high - low), 0.0, 1.0)
+    return np.where(avg_ease_factor > 0, decay, 0.0)
+
+
+def gap_components(gap_counts: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        scores = 1.0 / (1.0 + np.exp(-GAP_STEEPNESS * (gap_counts - GAP_MIDPOINT)))
+    return np.where(gap_counts > 0, scores, 0.0)
+
+
+def pacing_components(session_seconds: np.ndarray, topic_means: np.ndarray) -> np.ndarray:
+    valid = (session_seconds > 0) & (topic_means > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(valid, session_seconds / topic_means - 1.0, 0.0)
+    return np.clip(ratio, 0.0, 1.0)
+
+
+def _pair_map(rows) -> Dict[Tuple[str, str], float]:
+    return {(user, str(topic)): float(value or 0) for user, topic, value in rows}
+
+
+def load_batch_inputs():
+    """All inputs of the batch, each keyed by (student, topic), in five grouped queries"""
+    mastery = frappe.get_all(
+        "Student Topic Mastery",
+        fields=["name", "student", "topic"] + COMPONENT_FIELDS,
+        limit_page_length=0,
+    )
+    ease = _pair_map(
+        frappe.db.sql(
+            """
+            SELECT user, topic, AVG(ease_factor)
+            FROM `tabUser SRS Progress`
+            WHERE topic IS NOT NULL
+            GROUP BY user, topic
+            """
+        )
+    )
+    gap_counts = _pair_map(
+        frappe.db.sql(
+            """
+            SELECT kg.user, lo.topic, SUM(kg.status != 'Resolved')
+            FROM `tabKnowledge Gap` kg
+            JOIN `tabLearning Object` lo ON lo.name = kg.learning_object
+            GROUP BY kg.user, lo.topic
+            """
+        )
+    )
+    latest_session = _pair_map(
+        frappe.db.sql(
+            """
+            SELECT fs.user, fs.topic, MAX(fs.time_spent_seconds)
+            FROM `tabFlashcard Session` fs
+            JOIN (
+                SELECT user, topic, MAX(end_time) AS end_time
+                FROM `tabFlashcard Session`
+                WHERE end_time IS NOT NULL AND time_spent_seconds > 0
+                GROUP BY user, topic
+            ) latest ON latest.user = fs.user AND latest.topic = fs.topic AND latest.end_time = fs.end_time
+            GROUP BY fs.user, fs.topic
+            """
+        )
+    )
+    use_decayed = bool(frappe.conf.get("pacing_use_decayed_mean"))
+    topic_means = {
+        str(row.topic): (row.decayed_mean_seconds if use_decayed else row.mean_seconds) or 0.0
+        for row in frappe.get_all(
+            "Topic Pacing Stats",
+            fields=["topic", "mean_seconds", "decayed_mean_seconds"],
+            filters={"session_count": [">", 0]},
+            limit_page_length=0,
+        )
+    }
+    return mastery, ease, gap_counts, latest_session, topic_means
+
+
+def refresh_weakness_scores(dry_run: bool = False) -> dict:
+    """Recompute every pair's components and weakness score; write back the changed rows"""
+    started = time.perf_counter()
+    mastery, ease, gap_counts, latest_session, topic_means = load_batch_inputs()
+    if not mastery:
+        return {"rows": 0, "changed": 0}
+
+    pairs = [(row.student, str(row.topic)) for row in mastery]
+    avg_ease = np.array([ease.get(pair, np.nan) for pair in pairs], dtype=np.float64)
+    gaps = np.array([gap_counts.get(pair, 0.0) for pair in pairs], dtype=np.float64)
+    seconds = np.array([latest_session.get(pair, 0.0) for pair in pairs], dtype=np.float64)
+    means = np.array([topic_means.get(topic, 0.0) for _, topic in pairs], dtype=np.float64)
+    active = np.array(
+        [pair in latest_session or pair in ease or pair in gap_counts for pair in pairs], dtype=bool
+    )
+
+    accuracy = np.array([row.accuracy_component or 0.0 for row in mastery], dtype=np.float64)
+    pacing = pacing_components(seconds, means)
+    decay = decay_components(avg_ease)
+    gap = gap_components(gaps)
+    scores = normalized_weakness_scores(
+        accuracy,
+        np.where(active, pacing, np.nan),
+        np.where(active, decay, np.nan),
+        np.where(active, gap, np.nan),
+    )
+
+    new_values = np.column_stack([accuracy, pacing, decay, gap, scores])
+    old_values = np.array(
+        [[row.get(field) or 0.0 for field in COMPONENT_FIELDS] for row in mastery], dtype=np.float64
+    )
+    changed = np.flatnonzero(np.abs(new_values - old_values).max(axis=1) > CHANGE_TOLERANCE)
+
+    if not dry_run and len(changed):
+        now = frappe.utils.now()
+        updates = {
+            mastery[i].name: dict(
+                zip(COMPONENT_FIELDS[1:], (float(v) for v in new_values[i, 1:])), last_updated_on=now
+            )
+            for i in changed
+        }
+        frappe.db.bulk_update("Student Topic Mastery", updates, chunk_size=UPDATE_CHUNK_SIZE)
+        frappe.db.commit()
+        for student in {mastery[i].student for i in changed}:
+            invalidate_constellation(student)
+
+    report = {
+        "rows": len(mastery),
+        "active_pairs": int(active.sum()),
+        "changed": int(len(changed)),
+        "dry_run": dry_run,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    frappe.logger().info(f"Weakness score batch: {report}")
+    return report
@@ -146,6 +146,41 @@ doc_events = {
         "on_update": "elearning.elearning.doctype.student_topic_mastery.student_topic_mastery.update_mastery_on_gap_change",
         "on_trash": "elearning.elearning.doctype.student_topic_mastery.student_topic_mastery.update_mastery_on_gap_change",
     },
+    "Learning Object": {
+        "on_update": "elearning.elearning.agents.embed_learning_objects.enqueue_learning_object_reindex",
+        "on_trash": "elearning.elearning.agents.embed_learning_objects.enqueue_learning_object_reindex",
+    },
+    "Placement Question": {
+        "on_update": "elearning.elearning.utils.placement_item_bank.invalidate_item_bank",
+        "on_trash": "elearning.elearning.utils.placement_item_bank.invalidate_item_bank",
+    },
+    "Student Topic Mastery": {
+        "on_update": "elearning.elearning.utils.constellation_cache.on_student_topic_mastery_change",
+        "on_trash": "elearning.elearning.utils.constellation_cache.on_student_topic_mastery_change",
+    },
+    "Topics": {
+        "on_update": "elearning.elearning.utils.constellation_cache.on_topic_change",
+        "on_trash": "elearning.elearning.utils.constellation_cache.on_topic_change",
+    },
+    "Test": {
+        "validate": "elearning.elearning.utils.score_totals.set_test_score_fields",
+    },
+    "Question": {
+        "on_update": "elearning.elearning.utils.score_totals.on_question_change",
+        "after_delete": "elearning.elearning.utils.score_totals.on_question_change",
+    },
+    "Rubric Item": {
+        "on_update": "elearning.elearning.utils.score_totals.on_rubric_item_change",
+        "after_delete": "elearning.elearning.utils.score_totals.on_rubric_item_change",
+    },
+    "User SRS Progress": {
+        "on_update": "elearning.elearning.doctype.topic_progress.topic_progress.on_srs_progress_change",
+        "after_delete": "elearning.elearning.doctype.topic_progress.topic_progress.on_srs_progress_change",
+    },
+    "User Exam Attempt": {
+        "on_update": "elearning.elearning.doctype.topic_progress.topic_progress.on_exam_attempt_change",
+        "after_delete": "elearning.elearning.doctype.topic_progress.topic_progress.on_exam_attempt_change",
+    },
 }
 
 # Fixtures
@@ -218,6 +253,20 @@ fixtures = [
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+    "cron": {
+        # Recompute Student Topic Mastery for pairs queued by doc events
+        "* * * * *": [
+            "elearning.elearning.utils.mastery_recompute_queue.flush_dirty_mastery",
+        ],
+    },
+    "daily": [
+        "elearning.elearning.utils.weakness_batch.refresh_weakness_scores",
+        # Due SRS cards change with time alone
+        "elearning.elearning.doctype.topic_progress.topic_progress.refresh_all_topic_progress",
+    ],
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"elearning.tasks.all"
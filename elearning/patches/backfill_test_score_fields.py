@@ -0,0 +1,12 @@
+import frappe
+from frappe.utils.fixtures import sync_fixtures
+
+from elearning.elearning.utils.score_totals import backfill_test_score_fields
+
+
+def execute():
+    """Fill the denormalized score fields of tests saved before they existed"""
+    # Test is a fixture doctype, and fixtures are synced after post_model_sync patches
+    if not frappe.db.has_column("Test", "total_possible_score"):
+        sync_fixtures("elearning")
+    backfill_test_score_fields()
@@ -0,0 +1,26 @@
+import frappe
+
+from elearning.elearning.utils.pathway_store import (
+    VIEW_CACHE_KEY,
+    parse_legacy_pathway,
+    replace_pathway_rows,
+)
+
+
+def execute():
+    """Split the pathway_json blob of existing snapshots into Student Pathway Topic rows"""
+    snapshots = frappe.db.sql(
+        """
+        SELECT s.name, s.pathway_json
+        FROM `tabStudent Pathway Snapshot` s
+        WHERE s.pathway_json IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM `tabStudent Pathway Topic` t WHERE t.snapshot = s.name
+        )
+        """,
+        as_dict=True,
+    )
+    for snapshot in snapshots:
+        replace_pathway_rows(snapshot.name, parse_legacy_pathway(snapshot.pathway_json))
+    frappe.db.commit()
+    frappe.cache().delete_value(VIEW_CACHE_KEY)
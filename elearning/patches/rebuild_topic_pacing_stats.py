@@ -0,0 +1,6 @@
+from elearning.elearning.utils.pacing_stats import rebuild_pacing_stats
+
+
+def execute():
+    """Seed Topic Pacing Stats from the Flashcard Sessions ended before it existed"""
+    rebuild_pacing_stats()